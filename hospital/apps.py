@@ -1,5 +1,11 @@
 from django.apps import AppConfig
+from django.core import checks
 
 
 class HospitalConfig(AppConfig):
     name = 'hospital'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .filters import check_ordering_indexes
+        checks.register(check_ordering_indexes)
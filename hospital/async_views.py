@@ -0,0 +1,124 @@
+from asgiref.sync import sync_to_async
+from django.shortcuts import aget_object_or_404
+from django.utils.cache import get_conditional_response
+from django.views import View
+from rest_framework import status
+from rest_framework.response import Response
+
+from .cache import response_cache
+from .views import AppointmentViewSet, DoctorViewSet, PatientViewSet, RoomViewSet
+
+
+# ==========================
+# Async read views
+# ==========================
+class AsyncReadView(View):
+    """
+    list and retrieve of a DRF viewset as an async Django view, served under
+    /api/v1/async/ when the project runs on an ASGI server.
+
+    The viewset still does everything that doesn't touch the database, so
+    responses match the sync API: authentication, permissions, filtering,
+    `?fields=`/`?view=lean`, keyset pagination, ETags and the response
+    cache. Rows, fingerprints, cache entries and auth lookups are awaited
+    through the async ORM and cache APIs. Django still runs each of those
+    calls on a thread (sync_to_async), psycopg 3 or not, while the event
+    loop serves other requests. Under a WSGI server the views still work but gain nothing.
+    """
+    viewset = None
+    # Route name prefix, also names the response cache entries
+    basename = None
+
+    async def get(self, request, *args, **kwargs):
+        view = self.viewset(basename=self.basename, detail='pk' in kwargs)
+        view.action_map = {'get': 'retrieve' if view.detail else 'list'}
+        view.args, view.kwargs = args, kwargs
+        view.request = view.initialize_request(request, *args, **kwargs)
+        view.headers = view.default_response_headers
+        try:
+            # Authentication may load the user, keep it off the event loop
+            await sync_to_async(view.initial)(view.request, *args, **kwargs)
+            if view.action == 'retrieve':
+                response = await self.retrieve(view)
+            else:
+                response = await self.list(view)
+        except Exception as exc:
+            response = view.handle_exception(exc)
+        return view.finalize_response(view.request, response, *args, **kwargs)
+
+    async def list(self, view):
+        queryset = view.filter_queryset(view.get_queryset())
+        return await self.conditional_response(view, view.get_response_rows(queryset), queryset, self.list_data)
+
+    async def retrieve(self, view):
+        queryset = view.get_lookup_queryset()
+        return await self.conditional_response(view, queryset, queryset, self.retrieve_data)
+
+    async def conditional_response(self, view, rows, queryset, handler):
+        etag, last_modified = view.get_validators(view.request, await view.aget_fingerprint(rows))
+        response = get_conditional_response(view.request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = await self.cached_response(view, queryset, handler)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+        return view.add_validators(response, etag, last_modified)
+
+    async def cached_response(self, view, queryset, handler):
+        cache_models = getattr(view, 'cache_models', None)
+        if not cache_models:
+            return Response(await handler(view, queryset))
+        key = await response_cache.akey(view.basename, view.request, cache_models)
+        data = await response_cache.aget(view.basename, key)
+        if data is not None:
+            return Response(data, headers={'X-Cache': 'HIT'})
+        data = await handler(view, queryset)
+        await response_cache.aset(key, data)
+        return Response(data, headers={'X-Cache': 'MISS'})
+
+    async def list_data(self, view, queryset):
+        lean = getattr(view, 'is_lean', None) is not None and view.is_lean()
+        if lean:
+            queryset = view.get_lean_queryset()
+        page = await view.paginator.apaginate_queryset(queryset, view.request, view)
+        if page is None:
+            rows = [row async for row in queryset]
+            return rows if lean else await self.serialize(view, rows, many=True)
+        data = page if lean else await self.serialize(view, page, many=True)
+        return view.paginator.get_paginated_response(data).data
+
+    async def retrieve_data(self, view, queryset):
+        obj = await aget_object_or_404(queryset)
+        view.check_object_permissions(view.request, obj)
+        return await self.serialize(view, obj)
+
+    async def serialize(self, view, instance, many=False):
+        # Rows are loaded with their select/prefetch_related paths; anything
+        # a serializer still reads lazily needs the ORM's sync thread
+        return await sync_to_async(lambda: view.get_serializer(instance, many=many).data)()
+
+
+class AsyncAppointmentView(AsyncReadView):
+    viewset = AppointmentViewSet
+    basename = 'async-appointment'
+
+
+class AsyncPatientView(AsyncReadView):
+    viewset = PatientViewSet
+    basename = 'async-patient'
+
+    async def list_data(self, view, queryset):
+        # `?q=` returns the best matches, as in PatientViewSet.paginate_queryset
+        if not view.is_search():
+            return await super().list_data(view, queryset)
+        matches = [patient async for patient in view.get_response_rows(queryset)]
+        return {'next': None, 'previous': None, 'results': await self.serialize(view, matches, many=True)}
+
+
+class AsyncDoctorView(AsyncReadView):
+    viewset = DoctorViewSet
+    basename = 'async-doctor'
+
+
+class AsyncRoomView(AsyncReadView):
+    viewset = RoomViewSet
+    basename = 'async-room'
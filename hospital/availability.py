@@ -0,0 +1,144 @@
+import re
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .models import Appointment, Schedule
+
+WEEKDAYS = [code for code, _ in Schedule.WEEKDAYS]
+DEFAULT_RANGE_DAYS = 7
+MAX_RANGE_DAYS = 62
+DEFAULT_SLOT_MINUTES = 15
+SLOT_RE = re.compile(r'^(\d+)\s*(m|min|h)?$')
+
+
+# ==========================
+# Query params
+# ==========================
+def parse_params(params):
+    """Read `from`, `to` and `slot` (e.g. 15m, 1h) from the query string."""
+    errors = {}
+    try:
+        start = date.fromisoformat(params['from']) if params.get('from') else timezone.localdate()
+    except ValueError:
+        errors['from'] = 'Use the YYYY-MM-DD format.'
+        start = None
+    try:
+        end = date.fromisoformat(params['to']) if params.get('to') else None
+    except ValueError:
+        errors['to'] = 'Use the YYYY-MM-DD format.'
+        end = None
+
+    slot = DEFAULT_SLOT_MINUTES
+    if params.get('slot'):
+        match = SLOT_RE.match(params['slot'].strip().lower())
+        if not match:
+            errors['slot'] = 'Use minutes or hours, e.g. 15m or 1h.'
+        else:
+            slot = int(match.group(1)) * (60 if match.group(2) == 'h' else 1)
+            if not 5 <= slot <= 240:
+                errors['slot'] = 'Slot must be between 5 minutes and 4 hours.'
+
+    if start and end is None:
+        end = start + timedelta(days=DEFAULT_RANGE_DAYS - 1)
+    if start and end:
+        if end < start:
+            errors['to'] = 'Must not be before from.'
+        elif (end - start).days >= MAX_RANGE_DAYS:
+            errors['to'] = f'The range is limited to {MAX_RANGE_DAYS} days.'
+
+    if errors:
+        raise ValidationError(errors)
+    return start, end, slot
+
+
+# ==========================
+# Interval helpers
+# ==========================
+def to_minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def merge_intervals(intervals):
+    """Merge overlapping or touching [start, end) intervals."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def free_slots(windows, busy, slot, not_before=0):
+    """
+    Slot start minutes inside the merged `windows` that don't overlap the
+    merged `busy` intervals. Both lists are sorted, so one pass is enough.
+    """
+    slots = []
+    index = 0
+    for window_start, window_end in windows:
+        start = window_start
+        while start + slot <= window_end:
+            end = start + slot
+            while index < len(busy) and busy[index][1] <= start:
+                index += 1
+            if index < len(busy) and busy[index][0] < end:
+                # Jump past the booking, staying on the window's slot grid
+                start += -(-(busy[index][1] - start) // slot) * slot
+                continue
+            if start >= not_before:
+                slots.append(start)
+            start = end
+    return slots
+
+
+# ==========================
+# Availability
+# ==========================
+def find_availability(doctor_ids, start, end, slot):
+    """
+    Free slots per doctor and day between `start` and `end` (inclusive).
+
+    Schedules and non-cancelled appointments for the whole doctor set are
+    read with one query each. Every appointment blocks APPOINTMENT_MINUTES
+    from its start time, independent of the `slot` size of the grid.
+    """
+    windows = defaultdict(lambda: defaultdict(list))
+    for doctor_id, weekday, start_time, end_time in Schedule.objects.filter(
+        doctor_id__in=doctor_ids
+    ).values_list('doctor_id', 'weekday', 'start_time', 'end_time'):
+        windows[doctor_id][weekday].append((to_minutes(start_time), to_minutes(end_time)))
+    for by_weekday in windows.values():
+        for weekday, intervals in by_weekday.items():
+            by_weekday[weekday] = merge_intervals(intervals)
+
+    length = settings.APPOINTMENT_MINUTES
+    busy = defaultdict(lambda: defaultdict(list))
+    for doctor_id, day, time in Appointment.objects.filter(
+        doctor_id__in=doctor_ids, date__range=(start, end)
+    ).exclude(status='cancelled').values_list('doctor_id', 'date', 'time'):
+        busy[doctor_id][day].append((to_minutes(time), to_minutes(time) + length))
+
+    now = timezone.localtime()
+    result = {}
+    for doctor_id in doctor_ids:
+        days = []
+        day = start
+        while day <= end:
+            day_windows = windows[doctor_id].get(WEEKDAYS[day.weekday()])
+            if day_windows and day >= now.date():
+                not_before = to_minutes(now) if day == now.date() else 0
+                slots = free_slots(day_windows, merge_intervals(busy[doctor_id][day]), slot, not_before)
+                if slots:
+                    days.append({
+                        'date': day,
+                        'slots': [f'{minute // 60:02d}:{minute % 60:02d}' for minute in slots],
+                    })
+            day += timedelta(days=1)
+        result[doctor_id] = days
+    return result
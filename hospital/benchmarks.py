@@ -0,0 +1,89 @@
+import math
+import os
+import random
+import sys
+
+from django.db.models import Max, Min
+from django.urls import URLResolver
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an unsorted list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(latencies):
+    """p50/p95/p99/max of latencies given in seconds, reported in ms."""
+    return {
+        'count': len(latencies),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'max_ms': round(max(latencies, default=0) * 1000, 2),
+    }
+
+
+def rss_mb():
+    """Resident set size of this process in MB (peak RSS where /proc is missing)."""
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+        return round(pages * os.sysconf('SC_PAGE_SIZE') / 2**20, 1)
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KB, macOS bytes
+        return round(peak / (2**20 if sys.platform == 'darwin' else 2**10), 1)
+
+
+def api_routes(patterns, actions=('list', 'retrieve')):
+    """(name, viewset, url kwarg names) of the GET routes running `actions`."""
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from api_routes(pattern.url_patterns, actions)
+            continue
+        viewset = getattr(pattern.callback, 'cls', None)
+        mapping = getattr(pattern.callback, 'actions', None) or {}
+        if mapping.get('get') in actions and getattr(viewset, 'queryset', None) is not None:
+            kwarg_names = list(pattern.pattern.regex.groupindex)
+            if 'format' not in kwarg_names:
+                yield pattern.name, viewset, kwarg_names
+
+
+class RowSampler:
+    """Pick random existing rows to fill in route kwargs."""
+
+    def __init__(self, seed=42):
+        self.random = random.Random(seed)
+        self.pk_ranges = {}
+
+    def kwargs(self, viewset, kwarg_names):
+        """URL kwargs for a random row, with its parents taken from that row."""
+        model = viewset.queryset.model
+        lookups = {name: viewset.parent_lookup_kwargs[name] for name in kwarg_names if name != 'pk'}
+        for _ in range(10):
+            pk = self.pk(model)
+            if pk is None:
+                return None
+            kwargs = {'pk': pk} if 'pk' in kwarg_names else {}
+            if not lookups:
+                return kwargs
+            values = model.objects.filter(pk=pk).values_list(*lookups.values()).first()
+            if values and None not in values:
+                return {**kwargs, **dict(zip(lookups, values))}
+        return None
+
+    def pk(self, model):
+        if model not in self.pk_ranges:
+            bounds = model.objects.aggregate(low=Min('pk'), high=Max('pk'))
+            self.pk_ranges[model] = (bounds['low'], bounds['high'])
+        low, high = self.pk_ranges[model]
+        if low is None:
+            return None
+        # Ids can have gaps, take the first row at or after a random point
+        start = self.random.randint(low, high)
+        return model.objects.filter(pk__gte=start).order_by('pk').values_list('pk', flat=True).first()
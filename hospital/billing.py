@@ -0,0 +1,171 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+CENT = Decimal('0.01')
+
+
+def to_money(value):
+    """Amount as a Decimal rounded to cents; floats go through str() to drop binary noise."""
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value))
+    return value.quantize(CENT)
+
+
+def invoice_status(total_amount, amount_paid):
+    return 'paid' if amount_paid >= total_amount else 'unpaid'
+
+
+# ==========================
+# Payment updates
+# ==========================
+def payments_changed(removed=(), added=()):
+    """
+    Apply payments that were deleted (`removed`), created (`added`) or
+    changed (old version in `removed`, new one in `added`) to the invoice
+    totals and the revenue rollup. Call inside a transaction.
+    """
+    from .models import Invoice
+
+    rows = [(payment, -1) for payment in removed] + [(payment, 1) for payment in added]
+    if not rows:
+        return
+    departments = dict(
+        Invoice.objects.filter(pk__in={payment.invoice_id for payment, _ in rows}).values_list('id', 'department_id')
+    )
+    paid = defaultdict(Decimal)
+    revenue = defaultdict(lambda: [Decimal(0), 0])
+    for payment, sign in rows:
+        amount = to_money(payment.amount)
+        paid[payment.invoice_id] += sign * amount
+        key = (timezone.localdate(payment.paid_at), departments.get(payment.invoice_id), payment.method)
+        revenue[key][0] += sign * amount
+        revenue[key][1] += sign
+
+    # Sorted keys: the same lock order everywhere avoids deadlocks
+    now = timezone.now()
+    for invoice_id in sorted(paid):
+        if paid[invoice_id]:
+            _add_paid(Invoice, invoice_id, paid[invoice_id], now)
+    for key in sorted(revenue, key=_key_order):
+        amount, payments = revenue[key]
+        if amount or payments:
+            _add_revenue(key, amount, payments, now)
+
+
+def _add_paid(invoice_model, invoice_id, amount, now):
+    # Every F() below reads the row as it was before this UPDATE
+    invoice_model.objects.filter(pk=invoice_id).update(
+        amount_paid=F('amount_paid') + amount,
+        balance=F('total_amount') - F('amount_paid') - amount,
+        status=Case(
+            When(total_amount__lte=F('amount_paid') + amount, then=Value('paid')),
+            default=Value('unpaid'),
+        ),
+        updated_at=now,
+    )
+
+
+def _add_revenue(key, amount, payments, now):
+    from .models import DailyRevenue
+
+    day, department_id, method = key
+    rows = DailyRevenue.objects.filter(date=day, department_id=department_id, method=method)
+    changes = {'amount': F('amount') + amount, 'payments': F('payments') + payments, 'updated_at': now}
+    if not rows.update(**changes):
+        try:
+            with transaction.atomic():
+                DailyRevenue.objects.create(
+                    date=day, department_id=department_id, method=method, amount=amount, payments=payments,
+                )
+        except IntegrityError:
+            # Another transaction created the row in the meantime
+            rows.update(**changes)
+    if payments < 0:
+        rows.filter(payments__lte=0).delete()
+
+
+def _key_order(key):
+    day, department_id, method = key
+    return day, department_id or 0, method
+
+
+def move_invoice_revenue(invoice_id, old_department_id, new_department_id):
+    """Move the revenue of an invoice's payments when its department changes."""
+    from .models import Payment
+
+    totals = (
+        Payment.objects.filter(invoice_id=invoice_id).order_by()
+        .values_list(TruncDate('paid_at'), 'method')
+        .annotate(total=Sum('amount'), count=Count('id'))
+    )
+    revenue = {}
+    for day, method, amount, payments in totals:
+        revenue[(day, old_department_id, method)] = (-amount, -payments)
+        revenue[(day, new_department_id, method)] = (amount, payments)
+    now = timezone.now()
+    for key in sorted(revenue, key=_key_order):
+        _add_revenue(key, *revenue[key], now)
+
+
+def release_department(department_id):
+    """Fold a department's revenue into the rows without a department."""
+    from .models import DailyRevenue
+
+    rows = DailyRevenue.objects.filter(department_id=department_id)
+    now = timezone.now()
+    for day, method, amount, payments in rows.order_by('date', 'method').values_list('date', 'method', 'amount', 'payments'):
+        _add_revenue((day, None, method), amount, payments, now)
+    rows.delete()
+
+
+# ==========================
+# Rebuild
+# ==========================
+def rebuild():
+    """
+    Recompute invoice totals and the revenue rollup from the Payment table
+    and return how many invoices had drifted and how many rollup rows were
+    written.
+    """
+    from .models import DailyRevenue, Invoice, Payment
+
+    columns = ('id', 'amount_paid', 'balance', 'status')
+    before = {row[0]: row[1:] for row in Invoice.objects.values_list(*columns)}
+
+    paid = (
+        Payment.objects.filter(invoice=OuterRef('pk'))
+        .order_by().values('invoice').annotate(total=Sum('amount')).values('total')
+    )
+    Invoice.objects.update(amount_paid=Coalesce(
+        Subquery(paid), Value(0), output_field=Invoice._meta.get_field('amount_paid'),
+    ))
+    Invoice.objects.update(
+        balance=F('total_amount') - F('amount_paid'),
+        status=Case(When(total_amount__lte=F('amount_paid'), then=Value('paid')), default=Value('unpaid')),
+    )
+
+    after = {row[0]: row[1:] for row in Invoice.objects.values_list(*columns)}
+    changed = [pk for pk, value in after.items() if before.get(pk) != value]
+    if changed:
+        Invoice.objects.filter(pk__in=changed).update(updated_at=timezone.now())
+
+    totals = (
+        Payment.objects.order_by()
+        .values(day=TruncDate('paid_at'), department=F('invoice__department'), pay_method=F('method'))
+        .annotate(total=Sum('amount'), count=Count('id'))
+    )
+    DailyRevenue.objects.all().delete()
+    rows = DailyRevenue.objects.bulk_create([
+        DailyRevenue(
+            date=row['day'], department_id=row['department'], method=row['pay_method'],
+            amount=row['total'], payments=row['count'],
+        )
+        for row in totals.iterator()
+    ], batch_size=1000)
+    return len(changed), len(rows)
+
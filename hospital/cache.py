@@ -0,0 +1,107 @@
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+# ==========================
+# Response cache
+# ==========================
+class ResponseCache:
+    """
+    Versioned cache of API response data.
+
+    Every model has a version number stored next to the entries. Keys embed
+    the versions of the models a response depends on, so bumping a version
+    (on save/delete) makes all older entries unreachable; they simply age
+    out of the backend. The backend is any Django cache alias: local-memory
+    LRU by default, Redis when RESPONSE_CACHE_URL is set. The a-prefixed
+    methods are the same calls through the backend's async API, for the
+    async views.
+    """
+
+    def __init__(self, alias='responses', timeout=300, prefix='resp'):
+        self.alias = alias
+        self.timeout = timeout
+        self.prefix = prefix
+        self.counters = Counter()
+        self.lock = threading.Lock()
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def version_key(self, model):
+        return f'{self.prefix}:version:{model._meta.label_lower}'
+
+    def versions(self, models):
+        keys = [self.version_key(model) for model in models]
+        versions = self.backend.get_many(keys)
+        for key in keys:
+            if key not in versions:
+                # Start from the clock, not 1, so an evicted version can't
+                # collide with entries written under an older one
+                versions[key] = time.time_ns()
+                self.backend.add(key, versions[key], timeout=None)
+        return '.'.join(str(versions[key]) for key in keys)
+
+    async def aversions(self, models):
+        keys = [self.version_key(model) for model in models]
+        versions = await self.backend.aget_many(keys)
+        for key in keys:
+            if key not in versions:
+                versions[key] = time.time_ns()
+                await self.backend.aadd(key, versions[key], timeout=None)
+        return '.'.join(str(versions[key]) for key in keys)
+
+    def invalidate(self, model):
+        """Bump the model's version once the current transaction commits."""
+        transaction.on_commit(lambda: self.backend.set(self.version_key(model), time.time_ns(), timeout=None))
+
+    def key(self, name, request, models):
+        return self.entry_key(name, request, self.versions(models))
+
+    async def akey(self, name, request, models):
+        return self.entry_key(name, request, await self.aversions(models))
+
+    def entry_key(self, name, request, versions):
+        digest = hashlib.sha1(f'{request.get_host()}{request.get_full_path()}'.encode()).hexdigest()
+        return f'{self.prefix}:{name}:{versions}:{digest}'
+
+    def get(self, name, key):
+        data = self.backend.get(key)
+        self.count(name, 'hits' if data is not None else 'misses')
+        return data
+
+    async def aget(self, name, key):
+        data = await self.backend.aget(key)
+        self.count(name, 'hits' if data is not None else 'misses')
+        return data
+
+    def set(self, key, data):
+        self.backend.set(key, data, timeout=self.timeout)
+
+    async def aset(self, key, data):
+        await self.backend.aset(key, data, timeout=self.timeout)
+
+    def count(self, name, outcome):
+        with self.lock:
+            self.counters[(name, outcome)] += 1
+
+    def stats(self):
+        """{name: {'hits': n, 'misses': n}} for this process."""
+        with self.lock:
+            stats = {}
+            for (name, outcome), value in self.counters.items():
+                stats.setdefault(name, {'hits': 0, 'misses': 0})[outcome] = value
+            return stats
+
+
+response_cache = ResponseCache(
+    alias=getattr(settings, 'RESPONSE_CACHE_ALIAS', 'responses'),
+    timeout=getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300),
+)
@@ -0,0 +1,74 @@
+from django.utils import timezone
+
+LINES_PER_PAGE = 52
+
+
+# ==========================
+# PDF
+# ==========================
+def text_pdf(lines):
+    """
+    A4 PDF of plain text lines in Helvetica, as bytes. Enough for invoices
+    without a PDF library; characters outside Latin-1 are replaced.
+    """
+    pages = [lines[start:start + LINES_PER_PAGE] for start in range(0, len(lines), LINES_PER_PAGE)] or [[]]
+    # 1 catalog, 2 page tree, 3 font, then a page and its content per page
+    page_ids = [4 + 2 * index for index in range(len(pages))]
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [%s] /Count %d >>' % (b' '.join(b'%d 0 R' % page for page in page_ids), len(pages)),
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+    ]
+    for page_id, page_lines in zip(page_ids, pages):
+        text = ['BT', '/F1 10 Tf', '14 TL', '50 800 Td'] + [f'({_escape(line)}) Tj T*' for line in page_lines] + ['ET']
+        stream = '\n'.join(text).encode('latin-1', 'replace')
+        objects.append(
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+            b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % (page_id + 1)
+        )
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream))
+
+    pdf = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+    xref = len(pdf)
+    pdf += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    pdf += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    pdf += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(pdf)
+
+
+def _escape(text):
+    return str(text).replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+# ==========================
+# Invoice
+# ==========================
+def invoice_lines(invoice):
+    patient = invoice.patient
+    lines = [
+        f'INVOICE #{invoice.pk}',
+        '',
+        f'Patient: {patient.first_name} {patient.last_name}',
+        f'Department: {invoice.department.name if invoice.department else "-"}',
+        f'Date: {timezone.localtime(invoice.created_at):%Y-%m-%d}',
+        f'Status: {invoice.get_status_display()}',
+        '',
+        f'Total: {invoice.total_amount:>14,.2f}',
+        f'Paid: {invoice.amount_paid:>15,.2f}',
+        f'Balance: {invoice.balance:>12,.2f}',
+        '',
+        'Payments',
+    ]
+    payments = [
+        f'  {timezone.localtime(payment.paid_at):%Y-%m-%d}  {payment.get_method_display():<14} {payment.amount:>12,.2f}'
+        for payment in invoice.payments.order_by('paid_at', 'id')
+    ]
+    return lines + (payments or ['  None'])
+
+
+def invoice_pdf(invoice):
+    return text_pdf(invoice_lines(invoice))
@@ -0,0 +1,294 @@
+from datetime import datetime, time, timedelta
+
+from django.core import checks
+from django.utils import timezone
+from django_filters import rest_framework as filters
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .models import (
+    Patient, Department, Doctor, Appointment, Schedule, Ward, Room, Admission,
+    Treatment, Medication, Nurse, LabTest, LabReport, Prescription, Invoice, Payment
+)
+
+
+# ==========================
+# Filter types
+# ==========================
+def by_id(lookup):
+    """Filter on a foreign key column by id, without loading the row to validate it."""
+    return filters.NumberFilter(field_name=f'{lookup}_id')
+
+
+class DayFilter(filters.DateFilter):
+    """
+    `from`/`to` bound of a datetime column by calendar day (inclusive),
+    compared with the bare column so its index still applies.
+    """
+
+    def filter(self, qs, value):
+        if value in (None, ''):
+            return qs
+        start = timezone.make_aware(datetime.combine(value, time.min))
+        if self.lookup_expr == 'gte':
+            return qs.filter(**{f'{self.field_name}__gte': start})
+        return qs.filter(**{f'{self.field_name}__lt': start + timedelta(days=1)})
+
+
+def day_range(field_name):
+    return DayFilter(field_name=field_name, lookup_expr='gte'), DayFilter(field_name=field_name, lookup_expr='lt')
+
+
+# ==========================
+# Filter sets
+# ==========================
+# Dates use `<name>_from` / `<name>_to` (YYYY-MM-DD, inclusive) like the
+# reports; repeat `status` to match several, e.g. ?status=pending&status=confirmed.
+class PatientFilter(filters.FilterSet):
+    gender = filters.ChoiceFilter(choices=Patient.CHOOSE_GENDER)
+    blood_group = filters.ChoiceFilter(choices=Patient.CHOOSES_BLOOD_GROUP)
+
+    class Meta:
+        model = Patient
+        fields = ['gender', 'blood_group']
+
+
+class DepartmentFilter(filters.FilterSet):
+    name = filters.CharFilter(lookup_expr='icontains')
+
+    class Meta:
+        model = Department
+        fields = ['name']
+
+
+class DoctorFilter(filters.FilterSet):
+    department = by_id('department')
+    is_active = filters.BooleanFilter()
+    specialization = filters.CharFilter(lookup_expr='iexact')
+
+    class Meta:
+        model = Doctor
+        fields = ['department', 'is_active', 'specialization']
+
+
+class AppointmentFilter(filters.FilterSet):
+    patient = by_id('patient')
+    doctor = by_id('doctor')
+    status = filters.MultipleChoiceFilter(choices=Appointment.STATUS_CHOICES)
+    date = filters.DateFilter()
+    date_from = filters.DateFilter(field_name='date', lookup_expr='gte')
+    date_to = filters.DateFilter(field_name='date', lookup_expr='lte')
+
+    class Meta:
+        model = Appointment
+        fields = ['patient', 'doctor', 'status', 'date']
+
+
+class ScheduleFilter(filters.FilterSet):
+    doctor = by_id('doctor')
+    weekday = filters.ChoiceFilter(choices=Schedule.WEEKDAYS)
+
+    class Meta:
+        model = Schedule
+        fields = ['doctor', 'weekday']
+
+
+class WardFilter(filters.FilterSet):
+    type = filters.ChoiceFilter(choices=Ward.WARD_CHOOSE)
+
+    class Meta:
+        model = Ward
+        fields = ['type']
+
+
+class RoomFilter(filters.FilterSet):
+    ward = by_id('ward')
+    is_available = filters.BooleanFilter()
+
+    class Meta:
+        model = Room
+        fields = ['ward', 'is_available']
+
+
+class AdmissionFilter(filters.FilterSet):
+    patient = by_id('patient')
+    room = by_id('room')
+    ward = by_id('room__ward')
+    status = filters.MultipleChoiceFilter(choices=Admission.STATUS_CHOOSE)
+    admitted_from, admitted_to = day_range('admitted_at')
+
+    class Meta:
+        model = Admission
+        fields = ['patient', 'room', 'ward', 'status']
+
+
+class TreatmentFilter(filters.FilterSet):
+    admission = by_id('admission')
+    doctor = by_id('doctor')
+    date_from = filters.DateFilter(field_name='treatment_date', lookup_expr='gte')
+    date_to = filters.DateFilter(field_name='treatment_date', lookup_expr='lte')
+
+    class Meta:
+        model = Treatment
+        fields = ['admission', 'doctor']
+
+
+class MedicationFilter(filters.FilterSet):
+    treatment = by_id('treatment')
+
+    class Meta:
+        model = Medication
+        fields = ['treatment']
+
+
+class NurseFilter(filters.FilterSet):
+    department = by_id('department')
+    room = by_id('assign_room')
+
+    class Meta:
+        model = Nurse
+        fields = ['department', 'room']
+
+
+class LabTestFilter(filters.FilterSet):
+    name = filters.CharFilter(field_name='test_name', lookup_expr='icontains')
+    price_min = filters.NumberFilter(field_name='price', lookup_expr='gte')
+    price_max = filters.NumberFilter(field_name='price', lookup_expr='lte')
+
+    class Meta:
+        model = LabTest
+        fields = ['name']
+
+
+class LabReportFilter(filters.FilterSet):
+    patient = by_id('patient')
+    doctor = by_id('doctor')
+    test = by_id('test')
+    created_from, created_to = day_range('created_at')
+
+    class Meta:
+        model = LabReport
+        fields = ['patient', 'doctor', 'test']
+
+
+class PrescriptionFilter(filters.FilterSet):
+    patient = by_id('patient')
+    doctor = by_id('doctor')
+    appointment = by_id('appointment')
+    created_from, created_to = day_range('created_at')
+
+    class Meta:
+        model = Prescription
+        fields = ['patient', 'doctor', 'appointment']
+
+
+class InvoiceFilter(filters.FilterSet):
+    patient = by_id('patient')
+    admission = by_id('admission')
+    department = by_id('department')
+    status = filters.ChoiceFilter(choices=Invoice.STATUS_CHOOSE)
+    created_from, created_to = day_range('created_at')
+
+    class Meta:
+        model = Invoice
+        fields = ['patient', 'admission', 'department', 'status']
+
+
+class PaymentFilter(filters.FilterSet):
+    invoice = by_id('invoice')
+    method = filters.MultipleChoiceFilter(choices=Payment.METHOD_CHOOSE)
+    paid_from, paid_to = day_range('paid_at')
+
+    class Meta:
+        model = Payment
+        fields = ['invoice', 'method']
+
+
+# ==========================
+# Ordering
+# ==========================
+class IndexedOrderingFilter(BaseFilterBackend):
+    """
+    `?ordering=<name>` or `?ordering=-<name>`, limited to the view's
+    `ordering_fields`: {name: [columns]}, each list the leading columns of
+    an index on the model, so every allowed sort is an index scan in either
+    direction (see check_ordering_indexes). `id` is always allowed. Anything
+    else is a 400 rather than a silent full sort.
+    """
+    ordering_param = 'ordering'
+
+    def get_ordering_fields(self, view):
+        return {'id': ['id'], **getattr(view, 'ordering_fields', {})}
+
+    def filter_queryset(self, request, queryset, view):
+        value = request.query_params.get(self.ordering_param)
+        if not value:
+            return queryset
+        allowed = self.get_ordering_fields(view)
+        name = value.strip().lstrip('-')
+        if name not in allowed:
+            raise ValidationError({self.ordering_param: [f"Order by one of: {', '.join(sorted(allowed))}, optionally with a leading -."]})
+        sign = '-' if value.strip().startswith('-') else ''
+        ordering = [sign + column for column in allowed[name]]
+        queryset = queryset.order_by(*ordering)
+        loaded, deferred = queryset.query.deferred_loading
+        if loaded and not deferred:
+            # ?fields= loaded only some columns; keyset pagination reads the ordering ones
+            queryset = queryset.only(*loaded, *allowed[name])
+        return queryset
+
+
+def index_columns(model):
+    """Column lists, with directions, of the full indexes on `model`."""
+    columns = [[model._meta.pk.name]]
+    for index in model._meta.indexes:
+        if index.condition is None and index.fields:
+            columns.append(list(index.fields))
+    for constraint in model._meta.constraints:
+        if getattr(constraint, 'condition', None) is None and getattr(constraint, 'fields', None):
+            columns.append(list(constraint.fields))
+    return columns
+
+
+def serves_ordering(index, columns):
+    """Whether scanning `index` (forwards or backwards) returns rows ordered by `columns`, all one way."""
+    prefix = index[:len(columns)]
+    return (
+        [field.lstrip('-') for field in prefix] == list(columns)
+        and len({field.startswith('-') for field in prefix}) == 1
+    )
+
+
+def check_ordering_indexes(app_configs=None, **kwargs):
+    """
+    Every whitelisted ordering must be served by an index, over columns that
+    can't be NULL (see KeysetPagination), and lean rows must carry them.
+    """
+    from . import views
+
+    errors = []
+    for viewset in vars(views).values():
+        model = getattr(getattr(viewset, 'queryset', None), 'model', None)
+        if model is None or not getattr(viewset, 'ordering_fields', None):
+            continue
+        indexes = index_columns(model)
+        for name, columns in viewset.ordering_fields.items():
+            # keyset pagination adds `id` as the tiebreaker
+            if not any(serves_ordering(index, [*columns, 'id']) for index in indexes):
+                errors.append(checks.Error(
+                    f'{viewset.__name__}.ordering_fields[{name!r}] ({", ".join(columns)}) then id, is not the start of an index on {model.__name__}.',
+                    id='hospital.E001',
+                ))
+            nullable = [column for column in columns if model._meta.get_field(column).null]
+            if nullable:
+                errors.append(checks.Error(
+                    f'{viewset.__name__}.ordering_fields[{name!r}] orders by nullable {", ".join(nullable)}, which keyset pagination would skip rows of.',
+                    id='hospital.E003',
+                ))
+            lean_fields = getattr(viewset, 'lean_fields', None)
+            if lean_fields and not set(columns) <= set(lean_fields):
+                errors.append(checks.Error(
+                    f'{viewset.__name__}.ordering_fields[{name!r}] needs {", ".join(columns)} in lean_fields for keyset pagination.',
+                    id='hospital.E002',
+                ))
+    return errors
@@ -0,0 +1,57 @@
+import tempfile
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.http import HttpRequest, QueryDict
+from django.utils.module_loading import import_string
+from rest_framework.request import Request
+
+from tasks.queue import task
+
+from . import documents
+from .models import Invoice
+
+
+# ==========================
+# Documents
+# ==========================
+@task(queue='documents', max_attempts=3, concurrency=4)
+def render_invoice_pdf(invoice_id):
+    invoice = Invoice.objects.select_related('patient', 'department').get(pk=invoice_id)
+    storage = storages['documents']
+    name = storage.save(f'invoices/{invoice_id}/invoice-{invoice_id}.pdf', ContentFile(documents.invoice_pdf(invoice)))
+    return {'name': name, 'url': storage.url(name)}
+
+
+# ==========================
+# Exports
+# ==========================
+@task(queue='documents', max_attempts=3, concurrency=2)
+def export_rows(view, basename, query, kwargs, user_id):
+    """
+    ExportMixin.export for a POST: rebuild the viewset with the request's
+    query string, URL kwargs and user, and write the export to storage.
+    """
+    request = HttpRequest()
+    request.method = 'GET'
+    request.GET = QueryDict(query)
+    user = get_user_model().objects.filter(pk=user_id).first() if user_id else None
+    viewset = import_string(view)(basename=basename, action='export', args=(), kwargs=kwargs, format_kwarg=None)
+    viewset.request = Request(request)
+    viewset.request.user = user or AnonymousUser()
+
+    stream, _, filename = viewset.export_stream(request.GET.get('output', 'csv'))
+    # Spooled: small exports stay in memory, big ones go to a temp file
+    with tempfile.SpooledTemporaryFile(max_size=8 * 2**20) as spool:
+        rows = 0
+        for chunk in stream:
+            spool.write(chunk.encode())
+            rows += 1
+        spool.seek(0)
+        storage = storages['documents']
+        name = storage.save(f'exports/{uuid.uuid4().hex}/{filename}', File(spool, name=filename))
+    return {'name': name, 'url': storage.url(name), 'lines': rows}
@@ -0,0 +1,119 @@
+import json
+import re
+import time as clock
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from hospital import urls
+from hospital.benchmarks import RowSampler, api_routes, rss_mb, summarize
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive every list, detail and nested route in hospital/urls.py in process and "
+        "report p50/p95/p99 latency, queries per request and RSS. Results can be saved "
+        "as a baseline and later runs compared against it. Load a dataset first, "
+        "e.g. with generate_dataset."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Measured requests per route.')
+        parser.add_argument('--warmup', type=int, default=5, help='Unmeasured requests per route.')
+        parser.add_argument('--routes', help='Only routes whose name matches this regex.')
+        parser.add_argument('--host', default='127.0.0.1', help='Host header, must be in ALLOWED_HOSTS.')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--page-size', type=int, default=50, help='?page_size= of list routes; 0 for the unpaginated array.',
+        )
+        parser.add_argument('--save-baseline', metavar='PATH')
+        parser.add_argument('--compare', metavar='PATH', help='Baseline to compare with; exits 1 on regressions.')
+        parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed p95 slowdown, 0.2 = 20%%.')
+
+    def handle(self, *args, **options):
+        self.sampler = RowSampler(options['seed'])
+        self.client = Client(raise_request_exception=False, HTTP_HOST=options['host'])
+        self.page_size = options['page_size']
+
+        routes = list(api_routes(urls.urlpatterns))
+        if options['routes']:
+            routes = [route for route in routes if re.search(options['routes'], route[0])]
+        if not routes:
+            raise CommandError('No routes to benchmark.')
+
+        results = {}
+        self.stdout.write(f"{'route':<36} {'p50':>8} {'p95':>8} {'p99':>8} {'queries':>8} {'errors':>6} {'rss':>8}")
+        for name, viewset, kwarg_names in routes:
+            result = self.run_route(name, viewset, kwarg_names, options['warmup'], options['requests'])
+            if result is None:
+                self.stdout.write(f'{name:<36} skipped, no rows')
+                continue
+            results[name] = result
+            self.stdout.write(
+                f"{name:<36} {result['p50_ms']:>6.1f}ms {result['p95_ms']:>6.1f}ms {result['p99_ms']:>6.1f}ms "
+                f"{result['queries']:>8.1f} {result['errors']:>6} {result['rss_mb']:>6.1f}MB"
+            )
+
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as baseline:
+                json.dump({'requests': options['requests'], 'routes': results}, baseline, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved to {options['save_baseline']}."))
+        if options['compare']:
+            self.compare(options['compare'], results, options['tolerance'])
+
+    # ==========================
+    # Requests
+    # ==========================
+    def run_route(self, name, viewset, kwarg_names, warmup, requests):
+        latencies, queries, errors = [], [], 0
+        for attempt in range(warmup + requests):
+            kwargs = self.sampler.kwargs(viewset, kwarg_names)
+            if kwargs is None:
+                return None
+            url = reverse(name, kwargs=kwargs)
+            if self.page_size and 'pk' not in kwargs:
+                url += f'?page_size={self.page_size}'
+            with CaptureQueriesContext(connection) as captured:
+                started = clock.perf_counter()
+                response = self.client.get(url)
+                elapsed = clock.perf_counter() - started
+            if attempt < warmup:
+                continue
+            latencies.append(elapsed)
+            queries.append(len(captured))
+            errors += response.status_code != 200
+        return {
+            **summarize(latencies),
+            'queries': round(sum(queries) / len(queries), 2),
+            'max_queries': max(queries),
+            'errors': errors,
+            'rss_mb': rss_mb(),
+        }
+
+    # ==========================
+    # Baselines
+    # ==========================
+    def compare(self, path, results, tolerance):
+        with open(path) as baseline:
+            baseline = json.load(baseline)['routes']
+        regressions = []
+        for name, result in results.items():
+            before = baseline.get(name)
+            if before is None:
+                continue
+            # Ignore sub-millisecond noise on fast routes
+            if result['p95_ms'] > before['p95_ms'] * (1 + tolerance) and result['p95_ms'] - before['p95_ms'] > 1:
+                regressions.append(f"{name}: p95 {before['p95_ms']}ms -> {result['p95_ms']}ms")
+            if result['max_queries'] > before['max_queries']:
+                regressions.append(f"{name}: queries {before['max_queries']} -> {result['max_queries']}")
+            if result['errors'] > before['errors']:
+                regressions.append(f"{name}: errors {before['errors']} -> {result['errors']}")
+
+        if regressions:
+            for line in regressions:
+                self.stderr.write(self.style.ERROR(line))
+            raise SystemExit(1)
+        self.stdout.write(self.style.SUCCESS(f'No regressions against {path}.'))
@@ -0,0 +1,90 @@
+import random
+import time as clock
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.db.models import Count
+
+from hospital.benchmarks import summarize
+from hospital.models import Appointment, Department, Doctor, Patient
+from hospital.serializers import AppointmentSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Book appointments for a handful of slots from a thread pool and check "
+        "that no slot ends up double booked. Run it against PostgreSQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--attempts', type=int, default=2000)
+        parser.add_argument('--slots', type=int, default=50, help='Distinct slots the attempts compete for.')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark rows afterwards.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stderr.write(self.style.WARNING(
+                f'Running on {connection.vendor}; concurrency results are only meaningful on PostgreSQL.'
+            ))
+
+        department = Department.objects.create(name='Benchmark', description='benchmark_booking')
+        doctor = Doctor.objects.create(
+            name='Benchmark Doctor', department=department, specialization='-', phone='-',
+            email=f'benchmark-{clock.time_ns()}@example.com', qualification='-', active_time=time(9),
+        )
+        patients = Patient.objects.bulk_create([
+            Patient(
+                first_name='Benchmark', last_name=str(i), email=f'benchmark-{clock.time_ns()}-{i}@example.com',
+                phone='-', gender='male', dob=date(1990, 1, 1), blood_group='O+', address='-',
+                emergency_contact='-',
+            )
+            for i in range(options['threads'])
+        ])
+        day = date.today() + timedelta(days=365)
+        slots = [(time(8 + i // 4 % 12, i % 4 * 15), day + timedelta(days=i // 48)) for i in range(options['slots'])]
+
+        def book(attempt):
+            slot_time, slot_date = random.choice(slots)
+            started = clock.perf_counter()
+            serializer = AppointmentSerializer(data={
+                'patient': patients[attempt % len(patients)].id, 'doctor': doctor.id,
+                'date': slot_date, 'time': slot_time,
+            })
+            booked = serializer.is_valid() and bool(serializer.save())
+            return booked, clock.perf_counter() - started
+
+        def worker(attempts):
+            try:
+                return [book(attempt) for attempt in attempts]
+            finally:
+                connections.close_all()
+
+        chunks = [range(i, options['attempts'], options['threads']) for i in range(options['threads'])]
+        started = clock.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            results = [result for chunk in pool.map(worker, chunks) for result in chunk]
+        elapsed = clock.perf_counter() - started
+
+        booked = sum(1 for ok, _ in results if ok)
+        duplicates = (
+            Appointment.objects.filter(doctor=doctor).exclude(status='cancelled')
+            .values('date', 'time').annotate(n=Count('id')).filter(n__gt=1).count()
+        )
+        stats = summarize([latency for _, latency in results])
+        self.stdout.write(
+            f"attempts={len(results)} booked={booked} rejected={len(results) - booked} "
+            f"double_booked_slots={duplicates} throughput={len(results) / elapsed:.1f}/s "
+            f"p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms p99={stats['p99_ms']}ms"
+        )
+
+        if not options['keep']:
+            Patient.objects.filter(id__in=[patient.id for patient in patients]).delete()
+            department.delete()
+
+        if duplicates or booked > len(slots):
+            self.stderr.write(self.style.ERROR('Some slots were booked more than once.'))
+            raise SystemExit(1)
+        self.stdout.write(self.style.SUCCESS('No double bookings.'))
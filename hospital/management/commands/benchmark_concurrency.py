@@ -0,0 +1,195 @@
+import asyncio
+import re
+import threading
+import time as clock
+import urllib.error
+import urllib.request
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.urls import reverse
+
+from hospital.benchmarks import RowSampler, summarize
+from hospital.views import AppointmentViewSet, DoctorViewSet, PatientViewSet, RoomViewSet
+
+# (sync route, async route, viewset, detail)
+ROUTES = [
+    (f'{name}-{kind}', f'async-{name}-{kind}', viewset, kind == 'detail')
+    for name, viewset in [
+        ('appointment', AppointmentViewSet), ('patient', PatientViewSet),
+        ('doctor', DoctorViewSet), ('room', RoomViewSet),
+    ]
+    for kind in ('list', 'detail')
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare throughput and latency of the sync API (WSGI) with its async copy "
+        "under /api/v1/async/ (ASGI) at several client concurrencies. By default "
+        "requests go straight into Django's WSGI and ASGI handlers in this process; "
+        "with --wsgi-url/--asgi-url they go to running servers instead, e.g. "
+        "`gunicorn hospital_management.wsgi` and `uvicorn hospital_management.asgi:application`."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', default='1,10,50', help='Comma-separated client counts.')
+        parser.add_argument('--requests', type=int, default=500, help='Requests per stack and concurrency.')
+        parser.add_argument('--routes', help='Only routes whose sync name matches this regex.')
+        parser.add_argument('--host', default='127.0.0.1', help='Host header, must be in ALLOWED_HOSTS.')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--wsgi-url', help='Base URL of a running WSGI server.')
+        parser.add_argument('--asgi-url', help='Base URL of a running ASGI server.')
+
+    def handle(self, *args, **options):
+        try:
+            levels = [int(level) for level in options['concurrency'].split(',')]
+        except ValueError:
+            raise CommandError('--concurrency takes numbers, e.g. 1,10,50.')
+        routes = [route for route in ROUTES if not options['routes'] or re.search(options['routes'], route[0])]
+        if not routes:
+            raise CommandError('No routes to benchmark.')
+        if bool(options['wsgi_url']) != bool(options['asgi_url']):
+            raise CommandError('Give both --wsgi-url and --asgi-url, or neither.')
+
+        self.host = options['host']
+        paths = self.build_paths(routes, options['requests'], options['seed'])
+        if options['wsgi_url']:
+            stacks = [
+                ('wsgi', lambda level: self.run_http(options['wsgi_url'], paths['wsgi'], level)),
+                ('asgi', lambda level: self.run_http(options['asgi_url'], paths['asgi'], level)),
+            ]
+        else:
+            stacks = [
+                ('wsgi', lambda level: self.run_wsgi(paths['wsgi'], level)),
+                ('asgi', lambda level: asyncio.run(self.run_asgi(paths['asgi'], level))),
+            ]
+
+        self.stdout.write(f"{'stack':<6} {'clients':>7} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>6}")
+        for level in levels:
+            for name, run in stacks:
+                started = clock.perf_counter()
+                latencies, errors = run(level)
+                elapsed = clock.perf_counter() - started
+                result = summarize(latencies)
+                self.stdout.write(
+                    f"{name:<6} {level:>7} {len(latencies) / elapsed:>8.1f} {result['p50_ms']:>6.1f}ms "
+                    f"{result['p95_ms']:>6.1f}ms {result['p99_ms']:>6.1f}ms {errors:>6}"
+                )
+
+    def build_paths(self, routes, count, seed):
+        """The same request mix, by URL path, for both stacks."""
+        sampler = RowSampler(seed)
+        paths = {'wsgi': [], 'asgi': []}
+        while len(paths['wsgi']) < count:
+            sync_name, async_name, viewset, detail = routes[len(paths['wsgi']) % len(routes)]
+            kwargs = {'pk': sampler.pk(viewset.queryset.model)} if detail else {}
+            if detail and kwargs['pk'] is None:
+                raise CommandError(f'No rows for {sync_name}; run generate_dataset first.')
+            paths['wsgi'].append(reverse(sync_name, kwargs=kwargs))
+            paths['asgi'].append(reverse(async_name, kwargs=kwargs))
+        return paths
+
+    # ==========================
+    # Clients
+    # ==========================
+    def run_threads(self, paths, level, request):
+        """`level` threads working through `paths`, each calling request(path) -> status."""
+        pending = iter(paths)
+        lock = threading.Lock()
+        latencies, errors = [], []
+
+        def worker():
+            while True:
+                with lock:
+                    path = next(pending, None)
+                if path is None:
+                    break
+                started = clock.perf_counter()
+                status = request(path)
+                with lock:
+                    latencies.append(clock.perf_counter() - started)
+                    errors.append(status != 200)
+            connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(level)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies, sum(errors)
+
+    def run_wsgi(self, paths, level):
+        handler = WSGIHandler()
+
+        def request(path):
+            url = urlsplit(path)
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': url.path, 'QUERY_STRING': url.query,
+                'SERVER_NAME': self.host, 'SERVER_PORT': '80', 'HTTP_HOST': self.host,
+                'wsgi.url_scheme': 'http', 'wsgi.input': BytesIO(), 'wsgi.errors': BytesIO(),
+            }
+            status = []
+            response = handler(environ, lambda code, headers: status.append(int(code.split()[0])))
+            b''.join(response)
+            response.close()
+            return status[0]
+        return self.run_threads(paths, level, request)
+
+    async def run_asgi(self, paths, level):
+        handler = ASGIHandler()
+        pending = iter(paths)
+        latencies, errors = [], 0
+
+        async def request(path):
+            url = urlsplit(path)
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': url.path, 'raw_path': url.path.encode(), 'root_path': '',
+                'query_string': url.query.encode(), 'headers': [(b'host', self.host.encode())],
+                'client': ('127.0.0.1', 0), 'server': (self.host, 80),
+            }
+            received = asyncio.Event()
+            status = []
+
+            async def receive():
+                if received.is_set():
+                    # Nothing more to send: wait for the handler to cancel us
+                    await asyncio.Future()
+                received.set()
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+            await handler(scope, receive, send)
+            return status[0]
+
+        async def worker():
+            nonlocal errors
+            for path in pending:
+                started = clock.perf_counter()
+                status = await request(path)
+                latencies.append(clock.perf_counter() - started)
+                errors += status != 200
+
+        await asyncio.gather(*(worker() for _ in range(level)))
+        return latencies, errors
+
+    def run_http(self, base_url, paths, level):
+        base_url = base_url.rstrip('/')
+
+        def request(path):
+            try:
+                with urllib.request.urlopen(base_url + path, timeout=30) as response:
+                    response.read()
+                    return response.status
+            except urllib.error.HTTPError as error:
+                return error.code
+            except OSError:
+                return 0
+        return self.run_threads(paths, level, request)
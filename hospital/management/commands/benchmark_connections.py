@@ -0,0 +1,110 @@
+import copy
+import importlib.util
+import time as clock
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from hospital.benchmarks import summarize
+
+# (name, settings overrides); 'configured' runs the DATABASES settings as they are
+MODES = [
+    ('per-request', {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False}),
+    ('persistent', {'CONN_MAX_AGE': 600, 'CONN_HEALTH_CHECKS': False}),
+    ('persistent+checks', {'CONN_MAX_AGE': 600, 'CONN_HEALTH_CHECKS': True}),
+    ('pool', {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'OPTIONS': {'pool': True}}),
+    ('configured', {}),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure what connection reuse saves per request. Each simulated request "
+        "goes through Django's request lifecycle for the default database (close "
+        "old connections, run one query, close old connections) under each "
+        "connection mode: a new connection per request, persistent connections "
+        "with and without health checks, the psycopg 3 pool and the configured "
+        "settings. Run it against the real database host to see the TCP+TLS+auth "
+        "handshake cost."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Simulated requests per mode.')
+        parser.add_argument('--modes', help=f"Comma-separated subset of: {', '.join(name for name, _ in MODES)}.")
+
+    def handle(self, *args, **options):
+        wanted = options['modes'].split(',') if options['modes'] else [name for name, _ in MODES]
+        unknown = set(wanted) - {name for name, _ in MODES}
+        if unknown:
+            raise CommandError(f"Unknown mode(s): {', '.join(sorted(unknown))}.")
+        default = connections['default']
+        self.stdout.write(f"{default.vendor} at {default.settings_dict['HOST'] or 'localhost'}, {options['requests']} requests per mode")
+        self.stdout.write(f"{'mode':<18} {'connects':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'saved p50':>10}")
+
+        baseline = None
+        for name, overrides in MODES:
+            if name not in wanted:
+                continue
+            if 'pool' in overrides.get('OPTIONS', {}) and not self.pool_available(default):
+                self.stdout.write(f"{name:<18} skipped: needs PostgreSQL with psycopg 3 and psycopg_pool")
+                continue
+            wrapper = self.make_wrapper(default, name, overrides)
+            try:
+                latencies, connects = self.run(wrapper, options['requests'])
+            finally:
+                self.close(wrapper)
+            result = summarize(latencies)
+            if name == 'per-request':
+                baseline = result['p50_ms']
+            saved = f"{baseline - result['p50_ms']:>8.2f}ms" if baseline is not None else f"{'-':>10}"
+            self.stdout.write(
+                f"{name:<18} {connects:>8} {result['p50_ms']:>6.2f}ms {result['p95_ms']:>6.2f}ms "
+                f"{result['p99_ms']:>6.2f}ms {saved}"
+            )
+
+    def pool_available(self, default):
+        from django.db.backends.postgresql.psycopg_any import is_psycopg3
+        return default.vendor == 'postgresql' and is_psycopg3 and importlib.util.find_spec('psycopg_pool') is not None
+
+    def make_wrapper(self, default, name, overrides):
+        """A separate connection to the default database with `overrides` applied."""
+        settings_dict = copy.deepcopy(default.settings_dict)
+        options = overrides.get('OPTIONS')
+        settings_dict.update({key: value for key, value in overrides.items() if key != 'OPTIONS'})
+        if options:
+            settings_dict['OPTIONS'].update(options)
+        return type(default)(settings_dict, alias=f'benchmark-{name}')
+
+    def run(self, wrapper, count):
+        """Latencies of `count` simulated requests and how many connections were opened."""
+        opened = []
+
+        def on_connect(sender, connection, **kwargs):
+            if connection is wrapper:
+                opened.append(connection)
+
+        connection_created.connect(on_connect)
+        latencies = []
+        try:
+            for _ in range(count):
+                started = clock.perf_counter()
+                # request_started / request_finished both call close_old_connections()
+                wrapper.close_if_unusable_or_obsolete()
+                with wrapper.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                    cursor.fetchone()
+                wrapper.close_if_unusable_or_obsolete()
+                latencies.append(clock.perf_counter() - started)
+        finally:
+            connection_created.disconnect(on_connect)
+        pool = getattr(wrapper, '_connection_pools', {}).get(wrapper.alias)
+        if pool is not None:
+            # Pooled checkouts also fire connection_created; count server connections
+            return latencies, pool.get_stats().get('connections_num', 0)
+        return latencies, len(opened)
+
+    def close(self, wrapper):
+        wrapper.close()
+        if hasattr(wrapper, 'close_pool'):
+            wrapper.close_pool()
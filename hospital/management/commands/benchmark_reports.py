@@ -0,0 +1,122 @@
+import time as clock
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max, Min, Sum
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from hospital import reports
+from hospital.benchmarks import summarize
+from hospital.models import DailyRevenue, Invoice, Payment
+
+
+class Command(BaseCommand):
+    help = (
+        "Time each financial report computed by hospital.reports in the database "
+        "against the same report summed row by row in Python, and check that both "
+        "agree. Load a dataset first, e.g. with generate_dataset."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per report and method.')
+
+    def handle(self, *args, **options):
+        bounds = DailyRevenue.objects.aggregate(start=Min('date'), end=Max('date'))
+        if bounds['start'] is None:
+            raise CommandError('No payments to report on; run generate_dataset first.')
+        start, end = bounds['start'], bounds['end']
+        self.as_of = timezone.now()
+
+        cases = [
+            ('revenue per month', lambda: self.python_revenue(start, end), lambda: self.db_revenue(start, end)),
+            ('totals per method', self.python_methods, lambda: self.db_methods(start, end)),
+            ('receivables aging', self.python_aging, self.db_aging),
+            ('outstanding balance', self.python_outstanding, self.db_outstanding),
+        ]
+        self.stdout.write(f'{Payment.objects.count()} payments, {Invoice.objects.count()} invoices, {start} to {end}')
+        self.stdout.write(f"{'report':<22} {'python p50':>11} {'db p50':>9} {'speedup':>8} {'queries':>9} {'match':>6}")
+        mismatches = 0
+        for name, python, database in cases:
+            python_result, python_timing, python_queries = self.measure(python, options['repeat'])
+            db_result, db_timing, db_queries = self.measure(database, options['repeat'])
+            match = python_result == db_result
+            mismatches += not match
+            speedup = python_timing['p50_ms'] / db_timing['p50_ms'] if db_timing['p50_ms'] else 0
+            self.stdout.write(
+                f"{name:<22} {python_timing['p50_ms']:>9.1f}ms {db_timing['p50_ms']:>7.1f}ms {speedup:>7.1f}x "
+                f"{python_queries:>4}/{db_queries:<4} {'yes' if match else 'NO':>6}"
+            )
+        if mismatches:
+            self.stderr.write(self.style.ERROR(f'{mismatches} report(s) differ between Python and the database.'))
+            raise SystemExit(1)
+
+    def measure(self, report, repeat):
+        latencies = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as captured:
+                started = clock.perf_counter()
+                result = report()
+                latencies.append(clock.perf_counter() - started)
+        return result, summarize(latencies), len(captured)
+
+    # ==========================
+    # Row by row in Python
+    # ==========================
+    def python_revenue(self, start, end):
+        totals = defaultdict(Decimal)
+        for paid_at, amount in Payment.objects.values_list('paid_at', 'amount').iterator(chunk_size=5000):
+            day = timezone.localdate(paid_at)
+            if start <= day <= end:
+                totals[day.replace(day=1)] += amount
+        running, rows = Decimal(0), {}
+        for month in sorted(totals):
+            running += totals[month]
+            rows[month] = (totals[month], running)
+        return rows
+
+    def python_methods(self):
+        totals = defaultdict(Decimal)
+        for method, amount in Payment.objects.values_list('method', 'amount').iterator(chunk_size=5000):
+            totals[method] += amount
+        return dict(totals)
+
+    def python_aging(self):
+        buckets = defaultdict(Decimal)
+        for invoice in Invoice.objects.prefetch_related('payments').iterator(chunk_size=2000):
+            outstanding = invoice.total_amount - sum(payment.amount for payment in invoice.payments.all())
+            if outstanding <= 0 or invoice.created_at > self.as_of:
+                continue
+            age = self.as_of - invoice.created_at
+            for label, days in reports.AGING_BUCKETS:
+                if days is None or age < timedelta(days=days):
+                    buckets[label] += outstanding
+                    break
+        return {label: buckets[label] for label, _ in reports.AGING_BUCKETS}
+
+    def python_outstanding(self):
+        total = Decimal(0)
+        for invoice in Invoice.objects.prefetch_related('payments').iterator(chunk_size=2000):
+            total += max(invoice.total_amount - sum(payment.amount for payment in invoice.payments.all()), 0)
+        return total
+
+    # ==========================
+    # In the database
+    # ==========================
+    def db_revenue(self, start, end):
+        return {
+            row['period']: (row['total'], row['running_total'])
+            for row in reports.revenue_by_period(start, end, 'month')
+        }
+
+    def db_methods(self, start, end):
+        return {row['method']: row['total'] for row in reports.method_totals(start, end)}
+
+    def db_aging(self):
+        return {row['bucket']: row['outstanding'] for row in reports.aging(Invoice.objects.all(), self.as_of)}
+
+    def db_outstanding(self):
+        return Invoice.objects.filter(status='unpaid').aggregate(total=Sum('balance'))['total'] or Decimal(0)
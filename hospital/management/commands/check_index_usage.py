@@ -0,0 +1,106 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.urls import reverse
+from rest_framework.test import APIRequestFactory
+
+from hospital import urls
+from hospital.benchmarks import RowSampler, api_routes
+from hospital.pagination import _reverse_ordering
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN the page queries of every list route in hospital/urls.py (the first "
+        "page, and next/previous cursor pages from a row --depth rows in) and check "
+        "that they read the table through an index in the requested order, without a "
+        "full scan or a sort. Exits 1 when a route doesn't."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--routes', help='Only routes whose name matches this regex.')
+        parser.add_argument(
+            '--no-seqscan', action='store_true',
+            help='Discourage sequential scans (PostgreSQL), to check that an index is usable on small tables.',
+        )
+        parser.add_argument(
+            '--depth', type=int, default=1000, help='Rows before the cursor position of the deep page checks.',
+        )
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every plan.')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            raise CommandError(f'Plans from {connection.vendor} are not understood.')
+        routes = [route for route in api_routes(urls.urlpatterns, actions=('list',))]
+        if options['routes']:
+            routes = [route for route in routes if re.search(options['routes'], route[0])]
+
+        if options['no_seqscan'] and connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+
+        sampler = RowSampler()
+        failures = 0
+        for name, viewset, kwarg_names in routes:
+            kwargs = sampler.kwargs(viewset, kwarg_names)
+            if kwargs is None:
+                self.stdout.write(f'{name:<36} skipped, no rows')
+                continue
+            for page, queryset in self.page_querysets(viewset, name, kwargs, options['depth']):
+                label = f'{name} [{page}]'
+                plan = queryset.explain()
+                problems = self.check_plan(plan, queryset.model._meta.db_table)
+                indexes = sorted(set(re.findall(r'(?:USING (?:COVERING )?INDEX|Index (?:Only )?Scan(?: Backward)? using) (\w+)', plan)))
+                if problems:
+                    failures += 1
+                    self.stdout.write(self.style.ERROR(f"{label:<48} {', '.join(problems)}"))
+                else:
+                    self.stdout.write(f"{label:<48} ok ({', '.join(indexes) or 'index'})")
+                if options['verbose_plans'] or problems:
+                    self.stdout.write('    ' + plan.replace('\n', '\n    '))
+
+        if failures:
+            self.stderr.write(self.style.ERROR(f'{failures} page query(s) without a usable index.'))
+            raise SystemExit(1)
+        self.stdout.write(self.style.SUCCESS('Every list route reads through an index.'))
+
+    def page_querysets(self, viewset, name, kwargs, depth):
+        """
+        (page, queryset) for the first page the list action runs, built by the
+        viewset itself, and for the next and previous pages from the cursor
+        position of the row `depth` rows in, if there is one.
+        """
+        view = viewset(action_map={'get': 'list'})
+        view.args, view.kwargs, view.format_kwarg = (), kwargs, None
+        request = APIRequestFactory().get(reverse(name, kwargs=kwargs), {'page_size': viewset.pagination_class.page_size})
+        view.request = view.initialize_request(request)
+        queryset = view.filter_queryset(view.get_queryset())
+        paginator = view.paginator
+        ordering = paginator.get_ordering(view.request, queryset, view)
+        limit = paginator.get_page_size(view.request) + 1
+        pages = [('first', queryset.order_by(*ordering)[:limit])]
+
+        columns = [order.lstrip('-') for order in ordering]
+        rows = list(queryset.order_by(*ordering).values_list(*columns)[depth:depth + 1])
+        if rows:
+            position = list(rows[0])
+            for page, page_ordering in (('next', ordering), ('previous', _reverse_ordering(ordering))):
+                keyset = paginator.get_keyset_filter(page_ordering, position)
+                pages.append((page, queryset.order_by(*page_ordering).filter(keyset)[:limit]))
+        return pages
+
+    def check_plan(self, plan, table):
+        problems = []
+        if connection.vendor == 'postgresql':
+            if re.search(rf'Seq Scan on {table}\b', plan):
+                problems.append('sequential scan')
+            if re.search(r'^\s*(->\s*)?(Incremental )?Sort\b', plan, re.MULTILINE):
+                problems.append('sort')
+        elif 'USE TEMP B-TREE FOR ORDER BY' in plan:
+            # A plain SCAN walks the rowid (primary key) in order, which is
+            # fine behind a LIMIT; only a scan feeding a sort reads everything
+            if re.search(rf'SCAN {table}\b(?! USING)', plan):
+                problems.append('full scan')
+            problems.append('sort')
+        return problems
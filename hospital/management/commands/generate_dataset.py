@@ -0,0 +1,336 @@
+import io
+import random
+import time as clock
+from datetime import time, timedelta
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from hospital import billing, occupancy
+from hospital.models import (
+    Patient, Department, Doctor, Appointment, Schedule, Ward, Room, Admission,
+    Treatment, Medication, Nurse, LabTest, LabReport, Prescription, Invoice, Payment
+)
+
+FIRST_NAMES = ['Amina', 'Rahim', 'Karim', 'Nadia', 'Sadia', 'Tanvir', 'Farhana', 'Imran', 'Mitu', 'Arif',
+               'Sumaiya', 'Hasan', 'Rina', 'Jamal', 'Lubna', 'Shakil', 'Tania', 'Rafiq', 'Nusrat', 'Sohel']
+LAST_NAMES = ['Rahman', 'Hossain', 'Islam', 'Ahmed', 'Khan', 'Chowdhury', 'Akter', 'Begum', 'Uddin', 'Sarkar']
+SPECIALIZATIONS = ['Cardiology', 'Neurology', 'Orthopedics', 'Pediatrics', 'Dermatology', 'Oncology',
+                   'Gynecology', 'Psychiatry', 'Radiology', 'General Medicine']
+MEDICINES = ['Paracetamol', 'Amoxicillin', 'Omeprazole', 'Metformin', 'Atorvastatin', 'Losartan', 'Cetirizine']
+LAB_TESTS = ['CBC', 'Lipid Profile', 'Blood Sugar', 'Liver Function', 'Kidney Function', 'Thyroid Panel',
+             'Urine R/E', 'Chest X-Ray', 'ECG', 'MRI Brain', 'CT Scan', 'Ultrasound']
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 32  # 08:00 - 16:00
+
+
+def _batches(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def _copy_value(value):
+    # PostgreSQL COPY text format
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with a synthetic, reproducible hospital dataset. Rows are "
+        "loaded with COPY on PostgreSQL and batched INSERTs elsewhere. Counts scale with "
+        "--patients unless given explicitly."
+    )
+
+    models = [Department, Doctor, Schedule, Nurse, Ward, Room, LabTest, Patient, Appointment, Prescription,
+              Admission, Treatment, Medication, LabReport, Invoice, Payment]
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patients', type=int, default=10000)
+        parser.add_argument('--appointments', type=int, help='Default: 10 per patient.')
+        parser.add_argument('--admissions', type=int, help='Default: 1 per 5 patients.')
+        parser.add_argument('--doctors', type=int, help='Default: 1 per 500 patients, at least 20.')
+        parser.add_argument('--rooms', type=int, help='Default: 1 per 1000 patients, at least 50.')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--method', choices=['auto', 'copy', 'bulk'], default='auto')
+
+    def handle(self, *args, **options):
+        method = options['method']
+        if method == 'auto':
+            method = 'copy' if connection.vendor == 'postgresql' else 'bulk'
+        if method == 'copy' and connection.vendor != 'postgresql':
+            raise CommandError('COPY needs PostgreSQL; use --method bulk.')
+        self.use_copy = method == 'copy'
+        self.batch_size = options['batch_size']
+        self.random = random.Random(options['seed'])
+        self.now = timezone.now()
+
+        patients = options['patients']
+        self.counts = {
+            'patients': patients,
+            'appointments': options['appointments'] if options['appointments'] is not None else patients * 10,
+            'admissions': options['admissions'] if options['admissions'] is not None else patients // 5,
+            'doctors': options['doctors'] or max(20, patients // 500),
+            'rooms': options['rooms'] or max(50, patients // 1000),
+            'departments': len(SPECIALIZATIONS),
+            'wards': 12,
+            'lab_reports': patients // 2,
+        }
+        # New rows get explicit ids after the current maximum, so foreign keys
+        # can be computed instead of read back
+        self.base = {model: model.objects.aggregate(m=Max('id'))['m'] or 0 for model in self.models}
+
+        started = clock.perf_counter()
+        self.load_reference_data()
+        self.load_patients()
+        self.load_appointments()
+        self.load_admissions()
+        self.load_billing()
+        self.finish()
+        self.stdout.write(self.style.SUCCESS(
+            f'Dataset loaded with {method} in {clock.perf_counter() - started:.1f}s.'
+        ))
+
+    # ==========================
+    # Writers
+    # ==========================
+    def write(self, model, fields, rows):
+        """Insert `rows`, tuples ordered like `fields`, and return how many were written."""
+        model_fields = [model._meta.get_field(name) for name in fields]
+        columns = ', '.join(connection.ops.quote_name(model._meta.get_field(name).column) for name in fields)
+        started = clock.perf_counter()
+        count = 0
+        for batch in _batches(rows, self.batch_size):
+            if self.use_copy:
+                buffer = io.StringIO()
+                for row in batch:
+                    buffer.write('\t'.join(_copy_value(value) for value in row) + '\n')
+                buffer.seek(0)
+                sql = f'COPY {model._meta.db_table} ({columns}) FROM STDIN'
+                with connection.cursor() as cursor:
+                    if hasattr(cursor, 'copy_expert'):
+                        cursor.copy_expert(sql, buffer)
+                    else:
+                        # psycopg 3, e.g. with DB_POOL
+                        with cursor.copy(sql) as copy:
+                            copy.write(buffer.getvalue())
+            else:
+                # Not bulk_create(): auto_now_add would overwrite the generated timestamps
+                placeholders = ', '.join(['%s'] * len(fields))
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.executemany(
+                        f'INSERT INTO {connection.ops.quote_name(model._meta.db_table)} ({columns}) VALUES ({placeholders})',
+                        [[field.get_db_prep_save(value, connection) for field, value in zip(model_fields, row)]
+                         for row in batch],
+                    )
+            count += len(batch)
+        elapsed = clock.perf_counter() - started
+        self.stdout.write(f'{model._meta.verbose_name_plural}: {count} rows in {elapsed:.1f}s')
+        return count
+
+    def ids(self, model, count):
+        return range(self.base[model] + 1, self.base[model] + count + 1)
+
+    def pick(self, model, count):
+        return self.base[model] + self.random.randint(1, count)
+
+    def moment(self, days_back):
+        return self.now - timedelta(days=self.random.uniform(0, days_back))
+
+    # ==========================
+    # Tables
+    # ==========================
+    def load_reference_data(self):
+        rnd, counts = self.random, self.counts
+        self.write(Department, ['id', 'name', 'description', 'updated_at'], (
+            (pk, name, f'{name} department', self.now)
+            for pk, name in zip(self.ids(Department, counts['departments']), SPECIALIZATIONS)
+        ))
+        self.write(Doctor, ['id', 'name', 'department', 'specialization', 'phone', 'email', 'qualification',
+                            'is_active', 'active_time', 'updated_at'], (
+            (pk, f'Dr. {rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)}',
+             self.base[Department] + index % counts['departments'] + 1, SPECIALIZATIONS[index % len(SPECIALIZATIONS)],
+             f'017{pk:08d}', f'doctor{pk}@dataset.example.com', 'MBBS, FCPS', rnd.random() > 0.05, time(9),
+             self.now)
+            for index, pk in enumerate(self.ids(Doctor, counts['doctors']))
+        ))
+        weekdays = [code for code, _ in Schedule.WEEKDAYS]
+        self.write(Schedule, ['id', 'doctor', 'weekday', 'start_time', 'end_time', 'updated_at'], (
+            (self.base[Schedule] + index * 5 + day + 1, doctor, weekdays[(index + day) % 7], time(8), time(16),
+             self.now)
+            for index, doctor in enumerate(self.ids(Doctor, counts['doctors'])) for day in range(5)
+        ))
+        ward_types = [code for code, _ in Ward.WARD_CHOOSE]
+        self.write(Ward, ['id', 'name', 'type', 'bed_count', 'occupied_beds', 'updated_at'], (
+            (pk, f'Ward {pk}', ward_types[index % len(ward_types)], 0, 0, self.now)
+            for index, pk in enumerate(self.ids(Ward, counts['wards']))
+        ))
+        self.room_beds = [rnd.choice([1, 2, 4, 6]) for _ in range(counts['rooms'])]
+        self.write(Room, ['id', 'ward', 'room_no', 'bed_count', 'is_available', 'occupied_beds', 'updated_at'], (
+            (pk, self.base[Ward] + index % counts['wards'] + 1, str(100 + index), beds, True, 0, self.now)
+            for index, (pk, beds) in enumerate(zip(self.ids(Room, counts['rooms']), self.room_beds))
+        ))
+        self.write(Nurse, ['id', 'name', 'phone', 'department', 'assign_room', 'updated_at'], (
+            (pk, f'{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)}', f'018{pk:08d}',
+             self.pick(Department, counts['departments']),
+             self.pick(Room, counts['rooms']) if rnd.random() > 0.2 else None, self.now)
+            for pk in self.ids(Nurse, counts['doctors'] * 2)
+        ))
+        self.write(LabTest, ['id', 'test_name', 'description', 'price', 'updated_at'], (
+            (pk, name, f'{name} test', rnd.randrange(300, 8000, 50), self.now)
+            for pk, name in zip(self.ids(LabTest, len(LAB_TESTS)), LAB_TESTS)
+        ))
+
+    def load_patients(self):
+        rnd = self.random
+        genders = [code for code, _ in Patient.CHOOSE_GENDER]
+        blood_groups = [code for code, _ in Patient.CHOOSES_BLOOD_GROUP]
+        self.write(Patient, ['id', 'first_name', 'last_name', 'email', 'phone', 'gender', 'dob', 'blood_group',
+                             'address', 'emergency_contact', 'created_at', 'updated_at'], (
+            (pk, rnd.choice(FIRST_NAMES), rnd.choice(LAST_NAMES), f'patient{pk}@dataset.example.com',
+             f'019{pk:08d}', rnd.choice(genders), (self.now - timedelta(days=rnd.randint(365, 90 * 365))).date(),
+             rnd.choice(blood_groups), f'House {pk % 500}, Road {pk % 40}, Dhaka', f'015{pk:08d}',
+             self.moment(3 * 365), self.now)
+            for pk in self.ids(Patient, self.counts['patients'])
+        ))
+
+    def appointment_slot(self, index):
+        # Doctors take turns, so (doctor, date, time) never repeats
+        doctors = self.counts['doctors']
+        slot = index // doctors
+        day = self.first_day + timedelta(days=slot // SLOTS_PER_DAY)
+        minutes = 8 * 60 + slot % SLOTS_PER_DAY * SLOT_MINUTES
+        return self.base[Doctor] + index % doctors + 1, day, time(minutes // 60, minutes % 60)
+
+    def appointment_patient(self, index):
+        # A fixed stride spreads appointments over patients without storing them
+        return self.base[Patient] + (index * 7919) % self.counts['patients'] + 1
+
+    def load_appointments(self):
+        rnd, count = self.random, self.counts['appointments']
+        days = -(-count // self.counts['doctors']) // SLOTS_PER_DAY + 1
+        # About a third of the appointments lie in the future
+        self.first_day = self.now.date() - timedelta(days=days * 2 // 3)
+        today = self.now.date()
+
+        def rows():
+            for index, pk in enumerate(self.ids(Appointment, count)):
+                doctor, day, slot_time = self.appointment_slot(index)
+                if day < today:
+                    status = 'cancelled' if rnd.random() < 0.1 else 'completed'
+                else:
+                    status = rnd.choice(['pending', 'confirmed'])
+                notes = 'Follow-up visit' if rnd.random() < 0.3 else None
+                yield pk, self.appointment_patient(index), doctor, day, slot_time, status, notes, self.now
+        self.write(Appointment, ['id', 'patient', 'doctor', 'date', 'time', 'status', 'notes', 'updated_at'], rows())
+
+        def prescriptions():
+            pk = self.base[Prescription]
+            for index, appointment in enumerate(self.ids(Appointment, count)):
+                if rnd.random() < 0.2:
+                    pk += 1
+                    doctor, _, _ = self.appointment_slot(index)
+                    yield (pk, appointment, doctor, self.appointment_patient(index),
+                           f'{rnd.choice(MEDICINES)} twice daily', self.now, self.now)
+        self.write(Prescription, ['id', 'appointment', 'doctor', 'patient', 'notes', 'created_at', 'updated_at'],
+                   prescriptions())
+
+    def load_admissions(self):
+        rnd, counts = self.random, self.counts
+        # Fill at most 80% of the beds with current admissions
+        beds = [self.base[Room] + index + 1 for index, n in enumerate(self.room_beds) for _ in range(n)]
+        admitted = min(counts['admissions'] // 20, len(beds) * 4 // 5)
+
+        def admissions():
+            for index, pk in enumerate(self.ids(Admission, counts['admissions'])):
+                if index < admitted:
+                    yield (pk, self.pick(Patient, counts['patients']), beds[index], self.moment(14), None,
+                           'admitted', self.now)
+                else:
+                    admitted_at = self.moment(3 * 365)
+                    yield (pk, self.pick(Patient, counts['patients']), self.pick(Room, counts['rooms']), admitted_at,
+                           admitted_at + timedelta(days=rnd.randint(1, 14)), 'discharged', self.now)
+        self.write(Admission, ['id', 'patient', 'room', 'admitted_at', 'discharged_at', 'status', 'updated_at'],
+                   admissions())
+
+        def treatments():
+            pk = self.base[Treatment]
+            for admission in self.ids(Admission, counts['admissions']):
+                for _ in range(rnd.randint(1, 3)):
+                    pk += 1
+                    yield (pk, admission, self.pick(Doctor, counts['doctors']), 'Observation and medication',
+                           (self.now - timedelta(days=rnd.randint(0, 3 * 365))).date(), self.now)
+        treatment_count = self.write(
+            Treatment, ['id', 'admission', 'doctor', 'description', 'treatment_date', 'updated_at'], treatments()
+        )
+
+        def medications():
+            pk = self.base[Medication]
+            for treatment in self.ids(Treatment, treatment_count):
+                for _ in range(rnd.randint(1, 2)):
+                    pk += 1
+                    yield pk, treatment, rnd.choice(MEDICINES), f'{rnd.choice([250, 500])} mg', '1+0+1', self.now
+        self.write(Medication, ['id', 'treatment', 'medicine_name', 'dosage', 'frequency', 'updated_at'],
+                   medications())
+
+        self.write(LabReport, ['id', 'patient', 'doctor', 'test', 'report_file', 'created_at', 'updated_at'], (
+            (pk, self.pick(Patient, counts['patients']), self.pick(Doctor, counts['doctors']),
+             self.pick(LabTest, len(LAB_TESTS)), f'reports/dataset-{pk}.pdf', self.moment(3 * 365), self.now)
+            for pk in self.ids(LabReport, counts['lab_reports'])
+        ))
+
+    def load_billing(self):
+        rnd, counts, count = self.random, self.counts, self.counts['admissions']
+        # One invoice per admission; the patient is read back with the admission
+        self.invoices = []
+
+        def invoices():
+            ids = self.ids(Admission, count)
+            admissions = Admission.objects.filter(id__range=(ids.start, ids.stop - 1)).order_by('id')
+            for pk, (admission, patient) in zip(self.ids(Invoice, count),
+                                                admissions.values_list('id', 'patient_id').iterator(chunk_size=5000)):
+                total = rnd.randrange(1000, 200000, 100)
+                if rnd.random() < 0.7:
+                    parts = [total // 2, total - total // 2] if rnd.random() < 0.3 else [total]
+                else:
+                    parts = [total // 2] if rnd.random() < 0.5 else []
+                self.invoices.append((pk, parts))
+                paid = sum(parts)
+                yield (pk, patient, admission, self.pick(Department, counts['departments']), total, paid,
+                       total - paid, billing.invoice_status(total, paid), self.moment(3 * 365), self.now)
+        self.write(Invoice, ['id', 'patient', 'admission', 'department', 'total_amount', 'amount_paid', 'balance',
+                             'status', 'created_at', 'updated_at'], invoices())
+
+        methods = [code for code, _ in Payment.METHOD_CHOOSE]
+
+        def payments():
+            pk = self.base[Payment]
+            for invoice, parts in self.invoices:
+                for amount in parts:
+                    pk += 1
+                    yield pk, invoice, amount, rnd.choice(methods), self.moment(3 * 365), self.now
+        self.write(Payment, ['id', 'invoice', 'amount', 'method', 'paid_at', 'updated_at'], payments())
+        self.invoices = []
+
+    def finish(self):
+        # Explicit ids leave the sequences behind; the raw inserts skipped the counters
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), self.models):
+                cursor.execute(sql)
+            rooms, wards = occupancy.reconcile()
+            self.stdout.write(f'Occupancy counters set for {rooms} rooms and {wards} wards.')
+            _, rows = billing.rebuild()
+            self.stdout.write(f'Revenue rollup rebuilt with {rows} rows.')
+            if connection.vendor == 'postgresql':
+                cursor.execute('ANALYZE')
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from hospital import billing
+
+
+class Command(BaseCommand):
+    help = "Recompute invoice amount_paid/balance/status and the daily revenue rollup from the Payment table."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            invoices, rows = billing.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt billing: {invoices} invoices corrected, {rows} revenue rows written.'))
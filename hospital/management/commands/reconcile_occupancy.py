@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from hospital import occupancy
+
+
+class Command(BaseCommand):
+    help = "Recompute room and ward bed counters from the Room and Admission tables."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rooms, wards = occupancy.reconcile()
+        self.stdout.write(self.style.SUCCESS(f'Reconciled occupancy: {rooms} rooms and {wards} wards corrected.'))
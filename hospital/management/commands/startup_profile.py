@@ -0,0 +1,114 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time as clock
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def measure(started):
+    """
+    Cold start of the project in this (fresh) interpreter, printed as JSON:
+    settings import, each app's import / models / ready(), URLconf and
+    middleware. Run by startup_profile in a subprocess; `started` is taken
+    before anything is imported.
+    """
+    phases, apps = {}, {}
+
+    def timed(name, func, *args):
+        began = clock.perf_counter()
+        result = func(*args)
+        phases[name] = phases.get(name, 0) + clock.perf_counter() - began
+        return result
+
+    import django
+    from django.apps.config import AppConfig
+    from django.conf import settings
+
+    timed('settings', settings._setup)
+    create = AppConfig.create.__func__
+
+    def timed_create(cls, entry):
+        began = clock.perf_counter()
+        app_config = create(cls, entry)
+        timing = apps.setdefault(app_config.label, {'import': 0, 'models': 0, 'ready': 0})
+        timing['import'] = clock.perf_counter() - began
+        import_models, ready = app_config.import_models, app_config.ready
+
+        def timed_import_models():
+            began = clock.perf_counter()
+            import_models()
+            timing['models'] = clock.perf_counter() - began
+
+        def timed_ready():
+            began = clock.perf_counter()
+            ready()
+            timing['ready'] = clock.perf_counter() - began
+
+        app_config.import_models, app_config.ready = timed_import_models, timed_ready
+        return app_config
+
+    AppConfig.create = classmethod(timed_create)
+    timed('apps', django.setup, False)
+
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.urls import get_resolver
+    timed('middleware', WSGIHandler)
+    timed('urlconf', lambda: get_resolver().url_patterns)
+    phases['total'] = clock.perf_counter() - started
+    print(json.dumps({'phases': phases, 'apps': apps}))
+
+
+class Command(BaseCommand):
+    help = (
+        "Profile a cold start: import the settings, load every installed app "
+        "(module import, models, ready()), build the middleware chain and the "
+        "URLconf in fresh interpreters, and compare the total with "
+        "COLD_START_BUDGET_MS. Exits 1 when the median is over budget."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters to start; the median is reported.')
+        parser.add_argument('--top', type=int, default=10, help='Slowest apps to list.')
+        parser.add_argument('--budget', type=int, help='Budget in ms, instead of COLD_START_BUDGET_MS.')
+
+    def handle(self, *args, **options):
+        runs = [self.run_child() for _ in range(options['repeat'])]
+        # The first run also writes bytecode caches; the median hides it
+        phases = {name: statistics.median(run['phases'][name] for run in runs) * 1000 for name in runs[0]['phases']}
+        apps = {
+            label: {part: statistics.median(run['apps'][label][part] for run in runs) * 1000 for part in timing}
+            for label, timing in runs[0]['apps'].items()
+        }
+
+        self.stdout.write(f"{'phase':<12} {'median':>9}")
+        for name, elapsed in phases.items():
+            self.stdout.write(f'{name:<12} {elapsed:>7.1f}ms')
+        self.stdout.write('')
+        self.stdout.write(f"{'app':<20} {'import':>9} {'models':>9} {'ready':>9} {'total':>9}")
+        slowest = sorted(apps.items(), key=lambda item: -sum(item[1].values()))[:options['top']]
+        for label, timing in slowest:
+            self.stdout.write(
+                f"{label:<20} {timing['import']:>7.1f}ms {timing['models']:>7.1f}ms "
+                f"{timing['ready']:>7.1f}ms {sum(timing.values()):>7.1f}ms"
+            )
+
+        budget = options['budget'] or settings.COLD_START_BUDGET_MS
+        self.stdout.write('')
+        if phases['total'] > budget:
+            self.stderr.write(self.style.ERROR(f"Cold start {phases['total']:.0f}ms is over the {budget}ms budget."))
+            raise SystemExit(1)
+        self.stdout.write(self.style.SUCCESS(f"Cold start {phases['total']:.0f}ms, budget {budget}ms."))
+
+    def run_child(self):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', settings.SETTINGS_MODULE)}
+        result = subprocess.run(
+            [sys.executable, '-c', f'import time; started = time.perf_counter(); from {__name__} import measure; measure(started)'],
+            capture_output=True, text=True, env=env, cwd=settings.BASE_DIR,
+        )
+        if result.returncode:
+            raise CommandError(f'Startup failed:\n{result.stderr}')
+        return json.loads(result.stdout.strip().splitlines()[-1])
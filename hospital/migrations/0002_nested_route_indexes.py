@@ -0,0 +1,54 @@
+# Generated by Django 6.0 on 2026-10-18 18:22
+
+from django.db import migrations, models
+
+from hospital.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction, but it doesn't
+    # block writes to these large tables while the indexes build
+    atomic = False
+
+    dependencies = [
+        ('hospital', '0001_initial'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='admission',
+            index=models.Index(fields=['patient', '-admitted_at', '-id'], name='admission_patient_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='appointment',
+            index=models.Index(fields=['patient', '-date', '-time', '-id'], name='appt_patient_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='appointment',
+            index=models.Index(fields=['doctor', '-date', '-time', '-id'], name='appt_doctor_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='invoice',
+            index=models.Index(fields=['patient', '-created_at', '-id'], name='invoice_patient_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='labreport',
+            index=models.Index(fields=['patient', '-created_at', '-id'], name='labreport_patient_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='labreport',
+            index=models.Index(fields=['doctor', '-created_at', '-id'], name='labreport_doctor_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='payment',
+            index=models.Index(fields=['invoice', '-paid_at', '-id'], name='payment_invoice_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='prescription',
+            index=models.Index(fields=['patient', '-created_at', '-id'], name='prescription_patient_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='prescription',
+            index=models.Index(fields=['doctor', '-created_at', '-id'], name='prescription_doctor_idx'),
+        ),
+    ]
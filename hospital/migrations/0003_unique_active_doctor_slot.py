@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-18 18:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospital', '0002_nested_route_indexes'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'cancelled'), _negated=True), fields=('doctor', 'date', 'time'), name='unique_active_doctor_slot', violation_error_message='This doctor already has an appointment at this time.'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 6.0 on 2026-10-18 18:28
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Room = apps.get_model('hospital', 'Room')
+    Ward = apps.get_model('hospital', 'Ward')
+    Admission = apps.get_model('hospital', 'Admission')
+
+    admitted = (
+        Admission.objects.filter(room=OuterRef('pk'), status='admitted')
+        .order_by().values('room').annotate(n=Count('id')).values('n')
+    )
+    Room.objects.update(occupied_beds=Coalesce(Subquery(admitted), Value(0)))
+
+    def room_total(column):
+        return Coalesce(Subquery(
+            Room.objects.filter(ward=OuterRef('pk'))
+            .order_by().values('ward').annotate(n=Sum(column)).values('n')
+        ), Value(0))
+    Ward.objects.update(bed_count=room_total('bed_count'), occupied_beds=room_total('occupied_beds'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospital', '0003_unique_active_doctor_slot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='room',
+            name='occupied_beds',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='ward',
+            name='bed_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='ward',
+            name='occupied_beds',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
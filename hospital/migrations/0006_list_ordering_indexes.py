@@ -0,0 +1,69 @@
+# Generated by Django 6.0 on 2026-10-18 19:40
+
+from django.db import migrations, models
+
+from hospital.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction, but it doesn't
+    # block writes, so this can be applied to a live database
+    atomic = False
+
+    dependencies = [
+        ('hospital', '0005_updated_at'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='patient',
+            index=models.Index(fields=['first_name', 'last_name', 'id'], name='patient_name_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='department',
+            index=models.Index(fields=['name', 'id'], name='department_name_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='appointment',
+            index=models.Index(fields=['-date', '-time', '-id'], name='appt_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='appointment',
+            index=models.Index(
+                condition=models.Q(('status__in', ['pending', 'confirmed'])),
+                fields=['-date', '-time', '-id'], name='appt_open_idx',
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name='admission',
+            index=models.Index(fields=['-admitted_at', '-id'], name='admission_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='admission',
+            index=models.Index(
+                condition=models.Q(('status', 'admitted')), fields=['-admitted_at', '-id'], name='admission_current_idx',
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name='labreport',
+            index=models.Index(fields=['-created_at', '-id'], name='labreport_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='prescription',
+            index=models.Index(fields=['-created_at', '-id'], name='prescription_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='invoice',
+            index=models.Index(fields=['-created_at', '-id'], name='invoice_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='invoice',
+            index=models.Index(
+                condition=models.Q(('status', 'unpaid')), fields=['-created_at', '-id'], name='invoice_unpaid_idx',
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name='payment',
+            index=models.Index(fields=['-paid_at', '-id'], name='payment_date_idx'),
+        ),
+    ]
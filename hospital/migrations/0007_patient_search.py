@@ -0,0 +1,60 @@
+# Generated by Django 6.0 on 2026-10-18 20:10
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.functions.text
+from django.db import migrations
+
+from hospital.operations import AddIndexConcurrently, TrigramExtension
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('hospital', '0006_list_ordering_indexes'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        AddIndexConcurrently(
+            model_name='patient',
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper('first_name'), name='gin_trgm_ops'
+                ),
+                name='patient_first_name_trgm_idx',
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name='patient',
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper('last_name'), name='gin_trgm_ops'
+                ),
+                name='patient_last_name_trgm_idx',
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name='patient',
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper('email'), name='gin_trgm_ops'
+                ),
+                name='patient_email_trgm_idx',
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name='patient',
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=['phone'], name='patient_phone_trgm_idx', opclasses=['gin_trgm_ops']
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name='patient',
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.search.SearchVector('first_name', 'last_name', config='simple'),
+                name='patient_search_idx',
+            ),
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 6.0 on 2026-10-18 20:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Case, Count, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def fill_summaries(apps, schema_editor):
+    Invoice = apps.get_model('hospital', 'Invoice')
+    Payment = apps.get_model('hospital', 'Payment')
+    DailyRevenue = apps.get_model('hospital', 'DailyRevenue')
+
+    paid = (
+        Payment.objects.filter(invoice=OuterRef('pk'))
+        .order_by().values('invoice').annotate(total=Sum('amount')).values('total')
+    )
+    Invoice.objects.update(amount_paid=Coalesce(
+        Subquery(paid), Value(0), output_field=Invoice._meta.get_field('amount_paid'),
+    ))
+    Invoice.objects.update(
+        balance=F('total_amount') - F('amount_paid'),
+        status=Case(When(total_amount__lte=F('amount_paid'), then=Value('paid')), default=Value('unpaid')),
+    )
+
+    totals = (
+        Payment.objects.order_by()
+        .values(day=TruncDate('paid_at'), department=F('invoice__department'), pay_method=F('method'))
+        .annotate(total=Sum('amount'), count=Count('id'))
+    )
+    DailyRevenue.objects.all().delete()
+    DailyRevenue.objects.bulk_create([
+        DailyRevenue(
+            date=row['day'], department_id=row['department'], method=row['pay_method'],
+            amount=row['total'], payments=row['count'],
+        )
+        for row in totals.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospital', '0007_patient_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='amount_paid',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='balance',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='department',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='invoices', to='hospital.department'),
+        ),
+        migrations.AlterField(
+            model_name='invoice',
+            name='status',
+            field=models.CharField(choices=[('paid', 'PAID'), ('unpaid', 'UNPAID')], default='unpaid', editable=False, max_length=10),
+        ),
+        migrations.CreateModel(
+            name='DailyRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('method', models.CharField(choices=[('cash', 'CASH'), ('card', 'CARD'), ('online', 'ONLINE')], max_length=10)),
+                ('amount', models.FloatField(default=0)),
+                ('payments', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('department', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='daily_revenue', to='hospital.department')),
+            ],
+            options={
+                'ordering': ['date', 'department', 'method'],
+                'constraints': [models.UniqueConstraint(fields=('date', 'department', 'method'), name='daily_revenue_key', nulls_distinct=False)],
+            },
+        ),
+        migrations.RunPython(fill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 6.0 on 2026-10-18 21:20
+
+from django.db import migrations, models
+from django.db.models import Case, Count, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def fill_summaries(apps, schema_editor):
+    # Payments were rounded to cents one by one; recompute the sums from them
+    Invoice = apps.get_model('hospital', 'Invoice')
+    Payment = apps.get_model('hospital', 'Payment')
+    DailyRevenue = apps.get_model('hospital', 'DailyRevenue')
+
+    paid = (
+        Payment.objects.filter(invoice=OuterRef('pk'))
+        .order_by().values('invoice').annotate(total=Sum('amount')).values('total')
+    )
+    Invoice.objects.update(amount_paid=Coalesce(
+        Subquery(paid), Value(0), output_field=Invoice._meta.get_field('amount_paid'),
+    ))
+    Invoice.objects.update(
+        balance=F('total_amount') - F('amount_paid'),
+        status=Case(When(total_amount__lte=F('amount_paid'), then=Value('paid')), default=Value('unpaid')),
+    )
+
+    totals = (
+        Payment.objects.order_by()
+        .values(day=TruncDate('paid_at'), department=F('invoice__department'), pay_method=F('method'))
+        .annotate(total=Sum('amount'), count=Count('id'))
+    )
+    DailyRevenue.objects.all().delete()
+    DailyRevenue.objects.bulk_create([
+        DailyRevenue(
+            date=row['day'], department_id=row['department'], method=row['pay_method'],
+            amount=row['total'], payments=row['count'],
+        )
+        for row in totals.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospital', '0008_billing_summaries'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dailyrevenue',
+            name='amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AlterField(
+            model_name='invoice',
+            name='amount_paid',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AlterField(
+            model_name='invoice',
+            name='balance',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AlterField(
+            model_name='invoice',
+            name='total_amount',
+            field=models.DecimalField(decimal_places=2, max_digits=12),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='amount',
+            field=models.DecimalField(decimal_places=2, max_digits=12),
+        ),
+        migrations.RunPython(fill_summaries, migrations.RunPython.noop),
+    ]
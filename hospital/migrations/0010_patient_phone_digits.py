@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-18 19:44
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+import hospital.search
+from hospital.operations import AddIndexConcurrently, RemoveIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('hospital', '0009_decimal_money'),
+    ]
+
+    operations = [
+        RemoveIndexConcurrently(
+            model_name='patient',
+            name='patient_phone_trgm_idx',
+        ),
+        AddIndexConcurrently(
+            model_name='patient',
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    hospital.search.PhoneDigits('phone'), name='gin_trgm_ops'
+                ),
+                name='patient_phone_trgm_idx',
+            ),
+        ),
+    ]
@@ -0,0 +1,498 @@
+import csv
+import hashlib
+import json
+from datetime import date, datetime, time, timezone as dt_timezone
+from itertools import chain
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Sum
+from django.http import QueryDict, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework import serializers, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotAuthenticated, NotFound, ValidationError
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+from tasks.serializers import JobSerializer
+
+from .cache import response_cache
+from .jobs import export_rows
+
+
+# -------------------------------
+# Parent Scoped Mixin
+# -------------------------------
+class ParentScopedMixin:
+    """
+    Narrow the queryset to the parent objects named in a nested route.
+
+    `parent_lookup_kwargs` maps the URL kwarg of a nested router to the
+    lookup on this viewset's model, e.g. {'patient_pk': 'patient'}. Only the
+    kwargs present in the URL are applied, so the same viewset can be
+    registered at the top level and under several parents. Rows written
+    through a nested route (single or bulk) get the URL's parents, whatever
+    the body says.
+    """
+    parent_lookup_kwargs = {}
+
+    def get_parent_filters(self):
+        return {
+            lookup: self.kwargs[url_kwarg]
+            for url_kwarg, lookup in self.parent_lookup_kwargs.items()
+            if url_kwarg in self.kwargs
+        }
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        filters = self.get_parent_filters()
+        if not filters:
+            return queryset
+        try:
+            return queryset.filter(**filters)
+        except (TypeError, ValueError):
+            raise NotFound()
+
+    def get_serializer(self, *args, **kwargs):
+        filters = self.get_parent_filters()
+        data = kwargs.get('data')
+        if filters and data is not None:
+            if isinstance(data, list):
+                kwargs['data'] = [_with_values(item, filters) for item in data]
+            else:
+                kwargs['data'] = _with_values(data, filters)
+        return super().get_serializer(*args, **kwargs)
+
+
+def _with_values(data, values):
+    """A copy of request data with `values` set, leaving uploaded files alone."""
+    if isinstance(data, QueryDict):
+        copy = QueryDict(mutable=True)
+        for key, items in data.lists():
+            copy.setlist(key, items)
+    elif isinstance(data, dict):
+        copy = dict(data)
+    else:
+        # Not an object, left for the serializer to reject
+        return data
+    for key, value in values.items():
+        copy[key] = value
+    return copy
+
+
+# -------------------------------
+# Lean List Mixin
+# -------------------------------
+class LeanListMixin:
+    """
+    Serve `?view=lean` list requests straight from `.values()` rows.
+
+    `lean_fields` maps each output key to a lookup or expression. Rows are
+    plain dicts, so no model instances or nested serializers are built.
+    The keys must include the columns the list is ordered by.
+    """
+    lean_fields = {}
+    lean_query_param = 'view'
+
+    def is_lean(self):
+        return bool(self.lean_fields) and self.request.query_params.get(self.lean_query_param) == 'lean'
+
+    def get_lean_queryset(self):
+        names, expressions = [], {}
+        for key, lookup in self.lean_fields.items():
+            if lookup == key:
+                names.append(key)
+            else:
+                expressions[key] = F(lookup) if isinstance(lookup, str) else lookup
+        queryset = self.filter_queryset(self.get_queryset())
+        return queryset.select_related(None).prefetch_related(None).values(*names, **expressions)
+
+    def list(self, request, *args, **kwargs):
+        if not self.is_lean():
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.get_lean_queryset()
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(page)
+        return Response(list(queryset))
+
+
+# -------------------------------
+# Sparse Fields Mixin
+# -------------------------------
+class SparseFieldsMixin:
+    """
+    Honour `?fields=` and `?expand=` on GET requests.
+
+    `?fields=id,date,status` limits the serializer to those fields and
+    `?expand=patient_detail` adds nested fields on top of them. Without
+    `?fields=` the full representation is returned as before.
+
+    The queryset only joins the relations needed for the requested fields
+    (`related_fields` maps a serializer field to its select/prefetch paths)
+    and only fetches the columns they read. `field_sources` lists the model
+    columns behind computed fields, e.g. {'age': ['dob']}.
+    """
+    fields_query_param = 'fields'
+    expand_query_param = 'expand'
+    related_fields = {}
+    field_sources = {}
+
+    def get_requested_fields(self):
+        request = getattr(self, 'request', None)
+        if request is None or request.method != 'GET':
+            return None
+        fields = request.query_params.get(self.fields_query_param)
+        if not fields:
+            return None
+        expand = request.query_params.get(self.expand_query_param, '')
+        return {name.strip() for name in f'{fields},{expand}'.split(',') if name.strip()}
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_requested_fields()
+        if fields is not None:
+            kwargs.setdefault('fields', fields)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = self.get_requested_fields()
+        if fields is None:
+            return queryset
+
+        select, prefetch = [], []
+        for name in fields:
+            for path in self.related_fields.get(name, ()):
+                (select if _is_single_valued(queryset.model, path) else prefetch).append(path)
+        queryset = queryset.select_related(None).prefetch_related(None)
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+
+        columns = self.get_requested_columns(queryset, fields)
+        if columns is not None:
+            queryset = queryset.only(*columns, *{path.split('__')[0] for path in select})
+        return queryset
+
+    def get_requested_columns(self, queryset, fields):
+        opts = queryset.model._meta
+        serializer_fields = self.get_serializer_class()().fields
+        ordering = queryset.query.order_by or opts.ordering
+        columns = {opts.pk.name, *(o.lstrip('-') for o in ordering)}
+        for name in fields:
+            if name in self.field_sources:
+                columns.update(self.field_sources[name])
+            elif name in self.related_fields or name not in serializer_fields:
+                continue
+            else:
+                source = serializer_fields[name].source
+                try:
+                    field = opts.get_field(source)
+                except FieldDoesNotExist:
+                    # Computed from something we can't see, fetch everything
+                    return None
+                if field.concrete:
+                    columns.add(field.name)
+        return columns
+
+
+def _has_field(model, path, name):
+    for part in path.split('__'):
+        model = model._meta.get_field(part).related_model
+    try:
+        model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return False
+    return True
+
+
+def _is_single_valued(model, path):
+    for name in path.split('__'):
+        field = model._meta.get_field(name)
+        if not (field.many_to_one or field.one_to_one):
+            return False
+        model = field.related_model
+    return True
+
+
+# -------------------------------
+# Bulk Write Mixin
+# -------------------------------
+class BulkWriteMixin:
+    """
+    `POST <list>/bulk/` creates and `PATCH <list>/bulk/` updates a list of
+    objects in one transaction. The serializer's list class must be a
+    BulkListSerializer. Errors are reported per item, in payload order, and
+    nothing is written unless every item is valid. An update may name each
+    id only once.
+    """
+    bulk_max_size = 1000
+
+    @action(detail=False, methods=['post', 'patch'])
+    def bulk(self, request, *args, **kwargs):
+        data = request.data
+        if not isinstance(data, list) or not data:
+            raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: ['Expected a non-empty list of items.']})
+        if len(data) > self.bulk_max_size:
+            raise ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [f'At most {self.bulk_max_size} items are allowed per request.']
+            })
+
+        if request.method == 'POST':
+            serializer = self.get_serializer(data=data, many=True)
+            response_status = status.HTTP_201_CREATED
+        else:
+            ids = [item.get('id') for item in data if isinstance(item, dict)]
+            ids = [int(pk) for pk in ids if isinstance(pk, int) or (isinstance(pk, str) and pk.isdigit())]
+            if len(set(ids)) != len(ids):
+                raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: ['Each id may appear only once per request.']})
+            instances = self.get_queryset().in_bulk(ids)
+            serializer = self.get_serializer(instances, data=data, many=True, partial=True)
+            response_status = status.HTTP_200_OK
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            with transaction.atomic():
+                objects = serializer.save()
+        except IntegrityError:
+            raise ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: ['The batch conflicts with existing data; nothing was saved.']
+            })
+
+        queryset = self.get_queryset().filter(pk__in=[obj.pk for obj in objects])
+        return Response(self.get_serializer(queryset, many=True).data, status=response_status)
+
+
+# -------------------------------
+# Export Mixin
+# -------------------------------
+class Echo:
+    """File-like object whose write() hands the line back, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+_datetime_field = serializers.DateTimeField()
+
+
+def export_value(value):
+    """A column value formatted like the serializers do, e.g. datetimes as ISO 8601 in the current time zone."""
+    if isinstance(value, datetime):
+        return _datetime_field.to_representation(value)
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    return value
+
+
+class ExportMixin:
+    """
+    `GET <list>/export/?output=csv|ndjson` streams the filtered queryset.
+
+    Rows are read with `.values_list().iterator()`, which uses a server-side
+    cursor on PostgreSQL, and written one by one into a
+    StreamingHttpResponse, so memory stays flat whatever the table size.
+    `export_fields` maps each column name to a lookup or expression.
+
+    `POST` with the same query string writes the file on a worker instead
+    (hospital.jobs.export_rows) and answers 202 with the job; its result
+    links to the file once done. Only authenticated users can queue one,
+    since only the user who queued a job can follow it.
+
+    Values are formatted as in the API (export_value); NDJSON is encoded
+    like the JSON renderer, so Decimals are numbers there too.
+    """
+    export_fields = {}
+    export_chunk_size = 2000
+
+    @action(detail=False, methods=['get', 'post'])
+    def export(self, request, *args, **kwargs):
+        output = request.query_params.get('output', 'csv')
+        if output not in ('csv', 'ndjson'):
+            raise ValidationError({'output': ['Must be csv or ndjson.']})
+
+        if request.method == 'POST':
+            if not request.user.is_authenticated:
+                raise NotAuthenticated()
+            job = export_rows.enqueue_for(
+                request.user, f'{type(self).__module__}.{type(self).__qualname__}', self.basename,
+                request.GET.urlencode(), self.kwargs, request.user.pk,
+            )
+            return Response(JobSerializer(job, context={'request': request}).data, status=status.HTTP_202_ACCEPTED)
+
+        stream, content_type, filename = self.export_stream(output)
+        response = StreamingHttpResponse(stream, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    def export_stream(self, output):
+        """(chunks, content type, file name) of the export."""
+        queryset = self.filter_queryset(self.get_queryset()).select_related(None).prefetch_related(None)
+        rows = queryset.values_list(*self.export_fields.values()).iterator(chunk_size=self.export_chunk_size)
+        columns = list(self.export_fields)
+
+        if output == 'csv':
+            writer = csv.writer(Echo())
+            stream = chain([writer.writerow(columns)], (writer.writerow(map(export_value, row)) for row in rows))
+            content_type = 'text/csv'
+        else:
+            stream = (
+                json.dumps(dict(zip(columns, map(export_value, row))), cls=JSONEncoder) + '\n' for row in rows
+            )
+            content_type = 'application/x-ndjson'
+        return stream, content_type, f'{queryset.model._meta.model_name}s.{output}'
+
+
+# -------------------------------
+# Cached Response Mixin
+# -------------------------------
+class CachedResponseMixin:
+    """
+    Serve list and retrieve responses from the versioned response cache.
+
+    `cache_models` lists every model the response is built from; saving or
+    deleting any of them invalidates the viewset's entries (see signals.py).
+    The key covers host, path and query string.
+    """
+    cache_models = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        name = self.basename
+        key = response_cache.key(name, request, self.cache_models)
+        data = response_cache.get(name, key)
+        if data is not None:
+            return Response(data, headers={'X-Cache': 'HIT'})
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            response_cache.set(key, response.data)
+        response['X-Cache'] = 'MISS'
+        return response
+
+
+# -------------------------------
+# Conditional Get Mixin
+# -------------------------------
+class ConditionalGetMixin:
+    """
+    ETag and Last-Modified on list and retrieve, answered with 304 when the
+    client's copy is current.
+
+    Viewsets with `cache_models` (CachedResponseMixin) take the validators
+    from the response cache versions, so a 304 or a cache hit runs no query.
+    Other viewsets fingerprint the rows of the response with one aggregate
+    row: Count, Sum(id) and Max(updated_at) over the requested page (or
+    object, or the whole filtered list when it isn't paginated, which the
+    updated_at indexes serve), plus Max(updated_at) of every relation in
+    `related_fields` and a count of the many-valued ones. Editing anything
+    the response shows bumps one of the timestamps, and rows entering or
+    leaving the page change the id sum. The ETag also covers the path,
+    query string and renderer, so every page and field selection gets its
+    own tag.
+    """
+    fingerprint_field = 'updated_at'
+
+    def list(self, request, *args, **kwargs):
+        rows = self.get_response_rows(self.filter_queryset(self.get_queryset()))
+        return self.conditional_response(rows, super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(self.get_lookup_queryset(), super().retrieve, request, *args, **kwargs)
+
+    def get_lookup_queryset(self):
+        """The filtered queryset narrowed to the object named in the URL."""
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset())
+        try:
+            return queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (TypeError, ValueError):
+            raise NotFound()
+
+    def get_response_rows(self, queryset):
+        """The rows a list response shows: the requested page of the filtered queryset."""
+        paginator = self.pagination_class() if self.pagination_class else None
+        page = paginator.get_page_queryset(queryset, self.request, self) if hasattr(paginator, 'get_page_queryset') else None
+        return queryset if page is None else page
+
+    def get_fingerprint(self, rows):
+        if getattr(self, 'cache_models', None):
+            return self.version_fingerprint(response_cache.versions(self.cache_models))
+        queryset, aggregates = self.fingerprint_aggregates(rows)
+        return self.aggregate_fingerprint(queryset.aggregate(**aggregates))
+
+    async def aget_fingerprint(self, rows):
+        if getattr(self, 'cache_models', None):
+            return self.version_fingerprint(await response_cache.aversions(self.cache_models))
+        queryset, aggregates = self.fingerprint_aggregates(rows)
+        return self.aggregate_fingerprint(await queryset.aaggregate(**aggregates))
+
+    def version_fingerprint(self, versions):
+        # Versions are time.time_ns() of the last change (or of the first use)
+        latest = max(int(version) for version in versions.split('.'))
+        return {'tag': versions, 'last_modified': datetime.fromtimestamp(latest / 1e9, tz=dt_timezone.utc)}
+
+    def aggregate_fingerprint(self, values):
+        stamps = [value for value in values.values() if isinstance(value, datetime)]
+        return {'tag': repr(sorted(values.items())), 'last_modified': max(stamps, default=None)}
+
+    def fingerprint_aggregates(self, rows):
+        """The queryset to aggregate over and the aggregates: the rows' and their relations'."""
+        model = rows.model
+        field = self.fingerprint_field
+        paths = self.get_fingerprint_paths(model)
+        # Many-valued joins repeat the rows, so their count and sum need DISTINCT
+        distinct = not all(_is_single_valued(model, path) for path in paths)
+        aggregates = {
+            'count': Count('pk', distinct=distinct),
+            'ids': Sum('pk', distinct=distinct),
+            field: Max(field),
+        }
+        for path in paths:
+            aggregates[f'{path}__{field}'] = Max(f'{path}__{field}')
+            if not _is_single_valued(model, path):
+                aggregates[f'{path}__count'] = Count(path, distinct=True)
+        if rows.query.is_sliced:
+            # A page: aggregate over its rows only
+            rows = model._default_manager.filter(pk__in=rows.values('pk'))
+        return rows.order_by(), aggregates
+
+    def get_fingerprint_paths(self, model):
+        """Every relation nested into the response, e.g. 'doctor' and 'doctor__department' for 'doctor__department'."""
+        paths = set()
+        for related in getattr(self, 'related_fields', {}).values():
+            for path in related:
+                names = path.split('__')
+                paths.update('__'.join(names[:end]) for end in range(1, len(names) + 1))
+        return sorted(path for path in paths if _has_field(model, path, self.fingerprint_field))
+
+    def conditional_response(self, rows, handler, request, *args, **kwargs):
+        etag, last_modified = self.get_validators(request, self.get_fingerprint(rows))
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+        return self.add_validators(response, etag, last_modified)
+
+    def get_validators(self, request, fingerprint):
+        """ETag and Last-Modified timestamp for a fingerprint."""
+        last_modified = fingerprint['last_modified']
+        tag = '|'.join([request.get_full_path(), request.accepted_renderer.format, fingerprint['tag']])
+        etag = quote_etag(hashlib.md5(tag.encode(), usedforsecurity=False).hexdigest())
+        return etag, int(last_modified.timestamp()) if last_modified else None
+
+    def add_validators(self, response, etag, last_modified):
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
@@ -1,4 +1,10 @@
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector
+from django.db import models, transaction
+from django.db.models.functions import Upper
+
+from . import billing, occupancy
+from .search import PhoneDigits
 
 
 # ==========================
@@ -25,9 +31,21 @@ class Patient(models.Model):
     address = models.TextField()
     emergency_contact = models.CharField(max_length=20)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['first_name', 'last_name']
+        indexes = [
+            models.Index(fields=['first_name', 'last_name', 'id'], name='patient_name_idx'),
+            # Patient search (hospital/search.py): trigram indexes match the
+            # UPPER() of icontains, the phone index the digits filter_patients()
+            # compares, the vector must match patient_search_vector()
+            GinIndex(OpClass(Upper('first_name'), name='gin_trgm_ops'), name='patient_first_name_trgm_idx'),
+            GinIndex(OpClass(Upper('last_name'), name='gin_trgm_ops'), name='patient_last_name_trgm_idx'),
+            GinIndex(OpClass(Upper('email'), name='gin_trgm_ops'), name='patient_email_trgm_idx'),
+            GinIndex(OpClass(PhoneDigits('phone'), name='gin_trgm_ops'), name='patient_phone_trgm_idx'),
+            GinIndex(SearchVector('first_name', 'last_name', config='simple'), name='patient_search_idx'),
+        ]
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
@@ -39,9 +57,13 @@ class Patient(models.Model):
 class Department(models.Model):
     name = models.CharField(max_length=200)
     description = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['name', 'id'], name='department_name_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -59,6 +81,7 @@ class Doctor(models.Model):
     qualification = models.CharField(max_length=100)
     is_active = models.BooleanField(default=True)
     active_time = models.TimeField()
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -81,9 +104,31 @@ class Appointment(models.Model):
     time = models.TimeField()
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
     notes = models.TextField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-date', '-time']
+        indexes = [
+            models.Index(fields=['patient', '-date', '-time', '-id'], name='appt_patient_date_idx'),
+            models.Index(fields=['doctor', '-date', '-time', '-id'], name='appt_doctor_date_idx'),
+            models.Index(fields=['-date', '-time', '-id'], name='appt_date_idx'),
+            models.Index(
+                fields=['-date', '-time', '-id'], name='appt_open_idx',
+                condition=models.Q(status__in=['pending', 'confirmed']),
+            ),
+            # Change fingerprints for conditional GET, see ConditionalGetMixin
+            models.Index(fields=['updated_at'], name='appt_updated_idx'),
+            models.Index(fields=['patient', 'updated_at'], name='appt_patient_updated_idx'),
+        ]
+        constraints = [
+            # A doctor can't be booked twice for the same slot; cancelled bookings free it up
+            models.UniqueConstraint(
+                fields=['doctor', 'date', 'time'],
+                condition=~models.Q(status='cancelled'),
+                name='unique_active_doctor_slot',
+                violation_error_message='This doctor already has an appointment at this time.',
+            ),
+        ]
 
     def __str__(self):
         return f"Appointment: {self.patient.first_name} with {self.doctor.name}"
@@ -107,6 +152,7 @@ class Schedule(models.Model):
     weekday = models.CharField(max_length=3, choices=WEEKDAYS)
     start_time = models.TimeField()
     end_time = models.TimeField()
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.doctor.name} - {self.weekday}"
@@ -124,10 +170,29 @@ class Ward(models.Model):
 
     name = models.CharField(max_length=100)
     type = models.CharField(max_length=10, choices=WARD_CHOOSE)
+    # Totals over the ward's rooms, maintained by Room and Admission
+    bed_count = models.PositiveIntegerField(default=0, editable=False)
+    occupied_beds = models.PositiveIntegerField(default=0, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
 
+    @property
+    def free_beds(self):
+        return max(self.bed_count - self.occupied_beds, 0)
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            if self.pk:
+                row = Ward.objects.select_for_update().filter(pk=self.pk).values_list(
+                    'bed_count', 'occupied_beds'
+                ).first()
+                if row:
+                    # The counters belong to the database, never to a stale instance
+                    self.bed_count, self.occupied_beds = row
+            super().save(*args, **kwargs)
+
 
 # ==========================
 # Room
@@ -137,10 +202,36 @@ class Room(models.Model):
     room_no = models.CharField(max_length=10)
     bed_count = models.PositiveIntegerField()
     is_available = models.BooleanField(default=True)
+    # Admissions with status 'admitted', maintained by Admission
+    occupied_beds = models.PositiveIntegerField(default=0, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at'], name='room_updated_idx'),
+        ]
 
     def __str__(self):
         return f"Room {self.room_no} ({self.ward.name})"
 
+    @property
+    def free_beds(self):
+        return max(self.bed_count - self.occupied_beds, 0)
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            old_ward_id, old_beds, occupied = None, 0, 0
+            if self.pk:
+                row = Room.objects.select_for_update().filter(pk=self.pk).values_list(
+                    'ward_id', 'bed_count', 'occupied_beds'
+                ).first()
+                if row:
+                    old_ward_id, old_beds, occupied = row
+                    # The counter belongs to the database, never to a stale instance
+                    self.occupied_beds = occupied
+            super().save(*args, **kwargs)
+            occupancy.move_room_beds(old_ward_id, self.ward_id, old_beds, self.bed_count, occupied)
+
 
 # ==========================
 # Admission
@@ -156,10 +247,33 @@ class Admission(models.Model):
     admitted_at = models.DateTimeField(auto_now_add=True)
     discharged_at = models.DateTimeField(null=True, blank=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOOSE, default='admitted')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient', '-admitted_at', '-id'], name='admission_patient_idx'),
+            models.Index(fields=['-admitted_at', '-id'], name='admission_date_idx'),
+            models.Index(
+                fields=['-admitted_at', '-id'], name='admission_current_idx', condition=models.Q(status='admitted'),
+            ),
+        ]
 
     def __str__(self):
         return f"Admission: {self.patient.first_name}"
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            occupied_room_id = None
+            if self.pk:
+                occupied_room_id = Admission.objects.select_for_update().filter(
+                    pk=self.pk, status='admitted'
+                ).values_list('room_id', flat=True).first()
+            super().save(*args, **kwargs)
+            room_id = self.room_id if self.status == 'admitted' else None
+            if occupied_room_id != room_id:
+                occupancy.vacate(occupied_room_id)
+                occupancy.occupy(room_id)
+
 
 # ==========================
 # Treatment
@@ -169,6 +283,7 @@ class Treatment(models.Model):
     doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='treatments')
     description = models.TextField()
     treatment_date = models.DateField()
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"Treatment for {self.admission.patient.first_name}"
@@ -182,6 +297,7 @@ class Medication(models.Model):
     medicine_name = models.CharField(max_length=100)
     dosage = models.CharField(max_length=100)
     frequency = models.CharField(max_length=100)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.medicine_name
@@ -195,6 +311,7 @@ class Nurse(models.Model):
     phone = models.CharField(max_length=20)
     department = models.ForeignKey(Department, on_delete=models.CASCADE, related_name='nurses')
     assign_room = models.ForeignKey(Room, on_delete=models.SET_NULL, null=True, blank=True, related_name='nurses')
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -207,6 +324,7 @@ class LabTest(models.Model):
     test_name = models.CharField(max_length=200)
     description = models.TextField()
     price = models.PositiveIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.test_name
@@ -221,6 +339,14 @@ class LabReport(models.Model):
     test = models.ForeignKey(LabTest, on_delete=models.CASCADE, related_name='lab_reports')
     report_file = models.FileField(upload_to='reports/')
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient', '-created_at', '-id'], name='labreport_patient_idx'),
+            models.Index(fields=['doctor', '-created_at', '-id'], name='labreport_doctor_idx'),
+            models.Index(fields=['-created_at', '-id'], name='labreport_date_idx'),
+        ]
 
     def __str__(self):
         return f"Lab Report for {self.patient.first_name}"
@@ -235,6 +361,14 @@ class Prescription(models.Model):
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='prescriptions')
     notes = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient', '-created_at', '-id'], name='prescription_patient_idx'),
+            models.Index(fields=['doctor', '-created_at', '-id'], name='prescription_doctor_idx'),
+            models.Index(fields=['-created_at', '-id'], name='prescription_date_idx'),
+        ]
 
     def __str__(self):
         return f"Prescription for {self.patient.first_name}"
@@ -251,13 +385,47 @@ class Invoice(models.Model):
 
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='invoices')
     admission = models.ForeignKey(Admission, on_delete=models.SET_NULL, null=True, blank=True, related_name='invoices')
-    total_amount = models.FloatField()
-    status = models.CharField(max_length=10, choices=STATUS_CHOOSE, default='unpaid')
+    # Revenue is reported per department
+    department = models.ForeignKey(
+        Department, on_delete=models.SET_NULL, null=True, blank=True, related_name='invoices'
+    )
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2)
+    # Payment totals, maintained by Payment; status follows the balance
+    amount_paid = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    balance = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    status = models.CharField(max_length=10, choices=STATUS_CHOOSE, default='unpaid', editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient', '-created_at', '-id'], name='invoice_patient_idx'),
+            models.Index(fields=['-created_at', '-id'], name='invoice_date_idx'),
+            models.Index(
+                fields=['-created_at', '-id'], name='invoice_unpaid_idx', condition=models.Q(status='unpaid'),
+            ),
+        ]
 
     def __str__(self):
         return f"Invoice - {self.patient.first_name}"
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            row = None
+            if self.pk:
+                row = Invoice.objects.select_for_update().filter(pk=self.pk).values_list(
+                    'amount_paid', 'department_id'
+                ).first()
+                if row:
+                    # The total paid belongs to the database, never to a stale instance
+                    self.amount_paid = row[0]
+            self.total_amount = billing.to_money(self.total_amount)
+            self.balance = self.total_amount - self.amount_paid
+            self.status = billing.invoice_status(self.total_amount, self.amount_paid)
+            super().save(*args, **kwargs)
+            if row and row[1] != self.department_id:
+                billing.move_invoice_revenue(self.pk, row[1], self.department_id)
+
 
 # ==========================
 # Payment
@@ -270,9 +438,53 @@ class Payment(models.Model):
     ]
 
     invoice = models.ForeignKey(Invoice, on_delete=models.CASCADE, related_name='payments')
-    amount = models.FloatField()
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
     method = models.CharField(max_length=10, choices=METHOD_CHOOSE)
     paid_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['invoice', '-paid_at', '-id'], name='payment_invoice_idx'),
+            models.Index(fields=['-paid_at', '-id'], name='payment_date_idx'),
+        ]
 
     def __str__(self):
         return f"Payment for {self.invoice.id}"
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            old = None
+            if self.pk:
+                old = Payment.objects.select_for_update().filter(pk=self.pk).first()
+            self.amount = billing.to_money(self.amount)
+            super().save(*args, **kwargs)
+            billing.payments_changed(removed=[old] if old else [], added=[self])
+
+
+# ==========================
+# Daily Revenue
+# ==========================
+class DailyRevenue(models.Model):
+    """Payments per day, department and method, maintained by Payment."""
+    date = models.DateField()
+    # Rows of a deleted department are folded into the rows without one (see signals)
+    department = models.ForeignKey(
+        Department, on_delete=models.DO_NOTHING, null=True, blank=True, related_name='daily_revenue'
+    )
+    method = models.CharField(max_length=10, choices=Payment.METHOD_CHOOSE)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    payments = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['date', 'department', 'method']
+        constraints = [
+            # One row per key, including the rows without a department
+            models.UniqueConstraint(
+                fields=['date', 'department', 'method'], name='daily_revenue_key', nulls_distinct=False,
+            ),
+        ]
+
+    def __str__(self):
+        return f"Revenue {self.date} ({self.method})"
@@ -0,0 +1,100 @@
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .cache import response_cache
+
+
+# ==========================
+# Counter updates
+# ==========================
+def occupy(room_id, beds=1):
+    """Take `beds` beds in a room and its ward. Call inside a transaction."""
+    _add(room_id, beds)
+
+
+def vacate(room_id, beds=1):
+    """Free `beds` beds in a room and its ward. Call inside a transaction."""
+    _add(room_id, -beds)
+
+
+def _add(room_id, beds):
+    from .models import Room, Ward
+
+    if not room_id or not beds:
+        return
+    # Room first, then ward: the same lock order everywhere avoids deadlocks
+    Room.objects.filter(pk=room_id).update(occupied_beds=_plus('occupied_beds', beds), **_touch(Room))
+    Ward.objects.filter(rooms__id=room_id).update(occupied_beds=_plus('occupied_beds', beds), **_touch(Ward))
+    # update() sends no signals, so cached ward responses are dropped here
+    response_cache.invalidate(Ward)
+
+
+def _touch(model):
+    # update() skips auto_now
+    return {'updated_at': timezone.now()}
+
+
+def _plus(column, amount):
+    # Counters never go below zero, even if they drifted before a reconcile
+    return Greatest(F(column) + amount, Value(0))
+
+
+def move_room_beds(old_ward_id, new_ward_id, old_beds, new_beds, occupied):
+    """Keep ward totals in line when a room changes size or ward."""
+    from .models import Ward
+
+    if old_ward_id == new_ward_id and old_beds == new_beds:
+        return
+    response_cache.invalidate(Ward)
+    if old_ward_id == new_ward_id:
+        Ward.objects.filter(pk=new_ward_id).update(
+            bed_count=_plus('bed_count', new_beds - old_beds), **_touch(Ward)
+        )
+        return
+    if old_ward_id:
+        Ward.objects.filter(pk=old_ward_id).update(
+            bed_count=_plus('bed_count', -old_beds), occupied_beds=_plus('occupied_beds', -occupied), **_touch(Ward)
+        )
+    Ward.objects.filter(pk=new_ward_id).update(
+        bed_count=_plus('bed_count', new_beds), occupied_beds=_plus('occupied_beds', occupied), **_touch(Ward)
+    )
+
+
+# ==========================
+# Reconciliation
+# ==========================
+def reconcile():
+    """
+    Recompute every counter from the Admission and Room tables and return
+    how many rooms and wards had drifted.
+    """
+    from .models import Admission, Room, Ward
+
+    rooms_before = dict(Room.objects.values_list('id', 'occupied_beds'))
+    wards_before = {w[0]: w[1:] for w in Ward.objects.values_list('id', 'bed_count', 'occupied_beds')}
+
+    admitted = (
+        Admission.objects.filter(room=OuterRef('pk'), status='admitted')
+        .order_by().values('room').annotate(n=Count('id')).values('n')
+    )
+    Room.objects.update(occupied_beds=Coalesce(Subquery(admitted), Value(0)))
+
+    def room_total(column):
+        return Coalesce(Subquery(
+            Room.objects.filter(ward=OuterRef('pk'))
+            .order_by().values('ward').annotate(n=Sum(column)).values('n')
+        ), Value(0))
+    Ward.objects.update(bed_count=room_total('bed_count'), occupied_beds=room_total('occupied_beds'))
+
+    rooms_after = dict(Room.objects.values_list('id', 'occupied_beds'))
+    wards_after = {w[0]: w[1:] for w in Ward.objects.values_list('id', 'bed_count', 'occupied_beds')}
+    rooms_changed = [pk for pk, value in rooms_after.items() if rooms_before.get(pk) != value]
+    wards_changed = [pk for pk, value in wards_after.items() if wards_before.get(pk) != value]
+    if rooms_changed:
+        Room.objects.filter(pk__in=rooms_changed).update(**_touch(Room))
+    if wards_changed:
+        Ward.objects.filter(pk__in=wards_changed).update(**_touch(Ward))
+    if rooms_changed or wards_changed:
+        response_cache.invalidate(Ward)
+    return len(rooms_changed), len(wards_changed)
@@ -0,0 +1,53 @@
+from django.contrib.postgres import operations
+from django.contrib.postgres.indexes import PostgresIndex
+from django.db.migrations import AddIndex, RemoveIndex
+
+
+# ==========================
+# Migration operations
+# ==========================
+class AddIndexConcurrently(operations.AddIndexConcurrently):
+    """
+    CREATE INDEX CONCURRENTLY on PostgreSQL. Other databases (SQLite for
+    generate_dataset and check_index_usage) get a plain CREATE INDEX, and
+    PostgreSQL-only index types such as GIN are skipped there.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+        elif not isinstance(self.index, PostgresIndex):
+            AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+        elif not isinstance(self.index, PostgresIndex):
+            AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+
+
+class RemoveIndexConcurrently(operations.RemoveIndexConcurrently):
+    """DROP INDEX CONCURRENTLY, with the same fallbacks as AddIndexConcurrently."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+        elif not isinstance(self.get_index(from_state, app_label), PostgresIndex):
+            RemoveIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+        elif not isinstance(self.get_index(to_state, app_label), PostgresIndex):
+            RemoveIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+
+    def get_index(self, state, app_label):
+        return state.models[app_label, self.model_name_lower].get_index_by_name(self.name)
+
+
+class TrigramExtension(operations.TrigramExtension):
+    """pg_trgm, which is skipped outside PostgreSQL when migrating backwards too."""
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
@@ -0,0 +1,161 @@
+import base64
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from uuid import UUID
+
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db.models import Q
+from django.utils.encoding import force_str
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def _reverse_ordering(ordering):
+    return [o[1:] if o.startswith('-') else '-' + o for o in ordering]
+
+
+# -------------------------------
+# Keyset Pagination
+# -------------------------------
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination over the full ordering of the queryset, opt-in per
+    request: lists stay a bare array unless `?page_size=` (or a cursor) is
+    given, and then come back as {next, previous, results}.
+
+    The ordering is taken from the queryset (falling back to the model's
+    Meta.ordering) and always ends with `id`, so every row has a unique
+    position. The cursor stores the values of all ordering columns for the
+    last row of a page and the next page is fetched with a keyset comparison
+    instead of an OFFSET, so deep pages cost the same as the first one.
+    Ordering columns can't be nullable: a NULL compares as neither greater
+    nor less, so rows after it would silently drop out of the pages.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def get_page_size(self, request):
+        params = request.query_params
+        if self.page_size_query_param not in params and self.cursor_query_param not in params:
+            return None
+        return super().get_page_size(request)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = [
+            'id' if o == 'pk' else '-id' if o == '-pk' else o
+            for o in (queryset.query.order_by or queryset.model._meta.ordering)
+        ]
+        if not all(isinstance(o, str) for o in ordering):
+            raise TypeError('KeysetPagination only supports field name orderings.')
+        if 'id' not in ordering and '-id' not in ordering:
+            ordering.append('-id' if ordering and ordering[0].startswith('-') else 'id')
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.get_page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset() for async views, the page is read with the async ORM."""
+        queryset = self.get_page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.set_page([row async for row in queryset])
+
+    def get_page_queryset(self, queryset, request, view=None):
+        """The query for the requested page plus one row, or None when pagination is off."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.fields = [queryset.model._meta.get_field(o.lstrip('-')) for o in self.ordering]
+        nullable = [field.name for field in self.fields if field.null]
+        if nullable:
+            raise ImproperlyConfigured(f"KeysetPagination can't order by nullable columns: {', '.join(nullable)}")
+
+        self.cursor = self.decode_cursor(request)
+        reverse = bool(self.cursor and self.cursor['reverse'])
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if self.cursor is not None:
+            queryset = queryset.filter(self.get_keyset_filter(ordering, self.cursor['position']))
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        reverse = bool(self.cursor and self.cursor['reverse'])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+        return self.page
+
+    def get_keyset_filter(self, ordering, position):
+        # (a, b, c) > (x, y, z) expanded per column, so mixed directions work.
+        # The OR alone can't bound an index scan, so the first column's
+        # bound (a >= x), which every later row satisfies, is ANDed on and
+        # a deep page starts where the cursor is instead of at the top.
+        first = ordering[0]
+        bound = Q(**{first.lstrip('-') + ('__lte' if first.startswith('-') else '__gte'): position[0]})
+        keyset = Q()
+        for index, order in enumerate(ordering):
+            lookup = '__lt' if order.startswith('-') else '__gt'
+            condition = Q(**{order.lstrip('-') + lookup: position[index]})
+            for previous, value in zip(ordering[:index], position):
+                condition &= Q(**{previous.lstrip('-'): value})
+            keyset |= condition
+        return bound & keyset
+
+    def get_position(self, row):
+        position = []
+        for field in self.fields:
+            value = row[field.name] if isinstance(row, dict) else getattr(row, field.attname)
+            if isinstance(value, (date, datetime, time)):
+                value = value.isoformat()
+            elif isinstance(value, (Decimal, UUID)):
+                # Exact as text; decode_cursor() turns it back with field.to_python()
+                value = str(value)
+            position.append(value)
+        return position
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor({'position': self.get_position(self.page[-1]), 'reverse': False})
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor({'position': self.get_position(self.page[0]), 'reverse': True})
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            position = [
+                field.to_python(value) for field, value in zip(self.fields, cursor['p'], strict=True)
+            ]
+            return {'position': position, 'reverse': bool(cursor.get('r'))}
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, cursor):
+        payload = json.dumps({'p': cursor['position'], 'r': int(cursor['reverse'])}, separators=(',', ':'))
+        encoded = force_str(base64.urlsafe_b64encode(payload.encode('utf-8')))
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
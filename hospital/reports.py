@@ -0,0 +1,156 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db.models import Case, Count, F, Min, Sum, Value, When, Window
+from django.db.models.functions import TruncMonth, TruncYear
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .models import DailyRevenue, Payment
+
+DAILY_MAX_DAYS = 366
+MONTHLY_MAX_DAYS = 5 * 366
+PERIODS = ('day', 'month', 'year')
+# (label, invoices created less than this many days ago); the last bucket takes the rest
+AGING_BUCKETS = [('0-30', 30), ('31-60', 60), ('61-90', 90), ('90+', None)]
+
+
+# ==========================
+# Query params
+# ==========================
+def parse_range(params, default_days, max_days):
+    """Read `from`, `to`, `department` and `method` from the query string."""
+    errors = {}
+    today = timezone.localdate()
+
+    def read_date(name, default):
+        value = params.get(name)
+        if not value:
+            return default
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            errors[name] = 'Use the YYYY-MM-DD format.'
+
+    end = read_date('to', today)
+    start = read_date('from', (end or today) - timedelta(days=default_days - 1))
+    if start and end:
+        if start > end:
+            errors['from'] = 'Must not be after `to`.'
+        elif (end - start).days >= max_days:
+            errors['from'] = f'The range is limited to {max_days} days.'
+
+    filters = parse_department(params, errors)
+    method = params.get('method')
+    if method:
+        if method not in dict(Payment.METHOD_CHOOSE):
+            errors['method'] = f"Must be one of: {', '.join(dict(Payment.METHOD_CHOOSE))}."
+        filters['method'] = method
+    if errors:
+        raise ValidationError(errors)
+    return start, end, filters
+
+
+def parse_department(params, errors):
+    """`?department=<id>` or `?department=none` as queryset filters."""
+    department = params.get('department')
+    if not department:
+        return {}
+    if department == 'none':
+        return {'department__isnull': True}
+    if department.isdigit():
+        return {'department_id': int(department)}
+    errors['department'] = 'Must be a department id or `none`.'
+    return {}
+
+
+def parse_period(params, default='month'):
+    period = params.get('period', default)
+    if period not in PERIODS:
+        raise ValidationError({'period': f"Must be one of: {', '.join(PERIODS)}."})
+    return period
+
+
+# ==========================
+# Revenue
+# ==========================
+# Everything below reads the DailyRevenue rollup, never the Payment table.
+def daily_revenue(start, end, **filters):
+    return (
+        DailyRevenue.objects.filter(date__range=(start, end), **filters)
+        .order_by('date', 'department', 'method')
+        .values('date', 'department', 'method', 'amount', 'payments')
+    )
+
+
+def monthly_revenue(start, end, **filters):
+    return (
+        DailyRevenue.objects.filter(date__range=(start, end), **filters)
+        .annotate(month=TruncMonth('date'))
+        .order_by('month', 'department', 'method')
+        .values('month', 'department', 'method')
+        .annotate(amount=Sum('amount'), payments=Sum('payments'))
+    )
+
+
+def _period(name):
+    return {'day': F('date'), 'month': TruncMonth('date'), 'year': TruncYear('date')}[name]
+
+
+def revenue_by_period(start, end, period='month', **filters):
+    """
+    Revenue per day, month or year with a running total. Both totals are
+    window sums over the rollup rows; DISTINCT keeps one row per period.
+    """
+    return (
+        DailyRevenue.objects.filter(date__range=(start, end), **filters)
+        .annotate(period=_period(period))
+        .annotate(
+            total=Window(Sum('amount'), partition_by=[F('period')]),
+            count=Window(Sum('payments'), partition_by=[F('period')]),
+            # The default frame ends with the last row of the current period
+            running_total=Window(Sum('amount'), order_by=F('period').asc()),
+        )
+        .values('period', 'total', 'count', 'running_total')
+        .distinct()
+        .order_by('period')
+    )
+
+
+def method_totals(start, end, **filters):
+    """Amount, payment count and share of the total per payment method."""
+    rows = list(
+        DailyRevenue.objects.filter(date__range=(start, end), **filters)
+        .values('method')
+        .annotate(total=Sum('amount'), count=Sum('payments'))
+        .order_by('-total', 'method')
+    )
+    grand_total = sum(row['total'] for row in rows)
+    for row in rows:
+        row['share'] = (row['total'] / grand_total).quantize(Decimal('0.0001')) if grand_total else Decimal(0)
+    return rows
+
+
+# ==========================
+# Receivables
+# ==========================
+def aging(invoices, as_of=None):
+    """Unpaid balances of `invoices` by age, one GROUP BY over the unpaid-invoice index."""
+    as_of = as_of or timezone.now()
+    bucket = Case(
+        *[
+            When(created_at__gt=as_of - timedelta(days=days), then=Value(label))
+            for label, days in AGING_BUCKETS if days is not None
+        ],
+        default=Value(AGING_BUCKETS[-1][0]),
+    )
+    rows = (
+        invoices.select_related(None).prefetch_related(None).order_by()
+        .filter(status='unpaid', created_at__lte=as_of)
+        .annotate(bucket=bucket)
+        .values('bucket')
+        .annotate(invoices=Count('id'), outstanding=Sum('balance'), oldest=Min('created_at'))
+    )
+    found = {row['bucket']: row for row in rows}
+    empty = {'invoices': 0, 'outstanding': Decimal('0.00'), 'oldest': None}
+    return [found.get(label, {'bucket': label, **empty}) for label, _ in AGING_BUCKETS]
@@ -0,0 +1,93 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+from django.db.models import CharField, Func, Q
+from django.db.models.functions import Greatest
+from rest_framework.exceptions import ValidationError
+
+MIN_QUERY_LENGTH = 3
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+PHONE_RE = re.compile(r'^[\d\s()+-]+$')
+
+
+class PhoneDigits(Func):
+    """The digits of a phone number, `+880 (17) 11-000` -> `8801711000`."""
+    function = 'REGEXP_REPLACE'
+    template = "%(function)s(%(expressions)s, '[^0-9]', '', 'g')"
+    arity = 1
+    output_field = CharField()
+
+
+def patient_search_vector():
+    # Must stay identical to the expression of patient_search_idx
+    return SearchVector('first_name', 'last_name', config='simple')
+
+
+# ==========================
+# Query params
+# ==========================
+def parse_params(params):
+    """Read `q` and `limit` from the query string."""
+    q = ' '.join(params.get('q', '').split())
+    errors = {}
+    if len(q) < MIN_QUERY_LENGTH:
+        errors['q'] = f'Enter at least {MIN_QUERY_LENGTH} characters.'
+    limit = params.get('limit', DEFAULT_LIMIT)
+    try:
+        limit = int(limit)
+        if not 1 <= limit <= MAX_LIMIT:
+            raise ValueError
+    except (TypeError, ValueError):
+        errors['limit'] = f'Must be a number between 1 and {MAX_LIMIT}.'
+    if errors:
+        raise ValidationError(errors)
+    return q, limit
+
+
+# ==========================
+# Patient search
+# ==========================
+def prefix_query(q):
+    """`amina rah` -> tsquery `amina:* & rah:*`, or None when no words are left."""
+    words = [re.sub(r'[^\w]', '', word) for word in q.split()]
+    words = [word for word in words if word]
+    if not words:
+        return None
+    return SearchQuery(' & '.join(f'{word}:*' for word in words), search_type='raw', config='simple')
+
+
+def filter_patients(queryset, q):
+    """
+    Patients matching `q`. Every branch is backed by an index: digits search
+    the trigram index on the phone's digits, so `01711 000` finds
+    `+880 1711-000000`, anything with @ the email trigram index, and
+    names both the full-text index (word prefixes, several words) and the
+    name trigram indexes (any part of a name).
+    """
+    if PHONE_RE.match(q):
+        digits = re.sub(r'\D', '', q)
+        if len(digits) < MIN_QUERY_LENGTH:
+            raise ValidationError({'q': f'Enter at least {MIN_QUERY_LENGTH} digits.'})
+        return queryset.alias(phone_digits=PhoneDigits('phone')).filter(phone_digits__contains=digits)
+    if '@' in q:
+        return queryset.filter(email__icontains=q)
+
+    condition = Q(first_name__icontains=q) | Q(last_name__icontains=q) | Q(email__icontains=q)
+    query = prefix_query(q)
+    if query is not None:
+        condition |= Q(search=query)
+    return queryset.alias(search=patient_search_vector()).filter(condition)
+
+
+def rank_patients(queryset, q):
+    """Best matches first: full-text rank, then trigram similarity of the names."""
+    query = prefix_query(q)
+    rank = SearchRank(patient_search_vector(), query) if query is not None else None
+    similarity = Greatest(TrigramWordSimilarity(q, 'first_name'), TrigramWordSimilarity(q, 'last_name'))
+    queryset = queryset.annotate(similarity=similarity)
+    ordering = ['-similarity', 'first_name', 'last_name', 'id']
+    if rank is not None:
+        queryset = queryset.annotate(rank=rank)
+        ordering.insert(0, '-rank')
+    return queryset.order_by(*ordering)
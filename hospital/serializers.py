@@ -1,4 +1,9 @@
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
 from rest_framework import serializers
+from rest_framework.validators import UniqueTogetherValidator
+from . import billing
 from .models import (
     Patient, Department, Doctor, Appointment,
     Schedule, Ward, Room, Admission,
@@ -6,12 +11,160 @@ from .models import (
     LabTest, LabReport, Prescription,
     Invoice, Payment
 )
+import time
+from contextlib import contextmanager
 from datetime import date
 
+
+# -------------------------------
+# Dynamic Fields Base Serializer
+# -------------------------------
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """
+    A ModelSerializer that takes an optional `fields` argument listing the
+    fields to include. Nested serializers are left untouched.
+
+    Top-level serialization (one object, or each item of a list) is added to
+    the request's `serialize` time for QueryMetricsMiddleware.
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    def to_representation(self, instance):
+        timing = self.get_request_timing()
+        if timing is None:
+            return super().to_representation(instance)
+        started, db = time.perf_counter(), timing.db
+        try:
+            return super().to_representation(instance)
+        finally:
+            # Lazy related lookups are already counted as db time
+            timing.serialize += time.perf_counter() - started - (timing.db - db)
+
+    def get_request_timing(self):
+        parent = self.parent
+        if parent is not None and not (isinstance(parent, serializers.ListSerializer) and parent.parent is None):
+            # Nested, timed with its root
+            return None
+        return getattr(self.context.get('request'), 'timing', None)
+
+
+# -------------------------------
+# Bulk Write Serializers
+# -------------------------------
+class CachedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Resolves ids from the batch cache of a BulkListSerializer when there is
+    one, so a batch costs one query per related model instead of per row.
+    """
+
+    def to_internal_value(self, data):
+        cache = getattr(self.root, 'related_cache', {}).get(self.field_name)
+        if cache is not None and str(data) in cache:
+            return cache[str(data)]
+        return super().to_internal_value(data)
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    """
+    ListSerializer used by the bulk endpoints.
+
+    Related ids of the whole batch are loaded before validation and rows are
+    written with bulk_create/bulk_update. For updates `instance` is a dict of
+    {pk: object} and every item must carry its `id`. A child serializer may
+    define `validate_batch(items, instances)` to replace per-row uniqueness
+    queries with a single query for the batch, and `batch_saved(objects,
+    previous)` to do the work of Model.save(), which the bulk writes skip;
+    `previous` holds the rows as they were before an update, else None.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ordered_instances = []
+        if hasattr(self.child, 'validate_batch'):
+            self.child.validators = [
+                validator for validator in self.child.validators
+                if not isinstance(validator, UniqueTogetherValidator)
+            ]
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self.related_cache = self.prefetch_related_ids(data)
+        self.ordered_instances = []
+        items = super().to_internal_value(data)
+
+        if hasattr(self.child, 'validate_batch'):
+            errors = self.child.validate_batch(items, self.ordered_instances or [None] * len(items))
+            if any(errors):
+                raise serializers.ValidationError(errors)
+        return items
+
+    def run_child_validation(self, data):
+        if self.instance is not None:
+            instance = self.instance.get(_to_pk(data.get('id')) if isinstance(data, dict) else None)
+            if instance is None:
+                raise serializers.ValidationError({'id': ['Not found.']})
+            self.child.instance = instance
+            self.child.initial_data = data
+            self.ordered_instances.append(instance)
+        return super().run_child_validation(data)
+
+    def prefetch_related_ids(self, data):
+        cache = {}
+        for name, field in self.child.fields.items():
+            if not isinstance(field, CachedPrimaryKeyRelatedField) or field.read_only:
+                continue
+            ids = {_to_pk(item.get(name)) for item in data if isinstance(item, dict)} - {None}
+            if ids:
+                cache[name] = {str(pk): obj for pk, obj in field.get_queryset().in_bulk(ids).items()}
+        return cache
+
+    def create(self, validated_data):
+        model = self.child.Meta.model
+        objects = model.objects.bulk_create([model(**attrs) for attrs in validated_data], batch_size=500)
+        if hasattr(self.child, 'batch_saved'):
+            self.child.batch_saved(objects, None)
+        return objects
+
+    def update(self, instance, validated_data):
+        model = self.child.Meta.model
+        previous = None
+        if hasattr(self.child, 'batch_saved'):
+            # Locked and re-read: the instances were loaded before validation
+            rows = model.objects.select_for_update().in_bulk([obj.pk for obj in self.ordered_instances])
+            previous = [rows[obj.pk] for obj in self.ordered_instances]
+        fields = set()
+        now = timezone.now()
+        for obj, attrs in zip(self.ordered_instances, validated_data):
+            for name, value in attrs.items():
+                setattr(obj, name, value)
+            fields.update(attrs)
+            # bulk_update() doesn't run auto_now
+            obj.updated_at = now
+        if fields:
+            fields.add('updated_at')
+            model.objects.bulk_update(self.ordered_instances, fields, batch_size=500)
+        if previous is not None:
+            self.child.batch_saved(self.ordered_instances, previous)
+        return self.ordered_instances
+
+
+def _to_pk(value):
+    if isinstance(value, int) or (isinstance(value, str) and value.isdigit()):
+        return int(value)
+    return None
+
+
 # -------------------------------
 # Patient Serializer
 # -------------------------------
-class PatientSerializer(serializers.ModelSerializer):
+class PatientSerializer(DynamicFieldsModelSerializer):
     name = serializers.SerializerMethodField()
     age = serializers.SerializerMethodField()
 
@@ -36,7 +189,7 @@ class PatientSerializer(serializers.ModelSerializer):
 # -------------------------------
 # Department Serializer
 # -------------------------------
-class DepartmentSerializer(serializers.ModelSerializer):
+class DepartmentSerializer(DynamicFieldsModelSerializer):
     doctor_count = serializers.IntegerField(source='doctors.count', read_only=True)
 
     class Meta:
@@ -47,7 +200,7 @@ class DepartmentSerializer(serializers.ModelSerializer):
 # -------------------------------
 # Doctor Serializer
 # -------------------------------
-class DoctorSerializer(serializers.ModelSerializer):
+class DoctorSerializer(DynamicFieldsModelSerializer):
     department_name = serializers.CharField(source='department.name', read_only=True)
 
     class Meta:
@@ -61,12 +214,14 @@ class DoctorSerializer(serializers.ModelSerializer):
 # -------------------------------
 # Appointment Serializer
 # -------------------------------
-class AppointmentSerializer(serializers.ModelSerializer):
+class AppointmentSerializer(DynamicFieldsModelSerializer):
+    serializer_related_field = CachedPrimaryKeyRelatedField
     patient_detail = PatientSerializer(source='patient', read_only=True)
     doctor_detail = DoctorSerializer(source='doctor', read_only=True)
 
     class Meta:
         model = Appointment
+        list_serializer_class = BulkListSerializer
         fields = [
             'id', 'patient', 'doctor', 'date', 'time', 'status', 'notes',
             'patient_detail', 'doctor_detail'
@@ -78,11 +233,72 @@ class AppointmentSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError({"doctor": "Selected doctor is not active."})
         return data
 
+    def validate_batch(self, items, instances):
+        """Check the slots of a whole bulk batch with one query."""
+        slots = []
+        for attrs, instance in zip(items, instances):
+            current = {
+                name: attrs.get(name, getattr(instance, name, None))
+                for name in ('doctor', 'date', 'time', 'status')
+            }
+            if current['status'] == 'cancelled':
+                slots.append(None)
+            else:
+                slots.append((current['doctor'].pk, current['date'], current['time']))
+
+        active = [slot for slot in slots if slot]
+        taken = set(
+            Appointment.objects.exclude(status='cancelled')
+            .exclude(pk__in=[instance.pk for instance in instances if instance])
+            .filter(doctor_id__in={slot[0] for slot in active}, date__in={slot[1] for slot in active})
+            .values_list('doctor_id', 'date', 'time')
+        ) if active else set()
+
+        errors = []
+        for slot in slots:
+            if slot and slot in taken:
+                errors.append({"time": ["This doctor already has an appointment at this time."]})
+            else:
+                errors.append({})
+                if slot:
+                    taken.add(slot)
+        return errors
+
+    # The unique validator above is only a pre-check; two concurrent bookings can
+    # both pass it, so the partial unique constraint decides and the loser gets a 400.
+    def create(self, validated_data):
+        with self.slot_conflict_as_validation_error():
+            return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        with self.slot_conflict_as_validation_error():
+            return super().update(instance, validated_data)
+
+    @contextmanager
+    def slot_conflict_as_validation_error(self):
+        try:
+            with transaction.atomic():
+                yield
+        except IntegrityError as error:
+            if not is_slot_conflict(error):
+                raise
+            raise serializers.ValidationError({"time": "This doctor already has an appointment at this time."})
+
+
+def is_slot_conflict(error):
+    """Whether an IntegrityError was raised by the unique_active_doctor_slot constraint."""
+    diag = getattr(error.__cause__, 'diag', None)
+    if diag is not None:
+        # psycopg 2 and 3 name the violated constraint
+        return diag.constraint_name == 'unique_active_doctor_slot'
+    # SQLite only lists the columns
+    return str(error).endswith('hospital_appointment.doctor_id, hospital_appointment.date, hospital_appointment.time')
+
 
 # -------------------------------
 # Schedule Serializer
 # -------------------------------
-class ScheduleSerializer(serializers.ModelSerializer):
+class ScheduleSerializer(DynamicFieldsModelSerializer):
     doctor_detail = DoctorSerializer(source='doctor', read_only=True)
 
     class Meta:
@@ -93,27 +309,30 @@ class ScheduleSerializer(serializers.ModelSerializer):
 # -------------------------------
 # Ward Serializer
 # -------------------------------
-class WardSerializer(serializers.ModelSerializer):
+class WardSerializer(DynamicFieldsModelSerializer):
+    free_beds = serializers.IntegerField(read_only=True)
+
     class Meta:
         model = Ward
-        fields = ['id', 'name', 'type']
+        fields = ['id', 'name', 'type', 'bed_count', 'occupied_beds', 'free_beds']
 
 
 # -------------------------------
 # Room Serializer
 # -------------------------------
-class RoomSerializer(serializers.ModelSerializer):
+class RoomSerializer(DynamicFieldsModelSerializer):
+    free_beds = serializers.IntegerField(read_only=True)
     ward_detail = WardSerializer(source='ward', read_only=True)
 
     class Meta:
         model = Room
-        fields = ['id', 'ward', 'ward_detail', 'room_no', 'bed_count', 'is_available']
+        fields = ['id', 'ward', 'ward_detail', 'room_no', 'bed_count', 'is_available', 'occupied_beds', 'free_beds']
 
 
 # -------------------------------
 # Admission Serializer
 # -------------------------------
-class AdmissionSerializer(serializers.ModelSerializer):
+class AdmissionSerializer(DynamicFieldsModelSerializer):
     patient_detail = PatientSerializer(source='patient', read_only=True)
     room_detail = RoomSerializer(source='room', read_only=True)
 
@@ -128,7 +347,7 @@ class AdmissionSerializer(serializers.ModelSerializer):
 # -------------------------------
 # Treatment Serializer
 # -------------------------------
-class TreatmentSerializer(serializers.ModelSerializer):
+class TreatmentSerializer(DynamicFieldsModelSerializer):
     admission_detail = AdmissionSerializer(source='admission', read_only=True)
     doctor_detail = DoctorSerializer(source='doctor', read_only=True)
 
@@ -140,18 +359,20 @@ class TreatmentSerializer(serializers.ModelSerializer):
 # -------------------------------
 # Medication Serializer
 # -------------------------------
-class MedicationSerializer(serializers.ModelSerializer):
+class MedicationSerializer(DynamicFieldsModelSerializer):
+    serializer_related_field = CachedPrimaryKeyRelatedField
     treatment_detail = TreatmentSerializer(source='treatment', read_only=True)
 
     class Meta:
         model = Medication
+        list_serializer_class = BulkListSerializer
         fields = ['id', 'treatment', 'treatment_detail', 'medicine_name', 'dosage', 'frequency']
 
 
 # -------------------------------
 # Nurse Serializer
 # -------------------------------
-class NurseSerializer(serializers.ModelSerializer):
+class NurseSerializer(DynamicFieldsModelSerializer):
     department_detail = DepartmentSerializer(source='department', read_only=True)
     assign_room_detail = RoomSerializer(source='assign_room', read_only=True)
 
@@ -163,7 +384,7 @@ class NurseSerializer(serializers.ModelSerializer):
 # -------------------------------
 # LabTest Serializer
 # -------------------------------
-class LabTestSerializer(serializers.ModelSerializer):
+class LabTestSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = LabTest
         fields = ['id', 'test_name', 'description', 'price']
@@ -172,7 +393,7 @@ class LabTestSerializer(serializers.ModelSerializer):
 # -------------------------------
 # LabReport Serializer
 # -------------------------------
-class LabReportSerializer(serializers.ModelSerializer):
+class LabReportSerializer(DynamicFieldsModelSerializer):
     patient_detail = PatientSerializer(source='patient', read_only=True)
     doctor_detail = DoctorSerializer(source='doctor', read_only=True)
     test_detail =  LabTestSerializer(source='test', read_only=True)
@@ -182,10 +403,25 @@ class LabReportSerializer(serializers.ModelSerializer):
         fields = ['id', 'patient', 'patient_detail', 'doctor', 'doctor_detail', 'test', 'test_detail', 'report_file', 'created_at']
 
 
+class LabReportUploadSerializer(serializers.Serializer):
+    """Request for an upload ticket: the report's rows and the file to come."""
+    patient = serializers.PrimaryKeyRelatedField(queryset=Patient.objects.all())
+    doctor = serializers.PrimaryKeyRelatedField(queryset=Doctor.objects.all())
+    test = serializers.PrimaryKeyRelatedField(queryset=LabTest.objects.all())
+    filename = serializers.CharField(max_length=200)
+    size = serializers.IntegerField(min_value=1)
+    content_type = serializers.CharField(max_length=100, default='application/octet-stream')
+
+    def validate_size(self, value):
+        if value > settings.LAB_REPORT_MAX_UPLOAD_SIZE:
+            raise serializers.ValidationError(f'Files may be at most {settings.LAB_REPORT_MAX_UPLOAD_SIZE} bytes.')
+        return value
+
+
 # -------------------------------
 # Prescription Serializer
 # -------------------------------
-class PrescriptionSerializer(serializers.ModelSerializer):
+class PrescriptionSerializer(DynamicFieldsModelSerializer):
     appointment_detail = serializers.PrimaryKeyRelatedField(read_only=True)
     doctor_detail = DoctorSerializer(source='doctor', read_only=True)
     patient_detail = PatientSerializer(source='patient', read_only=True)
@@ -198,22 +434,31 @@ class PrescriptionSerializer(serializers.ModelSerializer):
 # -------------------------------
 # Invoice Serializer
 # -------------------------------
-class InvoiceSerializer(serializers.ModelSerializer):
+class InvoiceSerializer(DynamicFieldsModelSerializer):
     patient_detail = PatientSerializer(source='patient', read_only=True)
     admission_detail = AdmissionSerializer(source='admission', read_only=True)
     payments = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
 
     class Meta:
         model = Invoice
-        fields = ['id', 'patient', 'patient_detail', 'admission', 'admission_detail', 'total_amount', 'status', 'created_at', 'payments']
+        fields = [
+            'id', 'patient', 'patient_detail', 'admission', 'admission_detail', 'department',
+            'total_amount', 'amount_paid', 'balance', 'status', 'created_at', 'payments'
+        ]
 
 
 # -------------------------------
 # Payment Serializer
 # -------------------------------
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(DynamicFieldsModelSerializer):
+    serializer_related_field = CachedPrimaryKeyRelatedField
     invoice_detail = InvoiceSerializer(source='invoice', read_only=True)
 
     class Meta:
         model = Payment
+        list_serializer_class = BulkListSerializer
         fields = ['id', 'invoice', 'invoice_detail', 'amount', 'method', 'paid_at']
+
+    def batch_saved(self, objects, previous):
+        """Keep invoice totals and revenue rollups in line with bulk writes."""
+        billing.payments_changed(removed=previous or [], added=objects)
@@ -0,0 +1,52 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import billing, occupancy
+from .cache import response_cache
+from .models import Admission, Department, Doctor, LabTest, Payment, Room, Ward
+
+
+# ==========================
+# Bed occupancy
+# ==========================
+# Deletes are handled here rather than in Model.delete() so that cascades
+# (e.g. deleting a patient or a room) keep the counters right as well.
+@receiver(post_delete, sender=Admission)
+def release_admission_bed(sender, instance, **kwargs):
+    if instance.status == 'admitted':
+        occupancy.vacate(instance.room_id)
+
+
+@receiver(post_delete, sender=Room)
+def remove_room_beds(sender, instance, **kwargs):
+    # Occupied beds were already released by the cascaded admissions
+    occupancy.move_room_beds(instance.ward_id, None, instance.bed_count, 0, 0)
+
+
+# ==========================
+# Billing summaries
+# ==========================
+# Same as above: deleting an invoice or a patient cascades to its payments.
+@receiver(post_delete, sender=Payment)
+def remove_payment(sender, instance, **kwargs):
+    billing.payments_changed(removed=[instance])
+
+
+@receiver(pre_delete, sender=Department)
+def release_department_revenue(sender, instance, **kwargs):
+    billing.release_department(instance.pk)
+
+
+# ==========================
+# Response cache
+# ==========================
+@receiver(post_save, sender=Department)
+@receiver(post_save, sender=Doctor)
+@receiver(post_save, sender=Ward)
+@receiver(post_save, sender=LabTest)
+@receiver(post_delete, sender=Department)
+@receiver(post_delete, sender=Doctor)
+@receiver(post_delete, sender=Ward)
+@receiver(post_delete, sender=LabTest)
+def invalidate_cached_responses(sender, **kwargs):
+    response_cache.invalidate(sender)
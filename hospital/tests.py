@@ -1,3 +1,1212 @@
-from django.test import TestCase
+import importlib.util
+import io
+import json
+import os
+import sys
+import tempfile
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.db.models import Max, QuerySet, Sum
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from hospital_management.testing import QueryBudgetTestMixin
+
+from . import availability, billing, occupancy, reports, search, uploads
+from .benchmarks import percentile, summarize
+from .cache import response_cache
+from .filters import check_ordering_indexes
+from .models import (
+    Patient, Department, Doctor, Appointment, Schedule, Ward, Room, Admission,
+    Treatment, Medication, Nurse, LabTest, LabReport, Prescription, Invoice, Payment, DailyRevenue
+)
+from .pagination import KeysetPagination
+from .serializers import AppointmentSerializer
+from .views import AppointmentViewSet
+
+
+def make_patient(n):
+    return Patient.objects.create(
+        first_name=f'Patient{n}', last_name='Test', email=f'patient{n}@example.com', phone='0100',
+        gender='female', dob=date(1990, 1, 1), blood_group='A+', address='-', emergency_contact='0100',
+    )
+
+
+def make_doctor(department, n):
+    return Doctor.objects.create(
+        name=f'Doctor {n}', department=department, specialization='General', phone='0100',
+        email=f'doctor{n}@example.com', qualification='MBBS', active_time=time(9),
+    )
+
+
+# ==========================
+# Keyset pagination
+# ==========================
+class KeysetPaginationTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name='Medicine', description='-')
+        doctors = [make_doctor(department, n) for n in range(3)]
+        patient = make_patient(0)
+        # Three doctors share every slot, so date and time tie across pages
+        Appointment.objects.bulk_create(
+            Appointment(patient=patient, doctor=doctor, date=date(2025, 1, 1) + timedelta(days=day), time=time(hour))
+            for day in range(3) for hour in (9, 10, 11) for doctor in doctors
+        )
+
+    def walk(self, url, link='next'):
+        ids, pages = [], 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            rows = [row['id'] for row in response.data['results']]
+            ids.extend(reversed(rows) if link == 'previous' else rows)
+            url = response.data[link]
+            pages += 1
+            self.assertLess(pages, 100)
+        return ids, response
+
+    def test_pages_through_without_gaps_or_duplicates(self):
+        for ordering, expected in [
+            ('', Appointment.objects.order_by('-date', '-time', '-id')),
+            ('&ordering=date', Appointment.objects.order_by('date', 'time', 'id')),
+            ('&ordering=-id', Appointment.objects.order_by('-id')),
+        ]:
+            expected = list(expected.values_list('id', flat=True))
+            for page_size in (1, 4, 7, 27, 50):
+                with self.subTest(ordering=ordering, page_size=page_size):
+                    ids, _ = self.walk(f'/api/v1/appointments/?page_size={page_size}{ordering}')
+                    self.assertEqual(ids, expected)
+
+    def test_previous_links_walk_back_to_the_start(self):
+        expected = list(Appointment.objects.order_by('-date', '-time', '-id').values_list('id', flat=True))
+        _, last = self.walk('/api/v1/appointments/?page_size=4')
+        ids, _ = self.walk(last.data['previous'], link='previous')
+        tail = [row['id'] for row in last.data['results']]
+        self.assertEqual(list(reversed(ids)) + tail, expected)
+
+    def test_deep_page_is_bounded_by_the_leading_column(self):
+        paginator = KeysetPagination()
+        condition = paginator.get_keyset_filter(['-date', '-time', '-id'], [date(2025, 1, 2), time(10), 5])
+        self.assertEqual(condition.children[0], ('date__lte', date(2025, 1, 2)))
+        self.assertEqual(condition.connector, 'AND')
+
+    def test_lists_are_unpaginated_without_page_size(self):
+        response = self.client.get('/api/v1/appointments/')
+        self.assertIsInstance(response.data, list)
+        self.assertEqual(len(response.data), Appointment.objects.count())
+
+    def test_nullable_ordering_is_rejected(self):
+        request = Request(APIRequestFactory().get('/api/v1/admissions/?page_size=2'))
+        with self.assertRaises(ImproperlyConfigured):
+            KeysetPagination().paginate_queryset(Admission.objects.order_by('discharged_at'), request)
+
+    def test_decimal_ordering(self):
+        patient = Patient.objects.get()
+        invoice = Invoice.objects.create(patient=patient, total_amount=Decimal('1000.00'))
+        for amount in ('10.10', '10.10', '9.99', '25.00', '10.10'):
+            Payment.objects.create(invoice=invoice, amount=Decimal(amount), method='cash')
+        expected = list(Payment.objects.order_by('amount', 'id').values_list('id', flat=True))
+
+        factory, ids, url = APIRequestFactory(), [], '/api/v1/payments/?page_size=2'
+        while url:
+            paginator = KeysetPagination()
+            request = Request(factory.get(url))
+            ids.extend(row.id for row in paginator.paginate_queryset(Payment.objects.order_by('amount'), request))
+            url = paginator.get_next_link()
+        self.assertEqual(ids, expected)
+
+
+# ==========================
+# Lean lists and sparse fields
+# ==========================
+class LeanAndSparseFieldsTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name='Medicine', description='-')
+        cls.doctor = make_doctor(cls.department, 0)
+        cls.patient = make_patient(0)
+        for day in range(3):
+            Appointment.objects.create(patient=cls.patient, doctor=cls.doctor, date=date(2025, 1, 1 + day), time=time(9))
+
+    def setUp(self):
+        response_cache.backend.clear()
+
+    def test_lean_rows_are_flat(self):
+        # The ETag's fingerprint, then the rows
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/v1/appointments/?view=lean')
+        self.assertEqual(len(response.data), 3)
+        row = response.data[0]
+        self.assertEqual(set(row), set(AppointmentViewSet.lean_fields))
+        self.assertEqual(row['patient'], self.patient.id)
+        self.assertEqual(row['patient_name'], 'Patient0 Test')
+        self.assertEqual(row['department_name'], 'Medicine')
+        self.assertEqual(row['date'], date(2025, 1, 3))
+
+    def test_lean_rows_paginate(self):
+        response = self.client.get('/api/v1/appointments/?view=lean&page_size=2')
+        self.assertEqual([row['date'] for row in response.data['results']], [date(2025, 1, 3), date(2025, 1, 2)])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([row['date'] for row in response.data['results']], [date(2025, 1, 1)])
+        self.assertIsNone(response.data['next'])
+
+    def test_fields_limit_the_columns_and_joins(self):
+        with self.assertNumQueries(2) as captured:
+            response = self.client.get('/api/v1/appointments/?fields=id,status')
+        self.assertEqual(set(response.data[0]), {'id', 'status'})
+        sql = captured.captured_queries[-1]['sql']
+        self.assertNotIn('hospital_patient', sql)
+        self.assertNotIn('"notes"', sql)
+
+    def test_unknown_fields_are_ignored(self):
+        response = self.client.get('/api/v1/appointments/?fields=id,no_such_field')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data[0]), {'id'})
+
+    def test_expand_adds_nested_fields(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/v1/appointments/?fields=id&expand=doctor_detail')
+        row = response.data[0]
+        self.assertEqual(set(row), {'id', 'doctor_detail'})
+        # Nested serializers keep all their fields
+        self.assertEqual(row['doctor_detail']['department_name'], 'Medicine')
+        # Without ?fields= the full representation comes back, expanded or not
+        full = self.client.get('/api/v1/appointments/?expand=doctor_detail').data[0]
+        self.assertIn('patient_detail', full)
+        self.assertIn('notes', full)
+
+    def test_variants_have_their_own_etags_and_cache_entries(self):
+        urls = ['/api/v1/appointments/', '/api/v1/appointments/?view=lean', '/api/v1/appointments/?fields=id']
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        self.assertEqual(len(set(etags)), 3)
+        for url, etag in zip(urls, etags):
+            self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+
+        sparse = self.client.get('/api/v1/departments/?fields=id,name')
+        self.assertEqual(set(sparse.data[0]), {'id', 'name'})
+        full = self.client.get('/api/v1/departments/')
+        self.assertEqual(full['X-Cache'], 'MISS')
+        self.assertEqual(full.data[0]['doctor_count'], 1)
+        self.assertEqual(self.client.get('/api/v1/departments/?fields=id,name')['X-Cache'], 'HIT')
+
+
+# ==========================
+# Availability
+# ==========================
+class AvailabilityTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name='Medicine', description='-')
+        cls.doctor = make_doctor(department, 0)
+        cls.day = date.today() + timedelta(days=7)
+        Schedule.objects.create(
+            doctor=cls.doctor, weekday=availability.WEEKDAYS[cls.day.weekday()], start_time=time(9), end_time=time(10),
+        )
+        Appointment.objects.create(patient=make_patient(0), doctor=cls.doctor, date=cls.day, time=time(9))
+
+    def slots(self, slot):
+        days = availability.find_availability([self.doctor.id], self.day, self.day, slot)[self.doctor.id]
+        return days[0]['slots']
+
+    @override_settings(APPOINTMENT_MINUTES=15)
+    def test_booking_length_does_not_depend_on_the_slot_size(self):
+        self.assertEqual(self.slots(5)[:2], ['09:15', '09:20'])
+        self.assertEqual(self.slots(15), ['09:15', '09:30', '09:45'])
+        self.assertEqual(self.slots(30), ['09:30'])
+
+
+# ==========================
+# Appointment slot conflicts
+# ==========================
+class SlotConflictTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name='Medicine', description='-')
+        cls.doctor = make_doctor(department, 0)
+        cls.patient = make_patient(0)
+
+    def serializer(self):
+        serializer = AppointmentSerializer(data={
+            'patient': self.patient.id, 'doctor': self.doctor.id, 'date': '2025-01-01', 'time': '09:00',
+        })
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        return serializer
+
+    def test_booking_lost_to_a_concurrent_one_is_a_validation_error(self):
+        serializer = self.serializer()
+        # Booked by someone else after validation
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=date(2025, 1, 1), time=time(9))
+        with self.assertRaises(serializers.ValidationError):
+            serializer.save()
+
+    def test_other_integrity_errors_are_not_reported_as_conflicts(self):
+        serializer = self.serializer()
+        with mock.patch.object(serializers.ModelSerializer, 'create', side_effect=IntegrityError('other')):
+            with self.assertRaises(IntegrityError):
+                serializer.save()
+
+
+# ==========================
+# Exports
+# ==========================
+class ExportTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        invoice = Invoice.objects.create(patient=make_patient(0), total_amount=Decimal('100.00'))
+        cls.payment = Payment.objects.create(invoice=invoice, amount=Decimal('10.50'), method='cash')
+
+    def test_rows_are_formatted_like_the_api(self):
+        api = self.client.get(f'/api/v1/payments/{self.payment.id}/').json()
+
+        csv_lines = b''.join(self.client.get('/api/v1/payments/export/?output=csv').streaming_content).decode().splitlines()
+        row = dict(zip(csv_lines[0].split(','), csv_lines[1].split(',')))
+        self.assertEqual(row['paid_at'], api['paid_at'])
+        self.assertEqual(Decimal(row['amount']), Decimal('10.50'))
+
+        ndjson = json.loads(b''.join(self.client.get('/api/v1/payments/export/?output=ndjson').streaming_content))
+        self.assertEqual(ndjson['paid_at'], api['paid_at'])
+        self.assertEqual(ndjson['amount'], api['amount'])
+        self.assertIsInstance(ndjson['amount'], float)
+
+
+# ==========================
+# Bulk writes
+# ==========================
+class BulkWriteTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name='Medicine', description='-')
+        cls.doctor = make_doctor(department, 0)
+        cls.patient, cls.other = make_patient(0), make_patient(1)
+
+    def item(self, day, hour=9, **fields):
+        return {'patient': self.patient.id, 'doctor': self.doctor.id, 'date': f'2025-01-{day:02}', 'time': f'{hour:02}:00', **fields}
+
+    def test_bulk_create(self):
+        response = self.client.post('/api/v1/appointments/bulk/', [self.item(1), self.item(2)], format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), 2)
+        self.assertEqual(Appointment.objects.count(), 2)
+
+    def test_bulk_create_under_a_parent_uses_the_url(self):
+        url = f'/api/v1/patients/{self.patient.id}/appointments/bulk/'
+        response = self.client.post(url, [self.item(1, patient=self.other.id)], format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Appointment.objects.get().patient_id, self.patient.id)
+
+        url = f'/api/v1/patients/{self.patient.id}/appointments/'
+        response = self.client.post(url, self.item(2, patient=self.other.id), format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(Appointment.objects.filter(patient=self.other).exists())
+
+    def test_bulk_update(self):
+        first, second = (
+            Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=date(2025, 1, day), time=time(9))
+            for day in (1, 2)
+        )
+        response = self.client.patch('/api/v1/appointments/bulk/', [
+            {'id': first.id, 'status': 'confirmed'}, {'id': second.id, 'time': '10:00'},
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.status, second.time), ('confirmed', time(10)))
+
+    def test_bulk_update_rejects_repeated_ids(self):
+        appointment = Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=date(2025, 1, 1), time=time(9))
+        response = self.client.patch('/api/v1/appointments/bulk/', [
+            {'id': appointment.id, 'status': 'confirmed'}, {'id': appointment.id, 'status': 'cancelled'},
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.status, 'pending')
+
+    def test_bulk_update_is_scoped_to_the_parent(self):
+        appointment = Appointment.objects.create(patient=self.other, doctor=self.doctor, date=date(2025, 1, 1), time=time(9))
+        url = f'/api/v1/patients/{self.patient.id}/appointments/bulk/'
+        response = self.client.patch(url, [{'id': appointment.id, 'status': 'confirmed'}], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0]['id'], ['Not found.'])
+
+    def test_an_invalid_item_saves_nothing(self):
+        response = self.client.post('/api/v1/appointments/bulk/', [self.item(1), self.item(2, doctor=0)], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('doctor', response.data[1])
+        self.assertFalse(Appointment.objects.exists())
+
+    def test_slot_conflicts_are_400s(self):
+        Appointment.objects.create(patient=self.other, doctor=self.doctor, date=date(2025, 1, 1), time=time(9))
+        response = self.client.post('/api/v1/appointments/bulk/', [self.item(2), self.item(2), self.item(1)], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('time', response.data[1])
+        self.assertIn('time', response.data[2])
+        self.assertEqual(Appointment.objects.count(), 1)
+
+    def test_integrity_error_rolls_back_the_batch(self):
+        def create_then_fail(serializer, validated_data):
+            Appointment.objects.create(**validated_data[0])
+            raise IntegrityError('conflict')
+
+        with mock.patch.object(AppointmentSerializer.Meta.list_serializer_class, 'create', create_then_fail):
+            response = self.client.post('/api/v1/appointments/bulk/', [self.item(1), self.item(2)], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Appointment.objects.exists())
+
+
+# ==========================
+# Bed occupancy
+# ==========================
+class OccupancyTests(APITestCase):
+    def setUp(self):
+        self.general = Ward.objects.create(name='General', type='general')
+        self.icu = Ward.objects.create(name='ICU', type='icu')
+        self.room = Room.objects.create(ward=self.general, room_no='1', bed_count=2)
+        self.other_room = Room.objects.create(ward=self.icu, room_no='2', bed_count=3)
+        self.patient = make_patient(0)
+
+    def assertCounters(self, rooms, wards):
+        """{room: occupied} and {ward: (beds, occupied)}, which reconcile() must agree with."""
+        for room, occupied in rooms.items():
+            self.assertEqual(Room.objects.get(pk=room.pk).occupied_beds, occupied, room)
+        for ward, counters in wards.items():
+            self.assertEqual(Ward.objects.values_list('bed_count', 'occupied_beds').get(pk=ward.pk), counters, ward)
+        self.assertEqual(occupancy.reconcile(), (0, 0))
+
+    def test_admit_move_and_discharge(self):
+        self.assertCounters({self.room: 0}, {self.general: (2, 0), self.icu: (3, 0)})
+        admission = Admission.objects.create(patient=self.patient, room=self.room)
+        self.assertCounters({self.room: 1}, {self.general: (2, 1), self.icu: (3, 0)})
+
+        admission.room = self.other_room
+        admission.save()
+        self.assertCounters({self.room: 0, self.other_room: 1}, {self.general: (2, 0), self.icu: (3, 1)})
+
+        admission.status = 'discharged'
+        admission.save()
+        self.assertCounters({self.other_room: 0}, {self.icu: (3, 0)})
+
+        # Saving a discharged admission again changes nothing
+        admission.save()
+        self.assertCounters({self.other_room: 0}, {self.icu: (3, 0)})
+
+    def test_deletes_release_beds(self):
+        admission = Admission.objects.create(patient=self.patient, room=self.room)
+        admission.delete()
+        self.assertCounters({self.room: 0}, {self.general: (2, 0)})
+
+        Admission.objects.create(patient=self.patient, room=self.room)
+        self.patient.delete()
+        self.assertCounters({self.room: 0}, {self.general: (2, 0)})
+
+        Admission.objects.create(patient=make_patient(1), room=self.room)
+        self.room.delete()
+        self.assertCounters({}, {self.general: (0, 0), self.icu: (3, 0)})
+
+    def test_rooms_move_and_resize(self):
+        Admission.objects.create(patient=self.patient, room=self.room)
+        self.room.bed_count = 4
+        self.room.save()
+        self.assertCounters({self.room: 1}, {self.general: (4, 1)})
+
+        self.room.ward = self.icu
+        self.room.save()
+        self.assertCounters({self.room: 1}, {self.general: (0, 0), self.icu: (7, 1)})
+
+    def test_stale_instances_keep_the_counters(self):
+        stale_room, stale_ward = Room.objects.get(pk=self.room.pk), Ward.objects.get(pk=self.general.pk)
+        Admission.objects.create(patient=self.patient, room=self.room)
+        stale_room.room_no = '1A'
+        stale_room.save()
+        stale_ward.name = 'General A'
+        stale_ward.save()
+        self.assertCounters({self.room: 1}, {self.general: (2, 1)})
+
+    def test_counters_never_go_negative(self):
+        occupancy.vacate(self.room.pk, 5)
+        self.assertEqual(Room.objects.get(pk=self.room.pk).occupied_beds, 0)
+        self.assertEqual(Ward.objects.get(pk=self.general.pk).occupied_beds, 0)
+
+    def test_reconcile_fixes_drift(self):
+        Admission.objects.create(patient=self.patient, room=self.room)
+        Room.objects.filter(pk=self.room.pk).update(occupied_beds=2)
+        Ward.objects.filter(pk=self.icu.pk).update(bed_count=9)
+        self.assertEqual(occupancy.reconcile(), (1, 1))
+        self.assertCounters({self.room: 1}, {self.general: (2, 1), self.icu: (3, 0)})
+
+
+# ==========================
+# Response cache
+# ==========================
+class ResponseCacheTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name='Medicine', description='-')
+        cls.doctor = make_doctor(cls.department, 0)
+        cls.ward = Ward.objects.create(name='General', type='general')
+        cls.test = LabTest.objects.create(test_name='Blood count', description='-', price=100)
+
+    def setUp(self):
+        response_cache.backend.clear()
+
+    def cached(self, url):
+        """GET twice; the second must come from the cache."""
+        self.client.get(url)
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        return response
+
+    def test_department_list_queries(self):
+        # Departments and their doctors, nothing else
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get('/api/v1/departments/')['X-Cache'], 'MISS')
+
+    def test_writes_bust_the_cached_responses(self):
+        for url, write in [
+            ('/api/v1/departments/', lambda: make_doctor(self.department, 1)),
+            ('/api/v1/departments/', lambda: Doctor.objects.filter(name='Doctor 1').get().delete()),
+            ('/api/v1/doctors/', lambda: Department.objects.filter(pk=self.department.pk).get().save()),
+            (f'/api/v1/doctors/{self.doctor.pk}/', lambda: Doctor.objects.get(pk=self.doctor.pk).save()),
+            ('/api/v1/wards/', lambda: Ward.objects.create(name='ICU', type='icu')),
+            (f'/api/v1/wards/{self.ward.pk}/', lambda: Room.objects.create(ward=self.ward, room_no='1', bed_count=2)),
+            ('/api/v1/labtests/', lambda: LabTest.objects.filter(pk=self.test.pk).get().save()),
+            ('/api/v1/labtests/', lambda: LabTest.objects.filter(pk=self.test.pk).get().delete()),
+        ]:
+            with self.subTest(url=url):
+                before = self.cached(url)
+                with self.captureOnCommitCallbacks(execute=True):
+                    write()
+                after = self.client.get(url)
+                self.assertEqual(after['X-Cache'], 'MISS')
+                self.assertNotEqual(before['ETag'], after['ETag'])
+
+    def test_other_writes_keep_the_entries(self):
+        self.cached('/api/v1/labtests/')
+        with self.captureOnCommitCallbacks(execute=True):
+            make_patient(0)
+        self.assertEqual(self.client.get('/api/v1/labtests/')['X-Cache'], 'HIT')
+
+
+# ==========================
+# Conditional GET
+# ==========================
+class ConditionalGetTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name='Medicine', description='-')
+        cls.doctor = make_doctor(cls.department, 0)
+        cls.patient = make_patient(0)
+        Appointment.objects.create(patient=cls.patient, doctor=cls.doctor, date=date(2025, 1, 1), time=time(9))
+
+    def setUp(self):
+        # Versions and entries outlive the rolled back rows of other tests
+        response_cache.backend.clear()
+
+    def revalidate(self, url):
+        etag = self.client.get(url)['ETag']
+        return lambda: self.client.get(url, headers={'If-None-Match': etag}).status_code
+
+    def test_unchanged_list_is_not_modified(self):
+        status = self.revalidate('/api/v1/appointments/')
+        self.assertEqual(status(), 304)
+
+    def test_nested_rows_change_the_etag(self):
+        status = self.revalidate('/api/v1/appointments/')
+        self.patient.last_name = 'Renamed'
+        self.patient.save()
+        self.assertEqual(status(), 200)
+
+        status = self.revalidate('/api/v1/appointments/')
+        self.department.name = 'Cardiology'
+        self.department.save()
+        self.assertEqual(status(), 200)
+
+    def test_deleted_row_changes_the_etag(self):
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=date(2025, 1, 2), time=time(9))
+        status = self.revalidate('/api/v1/appointments/')
+        Appointment.objects.latest('id').delete()
+        self.assertEqual(status(), 200)
+
+    def test_pages_fingerprint_their_own_rows(self):
+        for day in (2, 3, 4):
+            Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=date(2025, 1, day), time=time(9))
+        url = '/api/v1/appointments/?page_size=2'
+        status = self.revalidate(url)
+        # Past the page and the row read ahead for the next link
+        Appointment.objects.get(date=date(2025, 1, 1)).save()
+        self.assertEqual(status(), 304)
+        # An older row moves onto the page
+        Appointment.objects.get(date=date(2025, 1, 4)).delete()
+        self.assertEqual(status(), 200)
+
+    def test_fingerprint_is_one_aggregate_query(self):
+        etag = self.client.get('/api/v1/appointments/')['ETag']
+        with self.assertNumQueries(1) as captured:
+            self.client.get('/api/v1/appointments/', headers={'If-None-Match': etag})
+        self.assertIn('MAX(', captured.captured_queries[0]['sql'].upper())
+
+    def test_cached_viewsets_revalidate_without_queries(self):
+        for url in ('/api/v1/departments/', '/api/v1/doctors/', '/api/v1/wards/', '/api/v1/labtests/'):
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                with self.assertNumQueries(0):
+                    self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+                with self.assertNumQueries(0):
+                    self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+    def test_cached_viewsets_see_related_changes(self):
+        status = self.revalidate('/api/v1/departments/')
+        with self.captureOnCommitCallbacks(execute=True):
+            make_doctor(self.department, 1)
+        self.assertEqual(status(), 200)
+
+
+# ==========================
+# Query budgets
+# ==========================
+class QueryBudgetTests(QueryBudgetTestMixin, APITestCase):
+    """Every route in QUERY_BUDGETS, with two of everything so N+1 lookups show."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for n in range(2):
+            department = Department.objects.create(name=f'Department {n}', description='-')
+            ward = Ward.objects.create(name=f'Ward {n}', type='general')
+            room = Room.objects.create(ward=ward, room_no=str(n), bed_count=4)
+            test = LabTest.objects.create(test_name=f'Test {n}', description='-', price=100)
+            Nurse.objects.create(name=f'Nurse {n}', phone='0100', department=department, assign_room=room)
+            for m in range(2):
+                doctor = make_doctor(department, f'{n}{m}')
+                patient = make_patient(f'{n}{m}')
+                Schedule.objects.create(doctor=doctor, weekday='mon', start_time=time(9), end_time=time(17))
+                appointment = Appointment.objects.create(patient=patient, doctor=doctor, date=date(2025, 1, 1), time=time(9))
+                admission = Admission.objects.create(patient=patient, room=room)
+                treatment = Treatment.objects.create(
+                    admission=admission, doctor=doctor, description='-', treatment_date=date(2025, 1, 1),
+                )
+                Medication.objects.create(treatment=treatment, medicine_name='-', dosage='-', frequency='-')
+                LabReport.objects.create(patient=patient, doctor=doctor, test=test, report_file='reports/x.pdf')
+                Prescription.objects.create(appointment=appointment, doctor=doctor, patient=patient, notes='-')
+                invoice = Invoice.objects.create(
+                    patient=patient, admission=admission, department=department, total_amount=Decimal('100.00'),
+                )
+                for amount in ('10.00', '20.00'):
+                    Payment.objects.create(invoice=invoice, amount=Decimal(amount), method='cash')
+        cls.user = get_user_model().objects.create_user(email='staff@example.com', password='x', is_active=True)
+
+    def setUp(self):
+        caches['responses'].clear()
+        caches['users'].clear()
+
+    def route_kwargs(self):
+        appointment, patient = Appointment.objects.first(), Patient.objects.first()
+        return {
+            'department-doctors-list': {'department_pk': Department.objects.first().pk},
+            'patient-appointments-list': {'patient_pk': patient.pk},
+            'doctor-appointments-list': {'doctor_pk': Doctor.objects.first().pk},
+            'appointment-detail': {'pk': appointment.pk},
+            'patient-invoices-list': {'patient_pk': patient.pk},
+            'invoice-payments-list': {'invoice_pk': Invoice.objects.first().pk},
+            'async-appointment-detail': {'pk': appointment.pk},
+        }
+
+    def test_routes_stay_within_their_budgets(self):
+        kwargs = self.route_kwargs()
+        # A JWT user on a user cache miss, the most a request pays for authentication
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {AccessToken.for_user(self.user)}')
+        for route in settings.QUERY_BUDGETS:
+            with self.subTest(route=route):
+                caches['users'].clear()
+                response = self.client.get(reverse(route, kwargs=kwargs.get(route)))
+                self.assertEqual(response.status_code, 200)
+                self.assertGreater(len(response.data['results']) if 'results' in response.data else 1, 0)
+                self.assertWithinQueryBudget(response)
+
+
+class MetricsTests(APITestCase):
+    def test_metrics_need_staff_or_the_token(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 401)
+        with override_settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get('/metrics/', headers={'Authorization': 'Bearer wrong'}).status_code, 401)
+            self.assertEqual(self.client.get('/metrics/', headers={'Authorization': 'Bearer secret'}).status_code, 200)
+        staff = get_user_model().objects.create_user(email='admin@example.com', password='x', is_active=True, is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get('/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'http_serialize_seconds_total', response.content)
+
+
+# ==========================
+# Dataset and benchmarks
+# ==========================
+class DatasetTests(APITestCase):
+    def generate(self, **options):
+        call_command('generate_dataset', batch_size=7, stdout=io.StringIO(), **options)
+
+    def test_tiny_dataset(self):
+        self.generate(patients=40, doctors=3, rooms=5, appointments=60, admissions=20)
+        counts = {
+            Patient: 40, Doctor: 3, Room: 5, Ward: 12, Department: 10, Schedule: 15, Nurse: 6, LabTest: 12,
+            Appointment: 60, Admission: 20, Invoice: 20, LabReport: 20,
+        }
+        for model, count in counts.items():
+            self.assertEqual(model.objects.count(), count, model.__name__)
+        self.assertEqual(Prescription.objects.count(), Prescription.objects.filter(appointment__isnull=False).count())
+        self.assertEqual(
+            set(Payment.objects.values_list('invoice', flat=True)) - set(Invoice.objects.values_list('id', flat=True)),
+            set(),
+        )
+
+        # Counters and rollups the raw inserts skipped were filled in
+        revenue = list(DailyRevenue.objects.order_by('date', 'department', 'method').values_list(
+            'date', 'department', 'method', 'amount', 'payments',
+        ))
+        self.assertEqual(occupancy.reconcile(), (0, 0))
+        self.assertEqual(billing.rebuild()[0], 0)
+        self.assertEqual(list(DailyRevenue.objects.order_by('date', 'department', 'method').values_list(
+            'date', 'department', 'method', 'amount', 'payments',
+        )), revenue)
+        self.assertEqual(
+            Room.objects.aggregate(n=Sum('occupied_beds'))['n'],
+            Admission.objects.filter(status='admitted').count(),
+        )
+
+    def test_sequences_continue_after_the_dataset(self):
+        self.generate(patients=10, doctors=2, rooms=2, appointments=10, admissions=5)
+        # Loading again appends after the existing ids
+        self.generate(patients=10, doctors=2, rooms=2, appointments=10, admissions=5, seed=7)
+        self.assertEqual(Patient.objects.count(), 20)
+        self.assertEqual(Appointment.objects.count(), 20)
+        for model, create in [
+            (Patient, lambda: make_patient('new')),
+            (Department, lambda: Department.objects.create(name='New', description='-')),
+            (Ward, lambda: Ward.objects.create(name='New', type='icu')),
+            (Invoice, lambda: Invoice.objects.create(patient=Patient.objects.first(), total_amount=Decimal('1.00'))),
+        ]:
+            with self.subTest(model=model.__name__):
+                latest = model.objects.aggregate(m=Max('id'))['m']
+                self.assertGreater(create().pk, latest)
+
+    def test_benchmark_api_runs_every_route(self):
+        self.generate(patients=10, doctors=2, rooms=2, appointments=10, admissions=5)
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = f'{directory}/baseline.json'
+            out = io.StringIO()
+            call_command('benchmark_api', requests=2, warmup=0, host='testserver', save_baseline=baseline, stdout=out)
+            with open(baseline) as saved:
+                routes = json.load(saved)['routes']
+            self.assertIn('appointment-list', routes)
+            self.assertIn('patient-appointments-list', routes)
+            self.assertEqual({name: result['errors'] for name, result in routes.items() if result['errors']}, {})
+
+            out = io.StringIO()
+            call_command(
+                'benchmark_api', requests=2, warmup=0, host='testserver', routes='^appointment-list$',
+                compare=baseline, tolerance=1000, stdout=out,
+            )
+            self.assertIn('No regressions', out.getvalue())
+
+    def test_percentiles(self):
+        latencies = [0.001 * n for n in range(1, 101)]
+        self.assertEqual(percentile(latencies, 50), 0.05)
+        self.assertEqual(percentile(latencies, 99), 0.099)
+        self.assertEqual(percentile([], 95), 0.0)
+        self.assertEqual(summarize(latencies)['p95_ms'], 95.0)
+
+
+# ==========================
+# Patient search
+# ==========================
+class PatientSearchTests(APITestCase):
+    def test_params(self):
+        self.assertEqual(search.parse_params({'q': '  amina   rah '}), ('amina rah', search.DEFAULT_LIMIT))
+        self.assertEqual(search.parse_params({'q': 'ami', 'limit': '5'}), ('ami', 5))
+        for params in [{'q': 'am'}, {'q': ' a  '}, {'q': 'amina', 'limit': '0'}, {'q': 'amina', 'limit': '101'},
+                       {'q': 'amina', 'limit': 'ten'}]:
+            with self.subTest(params=params), self.assertRaises(ValidationError):
+                search.parse_params(params)
+
+    def test_phone_digits_are_compared_to_the_phone_digits(self):
+        sql, params = search.filter_patients(Patient.objects.all(), '(017) 11-000').query.sql_with_params()
+        self.assertIn("REGEXP_REPLACE", sql)
+        self.assertIn('%01711000%', params)
+        self.assertEqual(self.client.get('/api/v1/patients/', {'q': '0-1'}).status_code, 400)
+
+    def test_matches_are_a_conditional_list(self):
+        for n in range(3):
+            make_patient(n)
+        # SQLite has no trigram or full-text search, rank by name instead
+        with mock.patch.object(search, 'filter_patients', lambda queryset, q: queryset.filter(first_name__icontains=q)), \
+                mock.patch.object(search, 'rank_patients', lambda queryset, q: queryset.order_by('-first_name')):
+            response = self.client.get('/api/v1/patients/', {'q': 'patient', 'limit': 2})
+            self.assertEqual([patient['first_name'] for patient in response.data['results']], ['Patient2', 'Patient1'])
+            self.assertIsNone(response.data['next'])
+            again = self.client.get('/api/v1/patients/', {'q': 'patient', 'limit': 2}, headers={'If-None-Match': response['ETag']})
+            self.assertEqual(again.status_code, 304)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'trigram and full-text search need PostgreSQL')
+class PatientSearchRankingTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        names = [('Amina', 'Rahman'), ('Aminul', 'Islam'), ('Karim', 'Aminov'), ('Rahim', 'Uddin')]
+        cls.patients = {}
+        for n, (first_name, last_name) in enumerate(names):
+            patient = make_patient(n)
+            patient.first_name, patient.last_name, patient.phone = first_name, last_name, f'+880 1711-00000{n}'
+            patient.save()
+            cls.patients[first_name] = patient
+
+    def search(self, **params):
+        response = self.client.get('/api/v1/patients/', params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def names(self, response):
+        return [patient['first_name'] for patient in response.data['results']]
+
+    def test_best_matches_first(self):
+        self.assertEqual(self.names(self.search(q='amina rah')), ['Amina'])
+        self.assertEqual(self.names(self.search(q='amina'))[0], 'Amina')
+        self.assertIn('Karim', self.names(self.search(q='amin')))
+
+    def test_limit(self):
+        self.assertEqual(len(self.search(q='amin', limit=1).data['results']), 1)
+        self.assertEqual(len(self.search(q='amin').data['results']), 3)
+
+    def test_formatted_phone_numbers_match(self):
+        self.assertEqual(self.names(self.search(q='01711 000003')), ['Rahim'])
+        self.assertEqual(len(self.search(q='1711-0000').data['results']), 4)
+
+    def test_results_are_conditional(self):
+        response = self.search(q='amin')
+        self.assertIn('ETag', response)
+        again = self.client.get('/api/v1/patients/', {'q': 'amin'}, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(again.status_code, 304)
+        self.patients['Aminul'].save()
+        changed = self.client.get('/api/v1/patients/', {'q': 'amin'}, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(changed.status_code, 200)
+
+
+# ==========================
+# Billing summaries
+# ==========================
+class BillingTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.surgery = Department.objects.create(name='Surgery', description='-')
+        cls.medicine = Department.objects.create(name='Medicine', description='-')
+        cls.invoice = Invoice.objects.create(
+            patient=make_patient(0), department=cls.surgery, total_amount=Decimal('100.00'),
+        )
+
+    def pay(self, amount, method='cash', invoice=None):
+        return Payment.objects.create(invoice=invoice or self.invoice, amount=amount, method=method)
+
+    def assertInvoice(self, amount_paid, balance, status):
+        self.invoice.refresh_from_db()
+        self.assertEqual(
+            (self.invoice.amount_paid, self.invoice.balance, self.invoice.status),
+            (Decimal(amount_paid), Decimal(balance), status),
+        )
+
+    def revenue(self):
+        return {
+            (department, method): (amount, payments)
+            for department, method, amount, payments in DailyRevenue.objects.values_list(
+                'department', 'method', 'amount', 'payments',
+            )
+        }
+
+    def assertRebuildMatches(self):
+        invoices = list(Invoice.objects.order_by('id').values_list('amount_paid', 'balance', 'status'))
+        revenue = self.revenue()
+        self.assertEqual(billing.rebuild(), (0, len(revenue)))
+        self.assertEqual(list(Invoice.objects.order_by('id').values_list('amount_paid', 'balance', 'status')), invoices)
+        self.assertEqual(self.revenue(), revenue)
+
+    def test_payments_update_totals_and_revenue(self):
+        cash = self.pay(30.1)
+        self.assertInvoice('30.10', '69.90', 'unpaid')
+        self.assertEqual(self.revenue(), {(self.surgery.id, 'cash'): (Decimal('30.10'), 1)})
+
+        card = self.pay(Decimal('69.90'), 'card')
+        self.assertInvoice('100.00', '0.00', 'paid')
+
+        card.amount, card.method = Decimal('80.00'), 'online'
+        card.save()
+        self.assertInvoice('110.10', '-10.10', 'paid')
+        self.assertEqual(self.revenue(), {
+            (self.surgery.id, 'cash'): (Decimal('30.10'), 1),
+            (self.surgery.id, 'online'): (Decimal('80.00'), 1),
+        })
+        self.assertRebuildMatches()
+
+        cash.delete()
+        self.assertInvoice('80.00', '20.00', 'unpaid')
+        self.assertEqual(self.revenue(), {(self.surgery.id, 'online'): (Decimal('80.00'), 1)})
+        self.assertRebuildMatches()
+
+    def test_invoice_total_changes_keep_the_paid_amount(self):
+        self.pay(Decimal('50.00'))
+        stale = Invoice.objects.get(pk=self.invoice.pk)
+        self.pay(Decimal('50.00'))
+        stale.total_amount = Decimal('90.00')
+        stale.save()
+        self.assertInvoice('100.00', '-10.00', 'paid')
+
+    def test_moving_an_invoice_moves_its_revenue(self):
+        self.pay(Decimal('30.00'))
+        self.pay(Decimal('20.00'))
+        other = Invoice.objects.create(patient=self.invoice.patient, department=self.surgery, total_amount=10)
+        self.pay(Decimal('10.00'), invoice=other)
+
+        self.invoice.department = self.medicine
+        self.invoice.save()
+        self.assertEqual(self.revenue(), {
+            (self.surgery.id, 'cash'): (Decimal('10.00'), 1),
+            (self.medicine.id, 'cash'): (Decimal('50.00'), 2),
+        })
+        self.assertRebuildMatches()
+
+    def test_deletes_release_revenue(self):
+        self.pay(Decimal('30.00'))
+        other = Invoice.objects.create(patient=self.invoice.patient, department=self.medicine, total_amount=10)
+        self.pay(Decimal('10.00'), invoice=other)
+
+        self.surgery.delete()
+        self.assertEqual(self.revenue(), {
+            (None, 'cash'): (Decimal('30.00'), 1),
+            (self.medicine.id, 'cash'): (Decimal('10.00'), 1),
+        })
+        self.assertRebuildMatches()
+
+        # Deleting the invoice deletes its payments through the cascade
+        other.delete()
+        self.assertEqual(self.revenue(), {(None, 'cash'): (Decimal('30.00'), 1)})
+        self.assertRebuildMatches()
+
+    def test_revenue_row_created_concurrently(self):
+        # Another transaction inserts the row between our UPDATE and INSERT
+        DailyRevenue.objects.create(
+            date=timezone.localdate(), department=self.surgery, method='cash', amount=Decimal('5.00'), payments=1,
+        )
+        update, missed = QuerySet.update, []
+
+        def update_before_the_row_is_visible(queryset, **changes):
+            if queryset.model is DailyRevenue and not missed:
+                missed.append(changes)
+                return 0
+            return update(queryset, **changes)
+
+        with mock.patch.object(QuerySet, 'update', update_before_the_row_is_visible), \
+                mock.patch.object(DailyRevenue.objects, 'create', side_effect=IntegrityError('daily_revenue_key')):
+            self.pay(Decimal('30.00'))
+        self.assertEqual(len(missed), 1)
+        self.assertEqual(self.revenue(), {(self.surgery.id, 'cash'): (Decimal('35.00'), 2)})
+        self.assertInvoice('30.00', '70.00', 'unpaid')
+
+    def test_rebuild_repairs_drift(self):
+        self.pay(Decimal('30.00'))
+        self.pay(Decimal('70.00'), 'card')
+        Invoice.objects.update(amount_paid=0, balance=100, status='unpaid')
+        DailyRevenue.objects.update(amount=1, payments=7)
+        self.assertEqual(billing.rebuild(), (1, 2))
+        self.assertInvoice('100.00', '0.00', 'paid')
+        self.assertEqual(self.revenue(), {
+            (self.surgery.id, 'cash'): (Decimal('30.00'), 1),
+            (self.surgery.id, 'card'): (Decimal('70.00'), 1),
+        })
+
+
+# ==========================
+# Financial reports
+# ==========================
+def at(day, hour=12):
+    return timezone.make_aware(datetime.combine(day, time(hour)))
+
+
+class ReportTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name='Surgery', description='-')
+        cls.patient = make_patient(0)
+        invoice = Invoice.objects.create(patient=cls.patient, department=cls.department, total_amount=1000)
+        payments = [
+            (date(2025, 1, 31), 'cash', '10.00'),
+            (date(2025, 2, 1), 'cash', '20.00'),
+            (date(2025, 2, 1), 'card', '5.00'),
+            (date(2025, 12, 31), 'online', '40.00'),
+            (date(2026, 1, 1), 'cash', '100.00'),
+        ]
+        for day, method, amount in payments:
+            payment = Payment.objects.create(invoice=invoice, amount=Decimal(amount), method=method)
+            Payment.objects.filter(pk=payment.pk).update(paid_at=at(day))
+        # The rollup takes its dates from paid_at
+        billing.rebuild()
+
+    def periods(self, start, end, period, **filters):
+        return [
+            (row['period'], row['total'], row['count'], row['running_total'])
+            for row in reports.revenue_by_period(start, end, period, **filters)
+        ]
+
+    def test_revenue_by_period(self):
+        self.assertEqual(self.periods(date(2025, 1, 1), date(2026, 12, 31), 'month'), [
+            (date(2025, 1, 1), Decimal('10.00'), 1, Decimal('10.00')),
+            (date(2025, 2, 1), Decimal('25.00'), 2, Decimal('35.00')),
+            (date(2025, 12, 1), Decimal('40.00'), 1, Decimal('75.00')),
+            (date(2026, 1, 1), Decimal('100.00'), 1, Decimal('175.00')),
+        ])
+        self.assertEqual(self.periods(date(2025, 1, 1), date(2026, 12, 31), 'year'), [
+            (date(2025, 1, 1), Decimal('75.00'), 4, Decimal('75.00')),
+            (date(2026, 1, 1), Decimal('100.00'), 1, Decimal('175.00')),
+        ])
+
+    def test_period_boundaries(self):
+        # Both ends of the range are included, the days around them are not
+        self.assertEqual(self.periods(date(2025, 2, 1), date(2025, 12, 31), 'day'), [
+            (date(2025, 2, 1), Decimal('25.00'), 2, Decimal('25.00')),
+            (date(2025, 12, 31), Decimal('40.00'), 1, Decimal('65.00')),
+        ])
+        self.assertEqual(self.periods(date(2025, 1, 31), date(2025, 2, 1), 'month', method='cash'), [
+            (date(2025, 1, 1), Decimal('10.00'), 1, Decimal('10.00')),
+            (date(2025, 2, 1), Decimal('20.00'), 1, Decimal('30.00')),
+        ])
+        self.assertEqual(self.periods(date(2025, 2, 2), date(2025, 12, 30), 'day'), [])
+
+    def test_method_totals(self):
+        rows = reports.method_totals(date(2025, 1, 1), date(2026, 12, 31))
+        self.assertEqual([(row['method'], row['total'], row['count'], row['share']) for row in rows], [
+            ('cash', Decimal('130.00'), 3, Decimal('0.7429')),
+            ('online', Decimal('40.00'), 1, Decimal('0.2286')),
+            ('card', Decimal('5.00'), 1, Decimal('0.0286')),
+        ])
+        self.assertEqual(reports.method_totals(date(2024, 1, 1), date(2024, 12, 31)), [])
+        rows = reports.method_totals(date(2025, 1, 1), date(2026, 12, 31), department__isnull=True)
+        self.assertEqual(rows, [])
+
+    def test_aging_buckets(self):
+        as_of = at(date(2026, 6, 30))
+        ages = [
+            timedelta(0), timedelta(days=29, hours=23), timedelta(days=30), timedelta(days=60),
+            timedelta(days=61), timedelta(days=90), timedelta(days=400), -timedelta(days=1),
+        ]
+        invoices = []
+        for age in ages:
+            invoice = Invoice.objects.create(patient=self.patient, total_amount=100)
+            Invoice.objects.filter(pk=invoice.pk).update(created_at=as_of - age)
+            invoices.append(invoice)
+        # Exactly 30 days old is in 31-60; partly paid counts with its balance, paid not at all
+        Payment.objects.create(invoice=invoices[0], amount=Decimal('40.00'), method='cash')
+        Payment.objects.create(invoice=invoices[6], amount=Decimal('100.00'), method='cash')
+
+        rows = reports.aging(Invoice.objects.exclude(department=self.department), as_of=as_of)
+        self.assertEqual([(row['bucket'], row['invoices'], row['outstanding']) for row in rows], [
+            ('0-30', 2, Decimal('160.00')),
+            ('31-60', 1, Decimal('100.00')),
+            ('61-90', 2, Decimal('200.00')),
+            ('90+', 1, Decimal('100.00')),
+        ])
+        self.assertEqual(rows[2]['oldest'], as_of - timedelta(days=61))
+
+        rows = reports.aging(Invoice.objects.filter(created_at__gt=as_of - timedelta(days=30)), as_of=as_of)
+        self.assertEqual(rows[3], {'bucket': '90+', 'invoices': 0, 'outstanding': Decimal('0.00'), 'oldest': None})
+
+    def test_params(self):
+        start, end, filters = reports.parse_range({'from': '2025-01-01', 'to': '2025-01-31', 'method': 'card'}, 30, 366)
+        self.assertEqual((start, end, filters), (date(2025, 1, 1), date(2025, 1, 31), {'method': 'card'}))
+        self.assertEqual(reports.parse_range({'department': 'none'}, 30, 366)[2], {'department__isnull': True})
+        for params in [{'from': '2025-02-01', 'to': '2025-01-01'}, {'from': '2024-01-01', 'to': '2025-01-01'},
+                       {'to': '01/01/2025'}, {'method': 'cheque'}, {'department': 'x'}]:
+            with self.subTest(params=params), self.assertRaises(ValidationError):
+                reports.parse_range(params, 30, 366)
+        with self.assertRaises(ValidationError):
+            reports.parse_period({'period': 'week'})
+
+
+# ==========================
+# Async views
+# ==========================
+class AsyncViewTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name='Medicine', description='-')
+        cls.doctor = make_doctor(department, 0)
+
+    def setUp(self):
+        response_cache.backend.clear()
+
+    def test_cached_responses_match_the_sync_api(self):
+        # The event loop must only use the async cache API
+        blocking = {name: mock.Mock(side_effect=AssertionError) for name in ('versions', 'key', 'get', 'set')}
+        with mock.patch.multiple(response_cache, **blocking):
+            miss = self.client.get('/api/v1/async/doctors/')
+            hit = self.client.get('/api/v1/async/doctors/')
+        self.assertEqual((miss['X-Cache'], hit['X-Cache']), ('MISS', 'HIT'))
+        self.assertEqual(hit.json(), miss.json())
+        self.assertEqual(hit['ETag'], miss['ETag'])
+
+        sync = self.client.get('/api/v1/doctors/')
+        self.assertEqual(sync.json(), hit.json())
+        self.assertEqual(sync['X-Cache'], 'MISS')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doctor.save()
+        again = self.client.get('/api/v1/async/doctors/', headers={'If-None-Match': hit['ETag']})
+        self.assertEqual((again.status_code, again['X-Cache']), (200, 'MISS'))
+
+
+# ==========================
+# Database connections
+# ==========================
+def load_database_settings(**env):
+    """The default database of a fresh copy of the settings module, read with `env` set."""
+    spec = importlib.util.find_spec('hospital_management.settings')
+    module = importlib.util.module_from_spec(spec)
+    with mock.patch.dict(os.environ, env):
+        spec.loader.exec_module(module)
+    return module.DATABASES['default']
+
+
+class DatabaseSettingsTests(APITestCase):
+    def test_persistent_connections_by_default(self):
+        database = load_database_settings()
+        self.assertEqual(database['CONN_MAX_AGE'], 60)
+        self.assertTrue(database['CONN_HEALTH_CHECKS'])
+        self.assertFalse(database['DISABLE_SERVER_SIDE_CURSORS'])
+        self.assertEqual(database['OPTIONS'], {'connect_timeout': 10})
+
+    def test_environment(self):
+        database = load_database_settings(
+            DB_CONN_MAX_AGE='0', DB_CONN_HEALTH_CHECKS='False', DB_PGBOUNCER='True', DB_SSLMODE='require',
+        )
+        self.assertEqual(database['CONN_MAX_AGE'], 0)
+        self.assertFalse(database['CONN_HEALTH_CHECKS'])
+        self.assertTrue(database['DISABLE_SERVER_SIDE_CURSORS'])
+        self.assertEqual(database['OPTIONS'], {'connect_timeout': 10, 'sslmode': 'require'})
+
+    def test_pool(self):
+        from psycopg_pool import ConnectionPool
+
+        database = load_database_settings(DB_POOL='True', DB_POOL_MAX_SIZE='20')
+        # The pool replaces persistent connections and pings what it hands out
+        self.assertEqual(database['CONN_MAX_AGE'], 0)
+        self.assertEqual(database['OPTIONS']['pool'], {
+            'min_size': 2, 'max_size': 20, 'timeout': 10, 'check': ConnectionPool.check_connection,
+        })
+
+    def test_pool_needs_psycopg_pool(self):
+        with mock.patch.dict(sys.modules, {'psycopg_pool': None}), self.assertRaises(ImproperlyConfigured):
+            load_database_settings(DB_POOL='True')
+
+
+# ==========================
+# Chunked uploads
+# ==========================
+class UploadTests(APITestCase):
+    def setUp(self):
+        media, staging = tempfile.TemporaryDirectory(), tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.addCleanup(staging.cleanup)
+        storages = {**settings.STORAGES, 'default': {
+            'BACKEND': 'django.core.files.storage.FileSystemStorage', 'OPTIONS': {'location': media.name},
+        }}
+        overrides = override_settings(
+            STORAGES=storages, UPLOAD_BACKEND='hospital.uploads.LocalUploadBackend', UPLOAD_STAGING_DIR=staging.name,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.backend = uploads.get_backend()
+        self.ticket, self.payload, _ = uploads.issue_ticket('report.pdf', 6, 'application/pdf', {}, self.backend)
+
+    def put(self, body, content_range):
+        return self.client.put(
+            reverse('upload-detail', args=[self.ticket]), body,
+            content_type='application/octet-stream', headers={'Content-Range': content_range},
+        )
+
+    def test_chunks_after_completion_are_rejected(self):
+        self.assertEqual(self.put(b'abc', 'bytes 0-2/6').data['received'], 3)
+        self.assertEqual(self.put(b'abc', 'bytes 0-2/6').status_code, 409)
+        self.assertTrue(self.put(b'def', 'bytes 3-5/6').data['complete'])
+
+        for body, content_range in ((b'def', 'bytes 3-5/6'), (b'abc', 'bytes 0-2/6')):
+            response = self.put(body, content_range)
+            self.assertEqual(response.status_code, 409)
+            self.assertEqual(response.data['detail'].code, 'upload_complete')
+        directory = self.payload['key'].rsplit('/', 1)[0]
+        self.assertEqual(self.backend.storage.listdir(directory)[1], ['report.pdf'])
+        with self.backend.storage.open(self.payload['key']) as stored:
+            self.assertEqual(stored.read(), b'abcdef')
+        self.assertEqual(uploads.upload_status(self.payload, self.backend), {'received': 6, 'size': 6, 'complete': True})
+
+
+# ==========================
+# Filtering and ordering
+# ==========================
+class FilterAndOrderingTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for name in ('Cardiology', 'Medicine', 'Neurology'):
+            Department.objects.create(name=name, description='-')
+        for name, price in (('Blood count', 100), ('Blood sugar', 300), ('X-ray', 150)):
+            LabTest.objects.create(test_name=name, description='-', price=price)
+        for n in range(3):
+            make_patient(n)
+
+    def setUp(self):
+        response_cache.backend.clear()
+
+    def test_department_and_lab_test_filters(self):
+        response = self.client.get('/api/v1/departments/', {'name': 'LOGY'})
+        self.assertEqual([row['name'] for row in response.data], ['Cardiology', 'Neurology'])
+        response = self.client.get('/api/v1/labtests/', {'name': 'blood', 'price_max': 150})
+        self.assertEqual([row['test_name'] for row in response.data], ['Blood count'])
+        response = self.client.get('/api/v1/labtests/', {'price_min': 150})
+        self.assertEqual(sorted(row['test_name'] for row in response.data), ['Blood sugar', 'X-ray'])
+
+    def test_unindexed_ordering_is_rejected(self):
+        for url in ('/api/v1/patients/?ordering=email', '/api/v1/patients/?ordering=-dob',
+                    '/api/v1/departments/?ordering=description', '/api/v1/labtests/?ordering=price'):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('ordering', response.data)
+
+        response = self.client.get('/api/v1/patients/?ordering=-name')
+        self.assertEqual([row['first_name'] for row in response.data], ['Patient2', 'Patient1', 'Patient0'])
+        self.assertEqual(self.client.get('/api/v1/labtests/?ordering=-id').status_code, 200)
+
+    def test_ordering_index_checks(self):
+        from .views import InvoiceViewSet, PatientViewSet
+
+        self.assertEqual(check_ordering_indexes(), [])
+
+        def error_ids():
+            return {error.id for error in check_ordering_indexes()}
+
+        with mock.patch.object(PatientViewSet, 'ordering_fields', {'email': ['email']}):
+            self.assertEqual(error_ids(), {'hospital.E001'})
+        # Indexed, but the lean rows don't carry `time`
+        lean_fields = {name: lookup for name, lookup in AppointmentViewSet.lean_fields.items() if name != 'time'}
+        with mock.patch.object(AppointmentViewSet, 'lean_fields', lean_fields):
+            self.assertEqual(error_ids(), {'hospital.E002'})
+        with mock.patch.object(InvoiceViewSet, 'ordering_fields', {'admission': ['admission']}):
+            self.assertIn('hospital.E003', error_ids())
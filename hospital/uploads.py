@@ -0,0 +1,216 @@
+import fcntl
+import hashlib
+import os
+import re
+import time
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from django.utils.module_loading import import_string
+from django.utils.text import get_valid_filename
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+TICKET_SALT = 'hospital.uploads'
+BLOCK_SIZE = 64 * 1024
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class OffsetMismatch(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'The chunk does not start where the upload stopped.'
+    default_code = 'offset_mismatch'
+
+
+class UploadComplete(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'The upload is already complete.'
+    default_code = 'upload_complete'
+
+
+# ==========================
+# Upload backends
+# ==========================
+class LocalUploadBackend:
+    """
+    Filesystem stand-in for a storage service, used when media files live
+    in MEDIA_ROOT (MEDIA_STORAGE=local: development, offline tests).
+    The "direct" upload goes to the API's own uploads route, which streams
+    the body to disk like the chunked path does.
+    """
+
+    def __init__(self):
+        self.storage = default_storage
+
+    def key(self, filename):
+        return f'reports/{uuid.uuid4().hex}/{get_valid_filename(filename)}'
+
+    def direct_upload(self, request, ticket, payload):
+        return {
+            'method': 'PUT',
+            'url': request.build_absolute_uri(reverse('upload-detail', args=[ticket])),
+            'headers': {'Content-Type': payload['content_type']},
+        }
+
+    def store(self, key, path):
+        with open(path, 'rb') as staged:
+            return self.storage.save(key, File(staged))
+
+    def stored_size(self, key):
+        return self.storage.size(key) if self.storage.exists(key) else None
+
+    def delete(self, key):
+        self.storage.delete(key)
+
+
+class CloudinaryUploadBackend:
+    """
+    Signed uploads straight from the client to Cloudinary, into the same
+    place MediaCloudinaryStorage would put the file; its public id is the
+    name stored on the LabReport.
+    """
+
+    def __init__(self):
+        self.storage = default_storage
+
+    def key(self, filename):
+        # Image resources keep their format outside the public id
+        stem = os.path.splitext(get_valid_filename(filename))[0]
+        prefix = settings.CLOUDINARY_STORAGE.get('PREFIX', settings.MEDIA_URL).strip('/')
+        return '/'.join(filter(None, [prefix, 'reports', uuid.uuid4().hex, stem]))
+
+    def direct_upload(self, request, ticket, payload):
+        import cloudinary.utils
+
+        params = {'public_id': payload['key'], 'tags': self.storage.TAG, 'timestamp': int(time.time())}
+        return {
+            'method': 'POST',
+            'url': cloudinary.utils.cloudinary_api_url('upload', resource_type=self.storage.RESOURCE_TYPE),
+            # Sent as multipart form fields next to the file in `file_field`
+            'fields': cloudinary.utils.sign_request(params, {}),
+            'file_field': 'file',
+        }
+
+    def store(self, key, path):
+        import cloudinary.uploader
+
+        response = cloudinary.uploader.upload_large(
+            path, public_id=key, resource_type=self.storage.RESOURCE_TYPE, tags=self.storage.TAG,
+        )
+        return response['public_id']
+
+    def stored_size(self, key):
+        return self.storage.size(key)
+
+    def delete(self, key):
+        self.storage.delete(key)
+
+
+def get_backend():
+    return import_string(settings.UPLOAD_BACKEND)()
+
+
+# ==========================
+# Tickets
+# ==========================
+def issue_ticket(filename, size, content_type, fields, backend):
+    """Signed ticket for one upload, and when it expires (a Unix timestamp)."""
+    payload = {
+        'key': backend.key(filename),
+        'size': size,
+        'content_type': content_type,
+        'fields': fields,
+    }
+    ticket = signing.dumps(payload, salt=TICKET_SALT, compress=True)
+    return ticket, payload, int(time.time()) + settings.UPLOAD_TICKET_MAX_AGE
+
+
+def read_ticket(ticket):
+    try:
+        return signing.loads(ticket, salt=TICKET_SALT, max_age=settings.UPLOAD_TICKET_MAX_AGE)
+    except signing.SignatureExpired:
+        raise ValidationError({'ticket': 'The upload ticket has expired.'})
+    except signing.BadSignature:
+        raise ValidationError({'ticket': 'Invalid upload ticket.'})
+
+
+# ==========================
+# Chunked uploads
+# ==========================
+# Chunks are appended to a staging file, and the finished file is handed to
+# the backend in one go. Staging is per process host, so behind several
+# instances (e.g. serverless) clients should use the direct upload.
+def staging_path(key):
+    os.makedirs(settings.UPLOAD_STAGING_DIR, exist_ok=True)
+    return os.path.join(settings.UPLOAD_STAGING_DIR, hashlib.sha1(key.encode()).hexdigest() + '.part')
+
+
+def parse_content_range(header, length, size):
+    """(start, end) of a chunk from `Content-Range: bytes start-end/total`; the whole file without one."""
+    if not header:
+        if length != size:
+            raise ValidationError({'Content-Range': 'Send the whole file, or a Content-Range for part of it.'})
+        return 0, size - 1
+    match = CONTENT_RANGE_RE.match(header.strip())
+    if not match:
+        raise ValidationError({'Content-Range': 'Use the form bytes start-end/total.'})
+    start, end, total = map(int, match.groups())
+    if total != size:
+        raise ValidationError({'Content-Range': f'The ticket is for {size} bytes, not {total}.'})
+    if start > end or end >= size or end - start + 1 != length:
+        raise ValidationError({'Content-Range': 'The range does not match the body.'})
+    return start, end
+
+
+def upload_status(payload, backend):
+    """{'received', 'size', 'complete'} of the ticket's upload."""
+    path = staging_path(payload['key'])
+    if os.path.exists(path):
+        received = os.path.getsize(path)
+    else:
+        received = backend.stored_size(payload['key']) or 0
+    return {'received': received, 'size': payload['size'], 'complete': received >= payload['size']}
+
+
+def write_chunk(payload, start, end, stream, backend):
+    """
+    Append bytes start..end read from `stream`; store the file once it is
+    whole. Writers take turns on the staging file, so a chunk racing another
+    one waits for it and then fails the offset check.
+    """
+    path = staging_path(payload['key'])
+    with open(path, 'ab') as staged:
+        fcntl.flock(staged, fcntl.LOCK_EX)
+        received = os.fstat(staged.fileno()).st_size
+        if received == payload['size'] or not received and backend.stored_size(payload['key']) is not None:
+            # Completed by the writer this one waited for, or earlier (the
+            # staging file was removed then, and this one is new)
+            discard_staging(path)
+            raise UploadComplete()
+        if start != received:
+            raise OffsetMismatch(f'The upload has {received} bytes; send the chunk starting there.')
+        remaining = end - start + 1
+        while remaining:
+            block = stream.read(min(BLOCK_SIZE, remaining))
+            if not block:
+                break
+            staged.write(block)
+            remaining -= len(block)
+        staged.flush()
+        received = staged.tell()
+        if received == payload['size']:
+            backend.store(payload['key'], path)
+            discard_staging(path)
+    return {'received': received, 'size': payload['size'], 'complete': received == payload['size']}
+
+
+def discard_staging(path):
+    # A writer waiting on the same file may already have removed it
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
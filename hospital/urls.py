@@ -5,8 +5,9 @@ from .views import (
     ScheduleViewSet, WardViewSet, RoomViewSet, AdmissionViewSet,
     TreatmentViewSet, MedicationViewSet, NurseViewSet,
     LabTestViewSet, LabReportViewSet, PrescriptionViewSet,
-    InvoiceViewSet, PaymentViewSet
+    InvoiceViewSet, PaymentViewSet, RevenueViewSet, UploadViewSet
 )
+from .async_views import AsyncAppointmentView, AsyncDoctorView, AsyncPatientView, AsyncRoomView
 
 router = routers.DefaultRouter()
 router.register(r'patients', PatientViewSet)
@@ -25,6 +26,8 @@ router.register(r'labreports', LabReportViewSet)
 router.register(r'prescriptions', PrescriptionViewSet)
 router.register(r'invoices', InvoiceViewSet)
 router.register(r'payments', PaymentViewSet)
+router.register(r'revenue', RevenueViewSet, basename='revenue')
+router.register(r'uploads', UploadViewSet, basename='upload')
 
 # Nested routers example:
 
@@ -61,7 +64,20 @@ doctors_router.register(r'prescriptions', PrescriptionViewSet, basename='doctor-
 doctors_router.register(r'labreports', LabReportViewSet, basename='doctor-labreports')
 doctors_router.register(r'treatments', TreatmentViewSet, basename='doctor-treatments')
 
+# Async read-only copies of the busiest list/detail routes, for ASGI servers
+async_urlpatterns = [
+    path('appointments/', AsyncAppointmentView.as_view(), name='async-appointment-list'),
+    path('appointments/<pk>/', AsyncAppointmentView.as_view(), name='async-appointment-detail'),
+    path('patients/', AsyncPatientView.as_view(), name='async-patient-list'),
+    path('patients/<pk>/', AsyncPatientView.as_view(), name='async-patient-detail'),
+    path('doctors/', AsyncDoctorView.as_view(), name='async-doctor-list'),
+    path('doctors/<pk>/', AsyncDoctorView.as_view(), name='async-doctor-detail'),
+    path('rooms/', AsyncRoomView.as_view(), name='async-room-list'),
+    path('rooms/<pk>/', AsyncRoomView.as_view(), name='async-room-detail'),
+]
+
 urlpatterns = [
+    path(r'api/v1/async/', include(async_urlpatterns)),
     path(r'api/v1/', include(router.urls)),
     path(r'api/v1/', include(departments_router.urls)),
     path(r'api/v1/', include(patients_router.urls)),
@@ -1,4 +1,14 @@
-from rest_framework import viewsets
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import CharField, Value
+from django.db.models.functions import Concat
+from django.urls import reverse
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from tasks.serializers import JobSerializer
 from .models import (
     Patient, Department, Doctor, Appointment,
     Schedule, Ward, Room, Admission,
@@ -10,86 +20,416 @@ from .serializers import (
     PatientSerializer, DepartmentSerializer, DoctorSerializer, AppointmentSerializer,
     ScheduleSerializer, WardSerializer, RoomSerializer, AdmissionSerializer,
     TreatmentSerializer, MedicationSerializer, NurseSerializer,
-    LabTestSerializer, LabReportSerializer, PrescriptionSerializer,
+    LabTestSerializer, LabReportSerializer, LabReportUploadSerializer, PrescriptionSerializer,
     InvoiceSerializer, PaymentSerializer
 )
+from .mixins import (
+    ParentScopedMixin, LeanListMixin, SparseFieldsMixin,
+    BulkWriteMixin, ExportMixin, CachedResponseMixin, ConditionalGetMixin
+)
+from .filters import (
+    PatientFilter, DepartmentFilter, DoctorFilter, AppointmentFilter, ScheduleFilter, WardFilter, RoomFilter,
+    AdmissionFilter, TreatmentFilter, MedicationFilter, NurseFilter, LabTestFilter, LabReportFilter,
+    PrescriptionFilter, InvoiceFilter, PaymentFilter
+)
+from . import availability, jobs, reports, search, uploads
 
 
-class PatientViewSet(viewsets.ModelViewSet):
-    queryset = Patient.objects.all().order_by('first_name', 'last_name')
-    serializer_class = PatientSerializer
+def full_name(prefix):
+    return Concat(
+        f'{prefix}first_name', Value(' '), f'{prefix}last_name',
+        output_field=CharField()
+    )
 
 
-class DepartmentViewSet(viewsets.ModelViewSet):
-    queryset = Department.objects.all().order_by('name').prefetch_related('doctors', 'nurses')
+class PatientViewSet(ConditionalGetMixin, SparseFieldsMixin, viewsets.ModelViewSet):
+    queryset = Patient.objects.all().order_by('first_name', 'last_name')
+    serializer_class = PatientSerializer
+    filterset_class = PatientFilter
+    ordering_fields = {'name': ['first_name', 'last_name']}
+    field_sources = {'name': ['first_name', 'last_name'], 'age': ['dob']}
+
+    def is_search(self):
+        return self.action == 'list' and 'q' in self.request.query_params
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.is_search():
+            q, _ = search.parse_params(self.request.query_params)
+            queryset = search.filter_patients(queryset, q)
+        return queryset
+
+    def get_response_rows(self, queryset):
+        if not self.is_search():
+            return super().get_response_rows(queryset)
+        q, limit = search.parse_params(self.request.query_params)
+        return search.rank_patients(queryset, q)[:limit]
+
+    def paginate_queryset(self, queryset):
+        # `?q=` returns the best `limit` matches, ranked, instead of a page
+        if self.is_search():
+            return list(self.get_response_rows(queryset))
+        return super().paginate_queryset(queryset)
+
+    def get_paginated_response(self, data):
+        if self.is_search():
+            return Response({'next': None, 'previous': None, 'results': data})
+        return super().get_paginated_response(data)
+
+
+class DepartmentViewSet(ConditionalGetMixin, CachedResponseMixin, SparseFieldsMixin, viewsets.ModelViewSet):
+    queryset = Department.objects.all().order_by('name').prefetch_related('doctors')
     serializer_class = DepartmentSerializer
-
-
-class DoctorViewSet(viewsets.ModelViewSet):
+    filterset_class = DepartmentFilter
+    ordering_fields = {'name': ['name']}
+    cache_models = (Department, Doctor)
+    related_fields = {'doctor_count': ['doctors']}
+
+    @action(detail=True, methods=['get'])
+    def availability(self, request, pk=None):
+        """Free slots of every active doctor in the department."""
+        department = self.get_object()
+        start, end, slot = availability.parse_params(request.query_params)
+        doctors = list(department.doctors.filter(is_active=True).values_list('id', 'name'))
+        slots = availability.find_availability([doctor_id for doctor_id, _ in doctors], start, end, slot)
+        return Response({
+            'department': department.id,
+            'from': start, 'to': end, 'slot': slot,
+            'doctors': [
+                {'id': doctor_id, 'name': name, 'days': slots[doctor_id]}
+                for doctor_id, name in doctors
+            ],
+        })
+
+
+class DoctorViewSet(ConditionalGetMixin, CachedResponseMixin, ParentScopedMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = Doctor.objects.select_related('department').all()
     serializer_class = DoctorSerializer
+    filterset_class = DoctorFilter
+    cache_models = (Doctor, Department)
+    related_fields = {'department_name': ['department']}
+    parent_lookup_kwargs = {'department_pk': 'department'}
+
+    @action(detail=True, methods=['get'])
+    def availability(self, request, pk=None):
+        """Free appointment slots, e.g. ?from=2025-01-01&to=2025-01-31&slot=15m"""
+        doctor = self.get_object()
+        start, end, slot = availability.parse_params(request.query_params)
+        days = availability.find_availability([doctor.id], start, end, slot)[doctor.id] if doctor.is_active else []
+        return Response({'doctor': doctor.id, 'from': start, 'to': end, 'slot': slot, 'days': days})
 
 
-class AppointmentViewSet(viewsets.ModelViewSet):
+class AppointmentViewSet(ConditionalGetMixin, ParentScopedMixin, LeanListMixin, SparseFieldsMixin, BulkWriteMixin, viewsets.ModelViewSet):
     queryset = Appointment.objects.select_related('patient', 'doctor__department').all().order_by('-date', '-time')
     serializer_class = AppointmentSerializer
-
-
-class ScheduleViewSet(viewsets.ModelViewSet):
+    filterset_class = AppointmentFilter
+    ordering_fields = {'date': ['date', 'time']}
+    related_fields = {'patient_detail': ['patient'], 'doctor_detail': ['doctor__department']}
+    parent_lookup_kwargs = {'patient_pk': 'patient', 'doctor_pk': 'doctor'}
+    lean_fields = {
+        'id': 'id', 'patient': 'patient', 'patient_name': full_name('patient__'),
+        'doctor': 'doctor', 'doctor_name': 'doctor__name', 'department_name': 'doctor__department__name',
+        'date': 'date', 'time': 'time', 'status': 'status',
+    }
+
+
+class ScheduleViewSet(ConditionalGetMixin, ParentScopedMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = Schedule.objects.select_related('doctor__department').all()
     serializer_class = ScheduleSerializer
+    filterset_class = ScheduleFilter
+    related_fields = {'doctor_detail': ['doctor__department']}
+    parent_lookup_kwargs = {'doctor_pk': 'doctor'}
 
 
-class WardViewSet(viewsets.ModelViewSet):
+class WardViewSet(ConditionalGetMixin, CachedResponseMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = Ward.objects.all()
     serializer_class = WardSerializer
-
-
-class RoomViewSet(viewsets.ModelViewSet):
+    filterset_class = WardFilter
+    cache_models = (Ward,)
+    field_sources = {'free_beds': ['bed_count', 'occupied_beds']}
+
+    @action(detail=False, methods=['get'])
+    def occupancy(self, request):
+        """Beds per ward from the maintained counters, e.g. ?type=icu"""
+        wards = self.get_queryset().order_by('id')
+        if request.query_params.get('type'):
+            wards = wards.filter(type=request.query_params['type'])
+        wards = [
+            {**ward, 'free_beds': max(ward['bed_count'] - ward['occupied_beds'], 0)}
+            for ward in wards.values('id', 'name', 'type', 'bed_count', 'occupied_beds')
+        ]
+        return Response({
+            'bed_count': sum(ward['bed_count'] for ward in wards),
+            'occupied_beds': sum(ward['occupied_beds'] for ward in wards),
+            'free_beds': sum(ward['free_beds'] for ward in wards),
+            'wards': wards,
+        })
+
+
+class RoomViewSet(ConditionalGetMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = Room.objects.select_related('ward').prefetch_related('nurses').all()
     serializer_class = RoomSerializer
+    filterset_class = RoomFilter
+    related_fields = {'ward_detail': ['ward']}
+    field_sources = {'free_beds': ['bed_count', 'occupied_beds']}
 
 
-class AdmissionViewSet(viewsets.ModelViewSet):
+class AdmissionViewSet(ConditionalGetMixin, ParentScopedMixin, LeanListMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = Admission.objects.select_related('patient', 'room__ward').all().order_by('-admitted_at')
     serializer_class = AdmissionSerializer
-
-
-class TreatmentViewSet(viewsets.ModelViewSet):
-    queryset = Treatment.objects.select_related('admission__patient', 'doctor').all()
+    filterset_class = AdmissionFilter
+    ordering_fields = {'admitted_at': ['admitted_at']}
+    related_fields = {'patient_detail': ['patient'], 'room_detail': ['room__ward']}
+    parent_lookup_kwargs = {'patient_pk': 'patient'}
+    lean_fields = {
+        'id': 'id', 'patient': 'patient', 'patient_name': full_name('patient__'),
+        'room': 'room', 'room_no': 'room__room_no', 'ward_name': 'room__ward__name',
+        'admitted_at': 'admitted_at', 'discharged_at': 'discharged_at', 'status': 'status',
+    }
+
+
+class TreatmentViewSet(ConditionalGetMixin, ParentScopedMixin, LeanListMixin, SparseFieldsMixin, viewsets.ModelViewSet):
+    queryset = Treatment.objects.select_related('admission__patient', 'admission__room__ward', 'doctor__department').all()
     serializer_class = TreatmentSerializer
-
-
-class MedicationViewSet(viewsets.ModelViewSet):
-    queryset = Medication.objects.select_related('treatment__admission__patient', 'treatment__doctor').all()
+    filterset_class = TreatmentFilter
+    related_fields = {
+        'admission_detail': ['admission__patient', 'admission__room__ward'],
+        'doctor_detail': ['doctor__department'],
+    }
+    parent_lookup_kwargs = {'admission_pk': 'admission', 'doctor_pk': 'doctor'}
+    lean_fields = {
+        'id': 'id', 'admission': 'admission', 'patient_name': full_name('admission__patient__'),
+        'doctor': 'doctor', 'doctor_name': 'doctor__name',
+        'description': 'description', 'treatment_date': 'treatment_date',
+    }
+
+
+class MedicationViewSet(ConditionalGetMixin, ParentScopedMixin, LeanListMixin, SparseFieldsMixin, BulkWriteMixin, viewsets.ModelViewSet):
+    queryset = Medication.objects.select_related(
+        'treatment__admission__patient', 'treatment__admission__room__ward', 'treatment__doctor__department'
+    ).all()
     serializer_class = MedicationSerializer
-
-
-class NurseViewSet(viewsets.ModelViewSet):
-    queryset = Nurse.objects.select_related('department', 'assign_room__ward').all()
+    filterset_class = MedicationFilter
+    related_fields = {
+        'treatment_detail': [
+            'treatment__admission__patient', 'treatment__admission__room__ward', 'treatment__doctor__department'
+        ],
+    }
+    parent_lookup_kwargs = {'treatment_pk': 'treatment'}
+    lean_fields = {
+        'id': 'id', 'treatment': 'treatment', 'patient_name': full_name('treatment__admission__patient__'),
+        'doctor_name': 'treatment__doctor__name',
+        'medicine_name': 'medicine_name', 'dosage': 'dosage', 'frequency': 'frequency',
+    }
+
+
+class NurseViewSet(ConditionalGetMixin, ParentScopedMixin, SparseFieldsMixin, viewsets.ModelViewSet):
+    queryset = Nurse.objects.select_related('department', 'assign_room__ward').prefetch_related('department__doctors').all()
     serializer_class = NurseSerializer
+    filterset_class = NurseFilter
+    related_fields = {'department_detail': ['department__doctors'], 'assign_room_detail': ['assign_room__ward']}
+    parent_lookup_kwargs = {'department_pk': 'department'}
 
 
-class LabTestViewSet(viewsets.ModelViewSet):
+class LabTestViewSet(ConditionalGetMixin, CachedResponseMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = LabTest.objects.all()
     serializer_class = LabTestSerializer
+    filterset_class = LabTestFilter
+    cache_models = (LabTest,)
 
 
-class LabReportViewSet(viewsets.ModelViewSet):
-    queryset = LabReport.objects.select_related('patient', 'doctor', 'test').all().order_by('-created_at')
+class LabReportViewSet(ConditionalGetMixin, ParentScopedMixin, SparseFieldsMixin, ExportMixin, viewsets.ModelViewSet):
+    queryset = LabReport.objects.select_related('patient', 'doctor__department', 'test').all().order_by('-created_at')
     serializer_class = LabReportSerializer
-
-
-class PrescriptionViewSet(viewsets.ModelViewSet):
-    queryset = Prescription.objects.select_related('appointment', 'doctor', 'patient').all().order_by('-created_at')
+    filterset_class = LabReportFilter
+    ordering_fields = {'created_at': ['created_at']}
+    related_fields = {'patient_detail': ['patient'], 'doctor_detail': ['doctor__department'], 'test_detail': ['test']}
+    parent_lookup_kwargs = {'patient_pk': 'patient', 'doctor_pk': 'doctor'}
+    export_fields = {
+        'id': 'id', 'patient': 'patient', 'patient_name': full_name('patient__'),
+        'doctor': 'doctor', 'doctor_name': 'doctor__name', 'test': 'test', 'test_name': 'test__test_name',
+        'report_file': 'report_file', 'created_at': 'created_at',
+    }
+
+    @action(detail=False, methods=['post'], url_path='upload-ticket')
+    def upload_ticket(self, request, **kwargs):
+        """
+        Step 1 of an upload: sign a ticket for one report file, e.g.
+        {"patient": 1, "doctor": 2, "test": 3, "filename": "cbc.pdf", "size": 48213}.
+        The client sends the file as described in `upload` (straight to
+        storage) or in chunks to `chunked_url`, then confirms the ticket.
+        """
+        serializer = LabReportUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        backend = uploads.get_backend()
+        ticket, payload, expires = uploads.issue_ticket(
+            data['filename'], data['size'], data['content_type'],
+            {name: data[name].pk for name in ('patient', 'doctor', 'test')}, backend,
+        )
+        return Response({
+            'ticket': ticket,
+            'expires': expires,
+            'upload': backend.direct_upload(request, ticket, payload),
+            'chunked_url': request.build_absolute_uri(reverse('upload-detail', args=[ticket])),
+        }, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'], url_path='confirm-upload')
+    def confirm_upload(self, request, **kwargs):
+        """Step 2: create the LabReport once the ticket's file is in storage, e.g. {"ticket": "..."}"""
+        payload = uploads.read_ticket(request.data.get('ticket', ''))
+        existing = LabReport.objects.filter(report_file=payload['key']).first()
+        if existing is not None:
+            # Confirming twice returns the same report
+            return Response(self.get_serializer(existing).data)
+        backend = uploads.get_backend()
+        size = backend.stored_size(payload['key'])
+        if size is None:
+            raise ValidationError({'ticket': 'Nothing has been uploaded for this ticket yet.'})
+        if size > settings.LAB_REPORT_MAX_UPLOAD_SIZE:
+            backend.delete(payload['key'])
+            raise ValidationError({'ticket': f'Files may be at most {settings.LAB_REPORT_MAX_UPLOAD_SIZE} bytes.'})
+        try:
+            with transaction.atomic():
+                report = LabReport.objects.create(
+                    report_file=payload['key'],
+                    **{f'{name}_id': pk for name, pk in payload['fields'].items()},
+                )
+        except IntegrityError:
+            raise ValidationError({'ticket': 'The patient, doctor or test no longer exists.'})
+        return Response(self.get_serializer(report).data, status=status.HTTP_201_CREATED)
+
+
+class PrescriptionViewSet(ConditionalGetMixin, ParentScopedMixin, SparseFieldsMixin, viewsets.ModelViewSet):
+    queryset = Prescription.objects.select_related('appointment', 'doctor__department', 'patient').all().order_by('-created_at')
     serializer_class = PrescriptionSerializer
+    filterset_class = PrescriptionFilter
+    ordering_fields = {'created_at': ['created_at']}
+    related_fields = {'doctor_detail': ['doctor__department'], 'patient_detail': ['patient']}
+    parent_lookup_kwargs = {'patient_pk': 'patient', 'doctor_pk': 'doctor'}
 
 
-class InvoiceViewSet(viewsets.ModelViewSet):
-    queryset = Invoice.objects.select_related('patient', 'admission__room__ward').prefetch_related('payments').all().order_by('-created_at')
+class InvoiceViewSet(ConditionalGetMixin, ParentScopedMixin, SparseFieldsMixin, ExportMixin, viewsets.ModelViewSet):
+    queryset = Invoice.objects.select_related('patient', 'admission__patient', 'admission__room__ward').prefetch_related('payments').all().order_by('-created_at')
     serializer_class = InvoiceSerializer
-
-
-class PaymentViewSet(viewsets.ModelViewSet):
-    queryset = Payment.objects.select_related('invoice__patient').all().order_by('-paid_at')
+    filterset_class = InvoiceFilter
+    ordering_fields = {'created_at': ['created_at']}
+    related_fields = {
+        'patient_detail': ['patient'],
+        'admission_detail': ['admission__patient', 'admission__room__ward'],
+        'payments': ['payments'],
+    }
+    parent_lookup_kwargs = {'patient_pk': 'patient'}
+    export_fields = {
+        'id': 'id', 'patient': 'patient', 'patient_name': full_name('patient__'), 'admission': 'admission',
+        'department': 'department', 'total_amount': 'total_amount', 'amount_paid': 'amount_paid',
+        'balance': 'balance', 'status': 'status', 'created_at': 'created_at',
+    }
+
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    def pdf(self, request, **kwargs):
+        """Render the invoice as a PDF on a worker; answers 202 with the job, whose result links to the file."""
+        job = jobs.render_invoice_pdf.enqueue_for(request.user, self.get_object().pk)
+        return Response(JobSerializer(job, context={'request': request}).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['get'])
+    def aging(self, request, **kwargs):
+        """Outstanding balances by invoice age, e.g. ?department=3"""
+        errors = {}
+        filters = reports.parse_department(request.query_params, errors)
+        if errors:
+            raise ValidationError(errors)
+        return Response({'results': reports.aging(self.get_queryset().filter(**filters))})
+
+
+class PaymentViewSet(
+    ConditionalGetMixin, ParentScopedMixin, LeanListMixin, SparseFieldsMixin, BulkWriteMixin, ExportMixin, viewsets.ModelViewSet
+):
+    queryset = Payment.objects.select_related(
+        'invoice__patient', 'invoice__admission__patient', 'invoice__admission__room__ward'
+    ).prefetch_related('invoice__payments').all().order_by('-paid_at')
     serializer_class = PaymentSerializer
+    filterset_class = PaymentFilter
+    ordering_fields = {'paid_at': ['paid_at']}
+    related_fields = {
+        'invoice_detail': [
+            'invoice__patient', 'invoice__admission__patient', 'invoice__admission__room__ward',
+            'invoice__payments',
+        ],
+    }
+    parent_lookup_kwargs = {'invoice_pk': 'invoice'}
+    lean_fields = {
+        'id': 'id', 'invoice': 'invoice', 'invoice_status': 'invoice__status',
+        'patient': 'invoice__patient', 'patient_name': full_name('invoice__patient__'),
+        'amount': 'amount', 'method': 'method', 'paid_at': 'paid_at',
+    }
+    export_fields = {
+        'id': 'id', 'invoice': 'invoice', 'patient': 'invoice__patient', 'patient_name': full_name('invoice__patient__'),
+        'amount': 'amount', 'method': 'method', 'paid_at': 'paid_at',
+    }
+
+
+class RevenueViewSet(viewsets.ViewSet):
+    """Revenue from the maintained rollups, never from the Payment table."""
+
+    @action(detail=False, methods=['get'])
+    def daily(self, request):
+        """Revenue per day, e.g. ?from=2025-01-01&to=2025-01-31&department=3&method=card"""
+        start, end, filters = reports.parse_range(request.query_params, 30, reports.DAILY_MAX_DAYS)
+        rows = reports.daily_revenue(start, end, **filters)
+        return Response({'from': start, 'to': end, 'results': list(rows)})
+
+    @action(detail=False, methods=['get'])
+    def monthly(self, request):
+        """Revenue per month, from the same month last year by default."""
+        start, end, filters = self.year_range(request)
+        rows = reports.monthly_revenue(start, end, **filters)
+        return Response({'from': start, 'to': end, 'results': list(rows)})
+
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """Totals per period with a running total, e.g. ?period=day&from=2025-01-01"""
+        period = reports.parse_period(request.query_params)
+        start, end, filters = self.year_range(request)
+        rows = reports.revenue_by_period(start, end, period, **filters)
+        return Response({'from': start, 'to': end, 'period': period, 'results': list(rows)})
+
+    @action(detail=False, methods=['get'])
+    def methods(self, request):
+        """Totals per payment method over the range."""
+        start, end, filters = self.year_range(request)
+        return Response({'from': start, 'to': end, 'results': reports.method_totals(start, end, **filters)})
+
+    def year_range(self, request):
+        start, end, filters = reports.parse_range(request.query_params, 366, reports.MONTHLY_MAX_DAYS)
+        if not request.query_params.get('from'):
+            start = start.replace(day=1)
+        return start, end, filters
+
+
+class UploadViewSet(viewsets.ViewSet):
+    """
+    Chunked, streamed upload of the file for a ticket from
+    /labreports/upload-ticket/, for clients that can't upload to storage
+    directly. PUT the raw bytes, whole or in order with
+    `Content-Range: bytes start-end/total`; GET reports how many bytes have
+    arrived so an interrupted upload can resume. The signed ticket in the
+    URL is the credential.
+    """
+    lookup_field = 'ticket'
+    lookup_value_regex = '[^/]+'
+    authentication_classes = ()
+    permission_classes = (AllowAny,)
+    # The body is read from the stream, never parsed or buffered whole
+    parser_classes = ()
+
+    def retrieve(self, request, ticket=None):
+        payload = uploads.read_ticket(ticket)
+        return Response(uploads.upload_status(payload, uploads.get_backend()))
+
+    def update(self, request, ticket=None):
+        payload = uploads.read_ticket(ticket)
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+        start, end = uploads.parse_content_range(request.headers.get('Content-Range'), length, payload['size'])
+        progress = uploads.write_chunk(payload, start, end, request.stream, uploads.get_backend())
+        return Response(progress)
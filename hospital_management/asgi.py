@@ -3,6 +3,9 @@ ASGI config for hospital_management project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with any ASGI server, e.g. `uvicorn hospital_management.asgi:application`,
+to get the async read views under /api/v1/async/ (see hospital/async_views.py).
+
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
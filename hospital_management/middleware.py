@@ -0,0 +1,191 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+# ==========================
+# Metrics registry
+# ==========================
+class RouteMetrics:
+    """In-process totals per (route name, method), read by the /metrics/ view."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.routes = defaultdict(lambda: {
+                'requests': 0, 'queries': 0, 'db': 0.0, 'app': 0.0, 'serialize': 0.0, 'render': 0.0, 'total': 0.0,
+                'over_budget': 0, 'buckets': [0] * len(DURATION_BUCKETS),
+            })
+
+    def record(self, route, method, timing):
+        with self.lock:
+            stats = self.routes[(route, method)]
+            stats['requests'] += 1
+            stats['queries'] += timing.queries
+            stats['db'] += timing.db
+            stats['app'] += timing.app
+            stats['serialize'] += timing.serialize
+            stats['render'] += timing.render
+            stats['total'] += timing.total
+            stats['over_budget'] += int(timing.over_budget)
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if timing.total <= bound:
+                    stats['buckets'][index] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {key: {**value, 'buckets': list(value['buckets'])} for key, value in self.routes.items()}
+
+
+route_metrics = RouteMetrics()
+
+
+# ==========================
+# Request timing
+# ==========================
+class RequestTiming:
+    """
+    Queries and time spent in the database, the view, serializers and
+    rendering. `serialize` is added by the serializers themselves (see
+    hospital.serializers.DynamicFieldsModelSerializer), without the queries
+    they run.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+        self.render = 0.0
+        self.total = 0.0
+        self.budget = None
+        self.started = None
+        self.render_started = None
+
+    @property
+    def app(self):
+        return max(self.total - self.db - self.serialize - self.render, 0.0)
+
+    @property
+    def over_budget(self):
+        return self.budget is not None and self.queries > self.budget
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook, runs around every query
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - start
+            self.queries += 1
+
+    def server_timing(self):
+        return ', '.join([
+            f'db;dur={self.db * 1000:.1f};desc="{self.queries} queries"',
+            f'app;dur={self.app * 1000:.1f}',
+            f'serialize;dur={self.serialize * 1000:.1f}',
+            f'render;dur={self.render * 1000:.1f}',
+            f'total;dur={self.total * 1000:.1f}',
+        ])
+
+
+class QueryMetricsMiddleware:
+    """
+    Count SQL queries and time the database, the view, serializers and
+    response rendering for every request, keyed by URL route name.
+
+    The numbers are sent back in a Server-Timing header, attached to the
+    response as `response.timing` (see hospital_management.testing) and
+    aggregated for the /metrics/ endpoint. QUERY_BUDGETS maps route names to
+    the most queries a request may run; going over is logged, or raised as
+    QueryBudgetExceeded when QUERY_BUDGET_RAISE is set.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        timing = self.start(request)
+        with ExitStack() as stack:
+            self.watch_queries(stack, timing)
+            response = self.get_response(request)
+        return self.finish(request, response, timing)
+
+    async def __acall__(self, request):
+        timing = self.start(request)
+        stack = ExitStack()
+        # Under ASGI the ORM runs in the request's sync thread (sync_to_async),
+        # so the wrappers go on that thread's connections
+        await sync_to_async(self.watch_queries)(stack, timing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.finish(request, response, timing)
+
+    def start(self, request):
+        timing = RequestTiming()
+        request.timing = timing
+        timing.started = time.perf_counter()
+        return timing
+
+    def watch_queries(self, stack, timing):
+        # Wrappers are per thread and don't open a connection by themselves
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timing))
+
+    def finish(self, request, response, timing):
+        timing.total = time.perf_counter() - timing.started
+
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return response
+        route = match.view_name
+        if request.method in ('GET', 'HEAD'):
+            # Budgets cover reads; writes also maintain counters and rollups
+            timing.budget = getattr(settings, 'QUERY_BUDGETS', {}).get(route)
+        route_metrics.record(route, request.method, timing)
+        response['Server-Timing'] = timing.server_timing()
+        response.timing = timing
+
+        if timing.over_budget:
+            message = f'{request.method} {route} ran {timing.queries} queries, the budget is {timing.budget}'
+            if getattr(settings, 'QUERY_BUDGET_RAISE', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def process_template_response(self, request, response):
+        # Runs right before a DRF/template response is rendered
+        timing = request.timing
+        timing.render_started = time.perf_counter()
+
+        def rendered(response):
+            timing.render += time.perf_counter() - timing.render_started
+        response.add_post_render_callback(rendered)
+        return response
+
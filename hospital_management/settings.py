@@ -1,8 +1,9 @@
 
+import tempfile
 from datetime import timedelta
 from pathlib import Path
-import cloudinary
 from decouple import config
+from django.core.exceptions import ImproperlyConfigured
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -26,6 +27,8 @@ CORS_ALLOW_CREDENTIALS = True
 
 # Custom User Model
 AUTH_USER_MODEL = "users.User"
+# ModelBackend with permission sets cached in the 'users' cache
+AUTHENTICATION_BACKENDS = ['users.backends.CachedPermissionBackend']
 # Application definition
 
 INSTALLED_APPS = [
@@ -36,18 +39,23 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     "corsheaders",
     'drf_yasg',
     'hospital',
     'rest_framework',
+    'django_filters',
     'djoser',
     'users',
-    'cloudinary',
+    'tasks',
+    # Media storage only; the `cloudinary` app (template tags, CloudinaryField)
+    # isn't used and its import was the slowest part of app loading
     'cloudinary_storage',
 
 ]
 
 MIDDLEWARE = [
+    'hospital_management.middleware.QueryMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     "whitenoise.middleware.WhiteNoiseMiddleware",
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -90,6 +98,22 @@ WSGI_APPLICATION = 'hospital_management.wsgi.app'
 # }
 
 # Database (PostgreSQL)
+# Connections are reused instead of paying the TCP+TLS+auth handshake on
+# every request:
+#   DB_CONN_MAX_AGE   seconds a connection is kept between requests (0 closes it
+#                     after each request). Health checks ping a reused connection
+#                     once per request and reconnect if the server dropped it.
+#   DB_POOL           psycopg 3 connection pool (psycopg_pool) inside each
+#                     process; needed to reuse connections under ASGI, where
+#                     every request runs in its own thread. Persistent connections
+#                     are turned off with it.
+#   DB_PGBOUNCER      the host is a transaction-pooling PgBouncer (or a hosted
+#                     pooler such as Supabase/Neon); server-side cursors don't
+#                     survive it, so exports read the rows client side.
+DB_CONN_MAX_AGE = config('DB_CONN_MAX_AGE', default=60, cast=int)
+DB_POOL = config('DB_POOL', default=False, cast=bool)
+DB_PGBOUNCER = config('DB_PGBOUNCER', default=False, cast=bool)
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -97,9 +121,29 @@ DATABASES = {
         'USER': config('user'),
         'PASSWORD': config('password'),
         'HOST': config('host'),
-        'PORT': config('port')
+        'PORT': config('port'),
+        'CONN_MAX_AGE': 0 if DB_POOL else DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool),
+        'DISABLE_SERVER_SIDE_CURSORS': DB_PGBOUNCER,
+        'OPTIONS': {
+            'connect_timeout': config('DB_CONNECT_TIMEOUT', default=10, cast=int),
+        },
     }
 }
+if config('DB_SSLMODE', default=''):
+    DATABASES['default']['OPTIONS']['sslmode'] = config('DB_SSLMODE')
+if DB_POOL:
+    try:
+        from psycopg_pool import ConnectionPool
+    except ImportError:
+        raise ImproperlyConfigured('DB_POOL needs psycopg 3 with the pool extra: pip install "psycopg[pool]"')
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+        'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+        'timeout': config('DB_POOL_TIMEOUT', default=10, cast=int),
+        # Checked out connections are pinged first, like CONN_HEALTH_CHECKS
+        'check': ConnectionPool.check_connection,
+    }
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -119,13 +163,43 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Media storage
+# 'cloudinary', or 'local' to keep media files in MEDIA_ROOT (development).
+MEDIA_STORAGE = config('MEDIA_STORAGE', default='cloudinary')
+if MEDIA_STORAGE not in ('cloudinary', 'local'):
+    raise ImproperlyConfigured("MEDIA_STORAGE must be 'cloudinary' or 'local'.")
+
 # Cloudinary
-cloudinary.config( 
-  cloud_name = config('cloud_name'), 
-  api_key = config('cloudinary_api_key'), 
-  api_secret = config('api_secret'),
+# Read by cloudinary_storage, which configures the client when the media
+# storage is first used rather than at import. Missing credentials are left
+# out, so that first use raises ImproperlyConfigured.
+CLOUDINARY_STORAGE = {
+    key: value for key, value in (
+        ('CLOUD_NAME', config('cloud_name', default='')),
+        ('API_KEY', config('cloudinary_api_key', default='')),
+        ('API_SECRET', config('api_secret', default='')),
+    ) if value
+}
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Lab report uploads (hospital.uploads): clients get a signed ticket, upload
+# straight to storage (or in chunks through the API) and confirm. The local
+# backend stands in for Cloudinary when media lives in MEDIA_ROOT.
+UPLOAD_BACKEND = (
+    'hospital.uploads.LocalUploadBackend' if MEDIA_STORAGE == 'local'
+    else 'hospital.uploads.CloudinaryUploadBackend'
 )
-DEFAULT_FILE_STORAGE = "cloudinary_storage.storage.MediaCloudinaryStorage"
+UPLOAD_TICKET_MAX_AGE = config('UPLOAD_TICKET_MAX_AGE', default=3600, cast=int)
+UPLOAD_STAGING_DIR = config('UPLOAD_STAGING_DIR', default=str(Path(tempfile.gettempdir()) / 'hospital-uploads'))
+LAB_REPORT_MAX_UPLOAD_SIZE = config('LAB_REPORT_MAX_UPLOAD_SIZE', default=20 * 2**20, cast=int)
+
+# Tests keep media in a temporary directory, whatever MEDIA_STORAGE says
+TEST_RUNNER = 'hospital_management.testing.LocalMediaTestRunner'
+
+# Minutes every booked appointment takes from the doctor's schedule when
+# finding free slots, whatever `slot` size the availability grid uses
+APPOINTMENT_MINUTES = config('APPOINTMENT_MINUTES', default=15, cast=int)
 
 # Internationalization
 # https://docs.djangoproject.com/en/6.0/topics/i18n/
@@ -144,7 +218,101 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / "staticfiles"
-STATICFILES_STORAGE="whitenoise.storage.CompressedStaticFilesStorage"
+
+# Storage backends are instantiated on first access
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage' if MEDIA_STORAGE == 'local'
+        else 'cloudinary_storage.storage.MediaCloudinaryStorage',
+    },
+    # Generated files (invoice PDFs, exports) as raw resources: the media
+    # storage uploads image resources, which Cloudinary refuses for CSV
+    'documents': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage' if MEDIA_STORAGE == 'local'
+        else 'cloudinary_storage.storage.RawMediaCloudinaryStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedStaticFilesStorage',
+    },
+}
+
+# Cold start budget: milliseconds from importing the settings to a loaded
+# URLconf and middleware chain, i.e. what a new serverless instance pays
+# before its first request. Checked by `manage.py startup_profile`.
+COLD_START_BUDGET_MS = config('COLD_START_BUDGET_MS', default=1500, cast=int)
+
+# Most SQL queries a GET request to each route may run, checked by
+# QueryMetricsMiddleware and hospital_management.testing. Counts include
+# the conditional GET fingerprint and one query for the JWT user, which
+# is only run on a user cache miss.
+QUERY_BUDGETS = {
+    'patient-list': 3,
+    'department-list': 5,
+    'doctor-list': 3,
+    'department-doctors-list': 3,
+    'appointment-list': 3,
+    'patient-appointments-list': 3,
+    'doctor-appointments-list': 3,
+    'appointment-detail': 3,
+    'schedule-list': 3,
+    'ward-list': 3,
+    'room-list': 4,
+    'admission-list': 3,
+    'treatment-list': 3,
+    'medication-list': 3,
+    'nurse-list': 4,
+    'labtest-list': 3,
+    'labreport-list': 3,
+    'prescription-list': 3,
+    'invoice-list': 4,
+    'patient-invoices-list': 4,
+    'payment-list': 4,
+    'invoice-payments-list': 4,
+    'async-patient-list': 3,
+    'async-doctor-list': 3,
+    'async-appointment-list': 3,
+    'async-appointment-detail': 3,
+    'async-room-list': 4,
+}
+QUERY_BUDGET_RAISE = config('QUERY_BUDGET_RAISE', default=False, cast=bool)
+# /metrics/ is served to staff users and to scrapers sending this bearer
+# token; unset, only staff can read it
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Response cache for reference data (departments, doctors, wards, lab tests).
+# Local-memory LRU per process by default; point RESPONSE_CACHE_URL at Redis
+# to share it between workers.
+RESPONSE_CACHE_URL = config('RESPONSE_CACHE_URL', default='')
+RESPONSE_CACHE_TIMEOUT = config('RESPONSE_CACHE_TIMEOUT', default=300, cast=int)
+USER_CACHE_URL = config('USER_CACHE_URL', default=RESPONSE_CACHE_URL)
+# Seconds a user's state may be served from the cache; saves and group or
+# permission changes drop it straight away
+USER_CACHE_TIMEOUT = config('USER_CACHE_TIMEOUT', default=60, cast=int)
+PERMISSION_CACHE_TIMEOUT = config('PERMISSION_CACHE_TIMEOUT', default=300, cast=int)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': RESPONSE_CACHE_URL,
+    } if RESPONSE_CACHE_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'responses',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+    # User rows for CachedJWTAuthentication and permission sets for
+    # CachedPermissionBackend; share it through Redis with
+    # USER_CACHE_URL so every worker sees invalidations at once
+    'users': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': USER_CACHE_URL,
+    } if USER_CACHE_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'users',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
 
 REST_FRAMEWORK = {
     # Use Django's standard `django.contrib.auth` permissions,
@@ -153,9 +321,18 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny'
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ),
-    
+    'DEFAULT_FILTER_BACKENDS': [
+        'django_filters.rest_framework.DjangoFilterBackend',
+        'hospital.filters.IndexedOrderingFilter',
+    ],
+    # Opt-in per request: lists are bare arrays unless ?page_size= (at most
+    # 500) or a cursor is given, then {next, previous, results} of PAGE_SIZE
+    'DEFAULT_PAGINATION_CLASS': 'hospital.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
+    # Money is stored as Decimal but rendered as JSON numbers, as before
+    'COERCE_DECIMAL_TO_STRING': False,
 }
 
 SIMPLE_JWT = {
@@ -187,12 +364,25 @@ DJOSER = {
 }
 
 # Email
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
-EMAIL_HOST = config('EMAIL_HOST')
-EMAIL_USE_TLS = config('EMAIL_USE_TLS', cast=bool)
-EMAIL_PORT = config('EMAIL_PORT')
-EMAIL_HOST_USER = config('EMAIL_HOST_USER')
-EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
+# Messages (e.g. djoser's activation emails) are queued as jobs and sent by
+# the worker through QUEUED_EMAIL_BACKEND. The SMTP connection is only
+# opened when a message is sent, so missing settings fail there rather than
+# at import.
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='tasks.mail.QueuedEmailBackend')
+QUEUED_EMAIL_BACKEND = config('QUEUED_EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
+EMAIL_HOST = config('EMAIL_HOST', default='localhost')
+EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=False, cast=bool)
+EMAIL_PORT = config('EMAIL_PORT', default=25, cast=int)
+EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
+EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
+
+# Background jobs (tasks app), run by `manage.py run_worker`. TASKS_EAGER
+# runs each job in the web process right after the request commits, for
+# development without a worker. Running jobs refresh their lock every third
+# of TASKS_STALE_AFTER seconds; a job whose lock is older than that lost its
+# worker and is retried.
+TASKS_EAGER = config('TASKS_EAGER', default=False, cast=bool)
+TASKS_STALE_AFTER = config('TASKS_STALE_AFTER', default=600, cast=int)
 
 BACKEND_URL = config("BACKEND_URL")
 FRONTEND_URL = config("FRONTEND_URL")
\ No newline at end of file
@@ -0,0 +1,59 @@
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+# ==========================
+# Query budget assertions
+# ==========================
+class QueryBudgetTestMixin:
+    """
+    TestCase mixin that checks responses against QUERY_BUDGETS.
+
+        class AppointmentApiTests(QueryBudgetTestMixin, APITestCase):
+            def test_list(self):
+                self.assertWithinQueryBudget(self.client.get('/api/v1/appointments/'))
+
+    The numbers come from QueryMetricsMiddleware, which must be installed.
+    """
+
+    def assertWithinQueryBudget(self, response, budget=None):
+        timing = getattr(response, 'timing', None)
+        self.assertIsNotNone(timing, 'No query metrics on the response; is QueryMetricsMiddleware installed?')
+        route = response.wsgi_request.resolver_match.view_name
+        if budget is None:
+            budget = getattr(settings, 'QUERY_BUDGETS', {}).get(route)
+        self.assertIsNotNone(budget, f'No query budget declared for {route}.')
+        self.assertLessEqual(
+            timing.queries, budget, f'{route} ran {timing.queries} queries, the budget is {budget}.'
+        )
+
+
+# ==========================
+# Test runner
+# ==========================
+class LocalMediaTestRunner(DiscoverRunner):
+    """
+    DiscoverRunner that keeps media files and uploads in a temporary
+    directory, so the suite needs no Cloudinary credentials and never
+    uploads anything.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.media = tempfile.TemporaryDirectory()
+        local = {'BACKEND': 'django.core.files.storage.FileSystemStorage', 'OPTIONS': {'location': self.media.name}}
+        self.local_media = override_settings(
+            STORAGES={**settings.STORAGES, 'default': local, 'documents': local},
+            UPLOAD_BACKEND='hospital.uploads.LocalUploadBackend',
+            UPLOAD_STAGING_DIR=str(Path(self.media.name) / 'staging'),
+        )
+        self.local_media.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.local_media.disable()
+        self.media.cleanup()
+        super().teardown_test_environment(**kwargs)
@@ -4,7 +4,7 @@ from django.urls import path,include
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
-from hospital_management.views import Home
+from hospital_management.views import Home, metrics
 
 
 schema_view = get_schema_view(
@@ -22,7 +22,9 @@ schema_view = get_schema_view(
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('',include('hospital.urls')),
+    path('',include('tasks.urls')),
     path('',Home),
+    path('metrics/', metrics, name='metrics'),
     path('api-auth/', include('rest_framework.urls')),
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
@@ -1,9 +1,72 @@
-
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
 
+from hospital.cache import response_cache
+from hospital_management.middleware import DURATION_BUCKETS, route_metrics
+
 @api_view(['GET'])
 def Home(request):
     return Response({'message':' backend running'})
 
 
+def can_read_metrics(request):
+    """Staff users, or a scraper sending `Authorization: Bearer <METRICS_TOKEN>`."""
+    if getattr(request, 'user', None) is not None and request.user.is_staff:
+        return True
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    return bool(settings.METRICS_TOKEN) and scheme.lower() == 'bearer' and constant_time_compare(token, settings.METRICS_TOKEN)
+
+
+def metrics(request):
+    """Prometheus text exposition of the per-route request metrics."""
+    if not can_read_metrics(request):
+        response = HttpResponse('Authentication required.\n', status=401, content_type='text/plain')
+        response['WWW-Authenticate'] = 'Bearer realm="metrics"'
+        return response
+    routes = route_metrics.snapshot()
+    lines = []
+
+    def family(name, kind, help_text, samples):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.extend(samples)
+
+    def labels(route, method, **extra):
+        pairs = {'route': route, 'method': method, **extra}
+        return '{' + ','.join(f'{key}="{value}"' for key, value in pairs.items()) + '}'
+
+    family('http_requests_total', 'counter', 'Requests handled.', [
+        f'http_requests_total{labels(*key)} {stats["requests"]}' for key, stats in routes.items()
+    ])
+    family('http_db_queries_total', 'counter', 'SQL queries run.', [
+        f'http_db_queries_total{labels(*key)} {stats["queries"]}' for key, stats in routes.items()
+    ])
+    for part, help_text in (('db', 'Time spent in SQL.'),
+                            ('app', 'Time spent in Python outside SQL, serializers and rendering.'),
+                            ('serialize', 'Time spent in serializers, without their SQL.'),
+                            ('render', 'Time spent rendering responses.')):
+        name = f'http_{part}_seconds_total'
+        family(name, 'counter', help_text, [
+            f'{name}{labels(*key)} {stats[part]:.6f}' for key, stats in routes.items()
+        ])
+    family('http_query_budget_exceeded_total', 'counter', 'Requests over their query budget.', [
+        f'http_query_budget_exceeded_total{labels(*key)} {stats["over_budget"]}' for key, stats in routes.items()
+    ])
+
+    samples = []
+    for key, stats in routes.items():
+        for bound, count in zip(DURATION_BUCKETS, stats['buckets']):
+            samples.append(f'http_request_duration_seconds_bucket{labels(*key, le=bound)} {count}')
+        samples.append(f'http_request_duration_seconds_bucket{labels(*key, le="+Inf")} {stats["requests"]}')
+        samples.append(f'http_request_duration_seconds_sum{labels(*key)} {stats["total"]:.6f}')
+        samples.append(f'http_request_duration_seconds_count{labels(*key)} {stats["requests"]}')
+    family('http_request_duration_seconds', 'histogram', 'Request latency.', samples)
+
+    family('response_cache_requests_total', 'counter', 'Response cache lookups.', [
+        f'response_cache_requests_total{{viewset="{name}",outcome="{outcome}"}} {count}'
+        for name, counts in response_cache.stats().items() for outcome, count in counts.items()
+    ])
+    return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,10 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'queue', 'status', 'attempts', 'run_at', 'created_at', 'finished_at')
+    list_filter = ('status', 'queue', 'name')
+    readonly_fields = ('locked_by', 'locked_at', 'last_error', 'result', 'created_at', 'finished_at')
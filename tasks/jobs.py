@@ -0,0 +1,23 @@
+import base64
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+
+from .queue import task
+
+
+# ==========================
+# Email
+# ==========================
+@task(queue='email', max_attempts=8, backoff=60)
+def send_email(message):
+    """Send a message serialized by tasks.mail.QueuedEmailBackend."""
+    email = EmailMultiAlternatives(
+        subject=message['subject'], body=message['body'], from_email=message['from_email'],
+        to=message['to'], cc=message['cc'], bcc=message['bcc'], reply_to=message['reply_to'],
+        headers=message['headers'], alternatives=[tuple(alternative) for alternative in message['alternatives']],
+        connection=get_connection(settings.QUEUED_EMAIL_BACKEND, fail_silently=False),
+    )
+    for filename, content, mimetype in message['attachments']:
+        email.attach(filename, base64.b64decode(content), mimetype)
+    email.send()
@@ -0,0 +1,53 @@
+import base64
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    """
+    Email backend that queues each message as a send_email job instead of
+    talking to the mail server in the request. The worker sends it through
+    QUEUED_EMAIL_BACKEND (SMTP by default) and retries if the server is
+    down. Messages with MIME attachments that can't be stored as JSON are
+    sent straight away.
+    """
+
+    def send_messages(self, email_messages):
+        from .jobs import send_email
+
+        sent = 0
+        for message in email_messages:
+            if not message.recipients():
+                continue
+            data = serialize(message)
+            if data is None:
+                sent += get_connection(settings.QUEUED_EMAIL_BACKEND, fail_silently=self.fail_silently).send_messages([message])
+                continue
+            send_email.enqueue(data)
+            sent += 1
+        return sent
+
+
+def serialize(message):
+    attachments = []
+    for attachment in message.attachments:
+        if not isinstance(attachment, tuple):
+            return None
+        filename, content, mimetype = attachment
+        if isinstance(content, str):
+            content = content.encode()
+        attachments.append((filename, base64.b64encode(content).decode(), mimetype))
+    return {
+        'subject': str(message.subject),
+        'body': str(message.body),
+        'from_email': message.from_email,
+        'to': list(message.to),
+        'cc': list(message.cc),
+        'bcc': list(message.bcc),
+        'reply_to': list(message.reply_to),
+        'headers': dict(message.extra_headers),
+        'alternatives': [(str(content), mimetype) for content, mimetype in getattr(message, 'alternatives', [])],
+        'attachments': attachments,
+    }
@@ -0,0 +1,84 @@
+import os
+import signal
+import socket
+import threading
+import time as clock
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections, connections
+
+from tasks import queue
+
+
+class Command(BaseCommand):
+    help = (
+        "Run background jobs from the database queue. Each of --concurrency "
+        "threads claims one due job at a time (SELECT ... FOR UPDATE SKIP LOCKED "
+        "on PostgreSQL), so several workers can share the queue. Failed jobs are "
+        "retried with backoff. Running jobs refresh their lock, and jobs of a worker "
+        "that died are put back once their lock is TASKS_STALE_AFTER seconds old. "
+        "Stops after the running jobs on SIGINT/SIGTERM."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queues', default='default,email,documents', help='Comma-separated queues to take jobs from.')
+        parser.add_argument('--concurrency', type=int, default=2, help='Jobs run at once by this worker.')
+        parser.add_argument('--poll', type=float, default=1.0, help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--burst', action='store_true', help='Exit once no job is due, e.g. from cron.')
+
+    def handle(self, *args, **options):
+        queues = options['queues'].split(',')
+        name = f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = threading.Event()
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+
+        requeued, failed = queue.requeue_stale(settings.TASKS_STALE_AFTER)
+        if requeued or failed:
+            self.stdout.write(f'Stale jobs: {requeued} requeued, {failed} failed.')
+        self.stdout.write(f"Worker {name}: {options['concurrency']} thread(s) on {', '.join(queues)}")
+
+        threads = [
+            threading.Thread(target=self.work, args=(f'{name}:{index}', queues, options['poll'], options['burst']))
+            for index in range(options['concurrency'])
+        ]
+        for thread in threads:
+            thread.start()
+        last_check = clock.monotonic()
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=1)
+            if clock.monotonic() - last_check > settings.TASKS_STALE_AFTER / 2:
+                queue.requeue_stale(settings.TASKS_STALE_AFTER)
+                last_check = clock.monotonic()
+        connections.close_all()
+
+    def stop(self, signum, frame):
+        self.stdout.write('Stopping after the running jobs...')
+        self.stopping.set()
+
+    def work(self, worker, queues, poll, burst):
+        try:
+            while not self.stopping.is_set():
+                close_old_connections()
+                try:
+                    job = queue.claim(worker, queues)
+                except DatabaseError as error:
+                    # e.g. the database restarting; keep the thread alive
+                    self.stderr.write(f'{worker}: {error}')
+                    self.stopping.wait(poll)
+                    continue
+                if job is None:
+                    if burst:
+                        break
+                    self.stopping.wait(poll)
+                    continue
+                started = clock.perf_counter()
+                ok = queue.execute(job)
+                self.stdout.write(
+                    f"{job.name} {job.pk} attempt {job.attempts}: "
+                    f"{'done' if ok else 'failed'} in {(clock.perf_counter() - started) * 1000:.0f}ms"
+                )
+        finally:
+            connections.close_all()
@@ -0,0 +1,53 @@
+import uuid
+
+from django.conf import settings
+from django.db import models
+
+
+# ==========================
+# Job
+# ==========================
+class Job(models.Model):
+    """One call of a registered task, queued in the database (see tasks.queue)."""
+    STATUS_CHOOSE = [
+        ('queued', 'QUEUED'),
+        ('running', 'RUNNING'),
+        ('done', 'DONE'),
+        ('failed', 'FAILED'),
+    ]
+
+    # Unguessable, since /jobs/<id>/ hands out results such as export links
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    name = models.CharField(max_length=200)
+    queue = models.CharField(max_length=50, default='default')
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOOSE, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField()
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    # Who queued it (Task.enqueue_for): only they and staff can see the job
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs',
+    )
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # What workers poll for: due jobs of their queues
+            models.Index(
+                fields=['queue', 'run_at'], name='job_due_idx', condition=models.Q(status='queued'),
+            ),
+            # Per-task concurrency limits and stale job recovery
+            models.Index(
+                fields=['name', 'locked_at'], name='job_running_idx', condition=models.Q(status='running'),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
@@ -0,0 +1,225 @@
+import json
+import logging
+import random
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# name -> Task
+REGISTRY = {}
+MAX_BACKOFF = 6 * 60 * 60
+
+
+# ==========================
+# Tasks
+# ==========================
+class Task:
+    """
+    A function that runs on a worker. `enqueue()` stores the call as a Job
+    row in the current transaction, so it is only picked up if that commits.
+    Arguments and the result must be JSON serializable. `enqueue_for()`
+    records the user the job is for, who can then follow it at /jobs/<id>/.
+
+    A failed attempt is retried after `backoff` seconds, doubling each time
+    (with jitter), until `max_attempts`. `concurrency` caps how many of
+    these jobs run at once across all workers.
+    """
+
+    def __init__(self, func, name=None, queue='default', max_attempts=5, backoff=30, concurrency=None):
+        self.func = func
+        self.name = name or f'{func.__module__}.{func.__qualname__}'
+        self.queue = queue
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.concurrency = concurrency
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def enqueue(self, *args, **kwargs):
+        return self.enqueue_at(timezone.now(), *args, **kwargs)
+
+    def enqueue_at(self, run_at, *args, **kwargs):
+        return self.schedule(run_at, None, args, kwargs)
+
+    def enqueue_for(self, user, *args, **kwargs):
+        return self.schedule(timezone.now(), user, args, kwargs)
+
+    def schedule(self, run_at, user, args, kwargs):
+        job = Job.objects.create(
+            name=self.name, queue=self.queue, args=list(args), kwargs=kwargs,
+            max_attempts=self.max_attempts, run_at=run_at, user=user,
+        )
+        if settings.TASKS_EAGER:
+            # No worker (development): run it here once the caller commits
+            transaction.on_commit(lambda: run_now(job.pk))
+        return job
+
+    def retry_delay(self, attempts):
+        delay = min(self.backoff * 2 ** (attempts - 1), MAX_BACKOFF)
+        return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def task(func=None, **options):
+    """Register a function as a task: `@task` or `@task(max_attempts=3, concurrency=2)`."""
+    def register(func):
+        registered = Task(func, **options)
+        REGISTRY[registered.name] = registered
+        return registered
+    return register(func) if func is not None else register
+
+
+# ==========================
+# Running jobs
+# ==========================
+def claim(worker, queues):
+    """Take the next due job of `queues` for `worker`, or None."""
+    now = timezone.now()
+    full = set()
+    while True:
+        with transaction.atomic():
+            candidate = (
+                Job.objects.select_for_update(skip_locked=True)
+                .filter(status='queued', queue__in=queues, run_at__lte=now)
+                .exclude(name__in=full)
+                .order_by('run_at')
+                .only('pk', 'name')
+                .first()
+            )
+            if candidate is None:
+                return None
+            registered = REGISTRY.get(candidate.name)
+            if registered is not None and registered.concurrency:
+                # Counted under the task's lock and claimed in the same
+                # transaction, so concurrent claims can't both see a free place
+                lock_task(candidate.name)
+                if Job.objects.filter(status='running', name=candidate.name).count() >= registered.concurrency:
+                    full.add(candidate.name)
+                    continue
+            # Conditional, so two workers can't both win on backends without row locks
+            claimed = Job.objects.filter(pk=candidate.pk, status='queued').update(
+                status='running', locked_by=worker, locked_at=now, attempts=F('attempts') + 1,
+            )
+        if claimed:
+            return Job.objects.get(pk=candidate.pk)
+
+
+def lock_task(name):
+    """
+    Hold a lock on the task name until the transaction ends: a PostgreSQL
+    advisory lock. Other backends (SQLite) only allow one writer at a time.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(hashtext(%s))', [f'tasks.{name}'])
+
+
+class Heartbeat(threading.Thread):
+    """
+    Refreshes a running job's locked_at until stopped, so requeue_stale
+    only takes back jobs whose worker stopped, however long they run.
+    """
+
+    def __init__(self, job, interval):
+        super().__init__(name=f'heartbeat-{job.pk}', daemon=True)
+        self.job = job
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(self.interval):
+                try:
+                    Job.objects.filter(pk=self.job.pk, status='running', locked_by=self.job.locked_by).update(
+                        locked_at=timezone.now(),
+                    )
+                except DatabaseError:
+                    logger.exception('Heartbeat of job %s (%s) failed', self.job.pk, self.job.name)
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def execute(job):
+    """Run a claimed job and record the outcome: done, retry later or failed."""
+    registered = REGISTRY.get(job.name)
+    heartbeat = Heartbeat(job, settings.TASKS_STALE_AFTER / 3)
+    heartbeat.start()
+    try:
+        if registered is None:
+            raise LookupError(f'No task named {job.name}; is its module listed in a jobs.py?')
+        result = registered.func(*job.args, **job.kwargs)
+        # Inside the try: a result that isn't JSON, or a database error
+        # while saving it, fails the attempt like an error in the task
+        json.dumps(result)
+        finish(job, 'done', result=result, finished_at=timezone.now())
+    except Exception:
+        record_failure(job, registered, traceback.format_exc())
+        return False
+    finally:
+        heartbeat.stop()
+    return True
+
+
+def record_failure(job, registered, error):
+    try:
+        if registered is not None and job.attempts < job.max_attempts:
+            retry_at = timezone.now() + registered.retry_delay(job.attempts)
+            logger.warning('Job %s (%s) failed, attempt %s of %s; retrying at %s', job.pk, job.name, job.attempts, job.max_attempts, retry_at)
+            finish(job, 'queued', last_error=error, run_at=retry_at)
+        else:
+            logger.error('Job %s (%s) failed for good after %s attempt(s)', job.pk, job.name, job.attempts)
+            finish(job, 'failed', last_error=error, finished_at=timezone.now())
+    except DatabaseError:
+        # The job stays running; requeue_stale takes it back
+        logger.exception('Could not record the failure of job %s (%s)', job.pk, job.name)
+
+
+def finish(job, status, **fields):
+    # Only while still ours: a job requeued as stale may have moved on
+    updated = Job.objects.filter(pk=job.pk, status='running', locked_by=job.locked_by).update(
+        status=status, locked_by='', locked_at=None, **fields,
+    )
+    if not updated:
+        logger.error(
+            'Job %s (%s) was taken back as stale while it ran; its outcome (%s) is discarded',
+            job.pk, job.name, status,
+        )
+    return bool(updated)
+
+
+def run_now(job_id):
+    """Run a queued job in this process, e.g. with TASKS_EAGER."""
+    with transaction.atomic():
+        claimed = Job.objects.filter(pk=job_id, status='queued').update(
+            status='running', locked_by='eager', locked_at=timezone.now(), attempts=F('attempts') + 1,
+        )
+    if claimed:
+        execute(Job.objects.get(pk=job_id))
+
+
+def requeue_stale(stale_after):
+    """Put back jobs whose worker died mid-run; they count as a failed attempt."""
+    cutoff = timezone.now() - timedelta(seconds=stale_after)
+    stale = Job.objects.filter(status='running', locked_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status='failed', locked_by='', locked_at=None, finished_at=timezone.now(),
+        last_error='The worker stopped responding.',
+    )
+    requeued = stale.update(
+        status='queued', locked_by='', locked_at=None, run_at=timezone.now(),
+        last_error='The worker stopped responding.',
+    )
+    return requeued, failed
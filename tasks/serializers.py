@@ -0,0 +1,16 @@
+from rest_framework import serializers
+
+from .models import Job
+
+
+# -------------------------------
+# Job Serializer
+# -------------------------------
+class JobSerializer(serializers.ModelSerializer):
+    url = serializers.HyperlinkedIdentityField(view_name='job-detail')
+
+    class Meta:
+        model = Job
+        # Tracebacks (last_error) stay in the admin
+        fields = ['id', 'url', 'name', 'status', 'attempts', 'max_attempts', 'run_at', 'result', 'created_at', 'finished_at']
+        read_only_fields = fields
@@ -0,0 +1,225 @@
+from datetime import timedelta
+from email.mime.base import MIMEBase
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.db import DatabaseError
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from hospital.models import Invoice, Patient
+
+from . import queue
+from .models import Job
+from .queue import MAX_BACKOFF, task
+
+
+@task(name='tests.add', max_attempts=3, backoff=10)
+def add(a, b):
+    return {'sum': a + b}
+
+
+@task(name='tests.fail', max_attempts=2, backoff=10)
+def fail():
+    raise RuntimeError('boom')
+
+
+@task(name='tests.not_json', max_attempts=1)
+def not_json():
+    return {1, 2}
+
+
+@task(name='tests.single', concurrency=1)
+def single():
+    return None
+
+
+def make_job(name='tests.add', args=(1, 2), **fields):
+    return Job.objects.create(name=name, args=list(args), run_at=fields.pop('run_at', timezone.now()), **fields)
+
+
+# ==========================
+# Claiming jobs
+# ==========================
+class ClaimTests(APITestCase):
+    def test_due_jobs_in_run_at_order(self):
+        later = make_job(run_at=timezone.now() - timedelta(seconds=1))
+        first = make_job(run_at=timezone.now() - timedelta(seconds=5))
+        make_job(run_at=timezone.now() + timedelta(minutes=5))
+        make_job(queue='email')
+
+        job = queue.claim('worker-1', ['default'])
+        self.assertEqual(job.pk, first.pk)
+        self.assertEqual((job.status, job.locked_by, job.attempts), ('running', 'worker-1', 1))
+        self.assertIsNotNone(job.locked_at)
+        self.assertEqual(queue.claim('worker-2', ['default']).pk, later.pk)
+        # Not due yet, or another queue
+        self.assertIsNone(queue.claim('worker-3', ['default']))
+
+    def test_concurrency_limit(self):
+        make_job('tests.single', args=(), status='running', locked_by='worker-1', locked_at=timezone.now())
+        waiting = make_job('tests.single', args=(), run_at=timezone.now() - timedelta(seconds=5))
+        other = make_job()
+        # The full task is skipped, not the whole queue
+        self.assertEqual(queue.claim('worker-2', ['default']).pk, other.pk)
+        self.assertIsNone(queue.claim('worker-2', ['default']))
+
+        Job.objects.filter(status='running', name='tests.single').update(status='done')
+        self.assertEqual(queue.claim('worker-2', ['default']).pk, waiting.pk)
+
+
+# ==========================
+# Running jobs
+# ==========================
+class ExecuteTests(APITestCase):
+    def run_job(self, job):
+        claimed = queue.claim('worker-1', [job.queue])
+        self.assertEqual(claimed.pk, job.pk)
+        ok = queue.execute(claimed)
+        job.refresh_from_db()
+        return ok
+
+    def test_done(self):
+        job = make_job()
+        self.assertTrue(self.run_job(job))
+        self.assertEqual((job.status, job.result, job.attempts), ('done', {'sum': 3}, 1))
+        self.assertEqual((job.locked_by, job.locked_at), ('', None))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_failed_attempts_are_retried_with_backoff(self):
+        job = make_job('tests.fail', args=(), max_attempts=2)
+        before = timezone.now()
+        self.assertFalse(self.run_job(job))
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertIn('RuntimeError: boom', job.last_error)
+        # backoff=10: 10s, with up to 20% jitter
+        self.assertGreaterEqual(job.run_at, before + timedelta(seconds=8))
+        self.assertLessEqual(job.run_at, timezone.now() + timedelta(seconds=12))
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        self.assertFalse(self.run_job(job))
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_retry_delay_doubles_up_to_the_cap(self):
+        for attempts, seconds in [(1, 10), (2, 20), (4, 80), (30, MAX_BACKOFF)]:
+            with self.subTest(attempts=attempts):
+                delay = fail.retry_delay(attempts).total_seconds()
+                self.assertGreaterEqual(delay, seconds * 0.8)
+                self.assertLessEqual(delay, seconds * 1.2)
+
+    def test_result_that_is_not_json_fails_the_job(self):
+        job = make_job('tests.not_json', args=(), max_attempts=1)
+        self.assertFalse(self.run_job(job))
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('TypeError', job.last_error)
+
+    def test_database_error_while_recording_keeps_the_worker_alive(self):
+        job = make_job()
+        claimed = queue.claim('worker-1', ['default'])
+        with mock.patch.object(queue, 'finish', side_effect=DatabaseError('connection lost')):
+            self.assertFalse(queue.execute(claimed))
+        # Left running for requeue_stale
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'running')
+
+    def test_unknown_task_fails_for_good(self):
+        job = make_job('tests.removed')
+        self.assertFalse(self.run_job(job))
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('No task named tests.removed', job.last_error)
+
+    def test_outcome_of_a_job_taken_back_is_discarded(self):
+        job = make_job()
+        claimed = queue.claim('worker-1', ['default'])
+        Job.objects.filter(pk=job.pk).update(locked_by='worker-2')
+        queue.execute(claimed)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result), ('running', None))
+
+    def test_requeue_stale(self):
+        old = timezone.now() - timedelta(seconds=700)
+        stale = make_job(status='running', locked_by='worker-1', locked_at=old, attempts=1)
+        spent = make_job(status='running', locked_by='worker-1', locked_at=old, attempts=3, max_attempts=3)
+        alive = make_job(status='running', locked_by='worker-2', locked_at=timezone.now(), attempts=1)
+
+        self.assertEqual(queue.requeue_stale(600), (1, 1))
+        for job in (stale, spent, alive):
+            job.refresh_from_db()
+        self.assertEqual((stale.status, stale.locked_by), ('queued', ''))
+        self.assertEqual(stale.last_error, 'The worker stopped responding.')
+        self.assertEqual(spent.status, 'failed')
+        self.assertEqual(alive.status, 'running')
+
+
+# ==========================
+# Email
+# ==========================
+@override_settings(
+    EMAIL_BACKEND='tasks.mail.QueuedEmailBackend',
+    QUEUED_EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+)
+class QueuedEmailTests(APITestCase):
+    def test_messages_are_sent_by_the_worker(self):
+        message = mail.EmailMultiAlternatives('Results', 'Ready', 'lab@example.com', ['patient@example.com'])
+        message.attach_alternative('<p>Ready</p>', 'text/html')
+        message.attach('report.txt', 'all clear', 'text/plain')
+        self.assertEqual(message.send(), 1)
+        self.assertEqual(mail.outbox, [])
+
+        job = queue.claim('worker-1', ['email'])
+        self.assertEqual(job.name, 'tasks.jobs.send_email')
+        self.assertTrue(queue.execute(job))
+        sent, = mail.outbox
+        self.assertEqual((sent.subject, sent.body, sent.to), ('Results', 'Ready', ['patient@example.com']))
+        self.assertEqual(sent.alternatives[0][0], '<p>Ready</p>')
+        self.assertEqual(sent.attachments[0][:2], ('report.txt', 'all clear'))
+
+    def test_mime_attachments_are_sent_straight_away(self):
+        message = mail.EmailMessage('Scan', 'Attached', 'lab@example.com', ['patient@example.com'])
+        message.attach(MIMEBase('application', 'octet-stream'))
+        self.assertEqual(message.send(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertFalse(Job.objects.exists())
+
+
+# ==========================
+# Job API
+# ==========================
+class JobApiTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        users = get_user_model().objects
+        cls.owner = users.create_user(email='owner@example.com', password='x', is_active=True)
+        cls.other = users.create_user(email='other@example.com', password='x', is_active=True)
+        cls.staff = users.create_user(email='staff@example.com', password='x', is_active=True, is_staff=True)
+        cls.job = add.enqueue_for(cls.owner, 1, 2)
+
+    def get(self, user=None):
+        self.client.force_authenticate(user)
+        return self.client.get(f'/api/v1/jobs/{self.job.pk}/')
+
+    def test_only_the_owner_and_staff_see_a_job(self):
+        self.assertEqual(self.get().status_code, 401)
+        self.assertEqual(self.get(self.other).status_code, 404)
+        self.assertEqual(self.get(self.owner).data['status'], 'queued')
+        self.assertEqual(self.get(self.staff).status_code, 200)
+
+    def test_queued_jobs_belong_to_the_user(self):
+        patient = Patient.objects.create(
+            first_name='Amina', last_name='Rahman', email='amina@example.com', phone='0100', gender='female',
+            dob='1990-01-01', blood_group='A+', address='-', emergency_contact='0100',
+        )
+        invoice = Invoice.objects.create(patient=patient, total_amount=100)
+        urls = [f'/api/v1/invoices/{invoice.pk}/pdf/', '/api/v1/payments/export/?output=csv']
+        for url in urls:
+            with self.subTest(url=url):
+                self.client.force_authenticate(None)
+                self.assertEqual(self.client.post(url).status_code, 401)
+                self.client.force_authenticate(self.owner)
+                response = self.client.post(url)
+                self.assertEqual(response.status_code, 202)
+                self.assertEqual(Job.objects.get(pk=response.data['id']).user, self.owner)
+                self.assertEqual(self.client.get(response.data['url']).status_code, 200)
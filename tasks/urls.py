@@ -0,0 +1,10 @@
+from rest_framework import routers
+from django.urls import path, include
+from .views import JobViewSet
+
+router = routers.SimpleRouter()
+router.register(r'jobs', JobViewSet)
+
+urlpatterns = [
+    path(r'api/v1/', include(router.urls)),
+]
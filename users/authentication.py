@@ -0,0 +1,101 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+# ==========================
+# User state cache
+# ==========================
+class UserCache:
+    """
+    Short-lived cache of users' column values, keyed by id.
+
+    The password hash isn't stored: it is deferred on the rebuilt instance
+    and only loaded if something reads it (e.g. djoser's set_password).
+    Entries are dropped by users.signals when a user, their groups or their
+    permissions change; queryset.update() skips those signals, so the
+    timeout bounds how long such a change can go unseen.
+    """
+
+    def __init__(self, alias='users', timeout=60, prefix='user'):
+        self.alias = alias
+        self.timeout = timeout
+        self.prefix = prefix
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def key(self, user_id):
+        return f'{self.prefix}:{user_id}'
+
+    def fields(self):
+        return [field for field in get_user_model()._meta.concrete_fields if field.attname != 'password']
+
+    def get(self, user_id):
+        """(user, password digest) from the cache, or None."""
+        state = self.backend.get(self.key(user_id))
+        if state is None:
+            return None
+        model = get_user_model()
+        fields = self.fields()
+        user = model.from_db('default', [field.attname for field in fields], [state[field.attname] for field in fields])
+        return user, state['password_digest']
+
+    def set(self, user):
+        state = {field.attname: getattr(user, field.attname) for field in self.fields()}
+        state['password_digest'] = get_md5_hash_password(user.password)
+        self.backend.set(self.key(user.pk), state, timeout=self.timeout)
+
+    def invalidate(self, *user_ids):
+        """Drop the users' entries once the current transaction commits."""
+        keys = [self.key(user_id) for user_id in user_ids]
+        if keys:
+            transaction.on_commit(lambda: self.backend.delete_many(keys))
+
+
+user_cache = UserCache(
+    alias=getattr(settings, 'USER_CACHE_ALIAS', 'users'),
+    timeout=getattr(settings, 'USER_CACHE_TIMEOUT', 60),
+)
+
+
+# ==========================
+# Authentication
+# ==========================
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that reads the token's user from user_cache, so an
+    authenticated request costs no query while the entry is fresh. Same
+    checks as simplejwt: the user must exist, be active and, with
+    CHECK_REVOKE_TOKEN, still have the password the token was issued for.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        cached = user_cache.get(user_id)
+        if cached is None:
+            try:
+                user = self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist as e:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+            user_cache.set(user)
+            password_digest = get_md5_hash_password(user.password)
+        else:
+            user, password_digest = cached
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != password_digest:
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
@@ -0,0 +1,108 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from django.db import transaction
+
+
+# ==========================
+# Permission cache
+# ==========================
+class PermissionCache:
+    """
+    Versioned cache of each user's permission names ("app_label.codename"),
+    kept as two frozensets: direct and through groups.
+
+    Entries carry the version current when they were computed. Changes
+    that touch a single user drop that user's entry; changes that may touch
+    many (a group's permissions, new or deleted permissions) bump the
+    version, so every older entry is recomputed on its next read. Both are
+    done by users.signals.
+    """
+
+    def __init__(self, alias='users', timeout=300, prefix='perms'):
+        self.alias = alias
+        self.timeout = timeout
+        self.prefix = prefix
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    @property
+    def version_key(self):
+        return f'{self.prefix}:version'
+
+    def key(self, user_id):
+        return f'{self.prefix}:{user_id}'
+
+    def get(self, user_id):
+        """((user perms, group perms) or None, current version)."""
+        values = self.backend.get_many([self.version_key, self.key(user_id)])
+        version = values.get(self.version_key)
+        if version is None:
+            # Start from the clock so an evicted version can't match old entries
+            version = time.time_ns()
+            self.backend.add(self.version_key, version, timeout=None)
+        entry = values.get(self.key(user_id))
+        if entry is None or entry[0] != version:
+            return None, version
+        return entry[1:], version
+
+    def set(self, user_id, version, user_perms, group_perms):
+        self.backend.set(self.key(user_id), (version, frozenset(user_perms), frozenset(group_perms)), timeout=self.timeout)
+
+    def invalidate(self, *user_ids):
+        """Drop the users' entries once the current transaction commits."""
+        keys = [self.key(user_id) for user_id in user_ids]
+        if keys:
+            transaction.on_commit(lambda: self.backend.delete_many(keys))
+
+    def invalidate_all(self):
+        """Bump the version once the current transaction commits."""
+        transaction.on_commit(lambda: self.backend.set(self.version_key, time.time_ns(), timeout=None))
+
+
+permission_cache = PermissionCache(
+    alias=getattr(settings, 'USER_CACHE_ALIAS', 'users'),
+    timeout=getattr(settings, 'PERMISSION_CACHE_TIMEOUT', 300),
+)
+
+
+# ==========================
+# Authentication backend
+# ==========================
+class CachedPermissionBackend(ModelBackend):
+    """
+    ModelBackend whose permission lookups come from permission_cache, so
+    has_perm() and has_module_perms() cost one cache read per user and
+    request instead of two queries. Authentication and the rules are
+    ModelBackend's: inactive and anonymous users have no permissions, and
+    object-level checks (obj given) are left to other backends.
+    """
+
+    def get_user_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        self.load_permissions(user_obj)
+        return user_obj._user_perm_cache
+
+    def get_group_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        self.load_permissions(user_obj)
+        return user_obj._group_perm_cache
+
+    def load_permissions(self, user_obj):
+        # Same per-instance attributes as ModelBackend, so they last the request
+        if hasattr(user_obj, '_user_perm_cache') and hasattr(user_obj, '_group_perm_cache'):
+            return
+        cached, version = permission_cache.get(user_obj.pk)
+        if cached is None:
+            cached = (
+                frozenset(super().get_user_permissions(user_obj)),
+                frozenset(super().get_group_permissions(user_obj)),
+            )
+            permission_cache.set(user_obj.pk, version, *cached)
+        user_obj._user_perm_cache, user_obj._group_perm_cache = cached
@@ -0,0 +1,52 @@
+from django.contrib.auth.models import Group, Permission
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import user_cache
+from .backends import permission_cache
+from .models import User
+
+
+# ==========================
+# User state and permission caches
+# ==========================
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_user(sender, instance, **kwargs):
+    # Covers is_active, password and role flag changes
+    user_cache.invalidate(instance.pk)
+    permission_cache.invalidate(instance.pk)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def forget_user_permissions(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        user_ids = [instance.pk] if action.startswith('post_') else []
+    elif action == 'pre_clear':
+        # Changed from the group/permission side; who loses it is only known before a clear
+        relation = 'groups' if sender is User.groups.through else 'user_permissions'
+        user_ids = list(User.objects.filter(**{relation: instance}).values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        user_ids = pk_set
+    else:
+        return
+    user_cache.invalidate(*user_ids)
+    permission_cache.invalidate(*user_ids)
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def forget_group_permissions(sender, action, **kwargs):
+    # Any number of members may be affected: recompute everyone's lazily
+    if action.startswith('post_'):
+        permission_cache.invalidate_all()
+
+
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=Permission)
+@receiver(post_delete, sender=Permission)
+def forget_all_permissions(sender, **kwargs):
+    # Deletes cascade through the M2M tables without m2m_changed; new
+    # permissions are granted to superusers implicitly. Permissions that
+    # migrate bulk-creates send no signal and show up after the timeout.
+    permission_cache.invalidate_all()
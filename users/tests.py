@@ -1,3 +1,158 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Group, Permission
+from rest_framework.test import APIRequestFactory, APITestCase
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .authentication import CachedJWTAuthentication, user_cache
+from .backends import permission_cache
+from .models import User
+
+
+class AuthCacheTestCase(APITestCase):
+    def setUp(self):
+        user_cache.backend.clear()
+        permission_cache.backend.clear()
+        self.user = User.objects.create_user(email='nurse@example.com', password='first-password', is_active=True)
+
+    def change(self, action, *args):
+        """Run a write and the cache invalidations it queues on commit."""
+        with self.captureOnCommitCallbacks(execute=True):
+            action(*args)
+
+
+# ==========================
+# CachedJWTAuthentication
+# ==========================
+class CachedJWTAuthenticationTests(AuthCacheTestCase):
+    def authenticate(self, token):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'JWT {token}')
+        return CachedJWTAuthentication().authenticate(request)[0]
+
+    def assertRejected(self, token, code):
+        with self.assertRaises(AuthenticationFailed) as raised:
+            self.authenticate(token)
+        self.assertEqual(raised.exception.detail['code'], code)
+
+    def test_cached_user_costs_no_query(self):
+        token = AccessToken.for_user(self.user)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.authenticate(token).pk, self.user.pk)
+        with self.assertNumQueries(0):
+            user = self.authenticate(token)
+        self.assertEqual((user.pk, user.email, user.is_active), (self.user.pk, 'nurse@example.com', True))
+
+    def test_deactivated_user_is_rejected(self):
+        token = AccessToken.for_user(self.user)
+        self.authenticate(token)
+        self.user.is_active = False
+        self.change(self.user.save)
+        self.assertRejected(token, 'user_inactive')
+
+    def test_deleted_user_is_rejected(self):
+        token = AccessToken.for_user(self.user)
+        self.authenticate(token)
+        self.change(self.user.delete)
+        self.assertRejected(token, 'user_not_found')
+
+    def test_changed_password_revokes_tokens(self):
+        with mock.patch.object(api_settings, 'CHECK_REVOKE_TOKEN', True):
+            token = AccessToken.for_user(self.user)
+            self.authenticate(token)
+            self.user.set_password('second-password')
+            self.change(self.user.save)
+            self.assertRejected(token, 'password_changed')
+            self.assertEqual(self.authenticate(AccessToken.for_user(self.user)).pk, self.user.pk)
+
+    def test_profile_changes_are_seen(self):
+        token = AccessToken.for_user(self.user)
+        self.authenticate(token)
+        self.user.is_staff = True
+        self.change(self.user.save)
+        self.assertTrue(self.authenticate(token).is_staff)
+
+    def test_stale_user_cannot_call_the_api(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {AccessToken.for_user(self.user)}')
+        self.assertEqual(self.client.get('/auth/users/me/').status_code, 200)
+        self.user.is_active = False
+        self.change(self.user.save)
+        self.assertEqual(self.client.get('/auth/users/me/').status_code, 401)
+
+
+# ==========================
+# CachedPermissionBackend
+# ==========================
+class CachedPermissionBackendTests(AuthCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.view = Permission.objects.get(codename='view_patient')
+        self.change_perm = Permission.objects.get(codename='change_patient')
+        self.group = Group.objects.create(name='Nurses')
+
+    def perms(self):
+        """Permissions of a fresh instance, so nothing is left on the object."""
+        return User.objects.get(pk=self.user.pk).get_all_permissions()
+
+    def test_cached_permissions_cost_no_query(self):
+        self.change(self.user.user_permissions.add, self.view)
+        self.assertEqual(self.perms(), {'hospital.view_patient'})
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(user.has_perm('hospital.view_patient'))
+            self.assertTrue(user.has_module_perms('hospital'))
+
+    def test_direct_permission_changes(self):
+        self.assertEqual(self.perms(), set())
+        self.change(self.user.user_permissions.add, self.view)
+        self.assertEqual(self.perms(), {'hospital.view_patient'})
+        # From the permission's side of the relation
+        self.change(self.change_perm.user_permissions_set.add, self.user)
+        self.assertEqual(self.perms(), {'hospital.view_patient', 'hospital.change_patient'})
+        self.change(self.view.user_permissions_set.remove, self.user)
+        self.assertEqual(self.perms(), {'hospital.change_patient'})
+        self.change(self.user.user_permissions.clear)
+        self.assertEqual(self.perms(), set())
+
+    def test_group_changes(self):
+        self.change(self.group.permissions.add, self.view)
+        self.assertEqual(self.perms(), set())
+        self.change(self.user.groups.add, self.group)
+        self.assertEqual(self.perms(), {'hospital.view_patient'})
+
+        self.change(self.group.permissions.add, self.change_perm)
+        self.assertEqual(self.perms(), {'hospital.view_patient', 'hospital.change_patient'})
+        self.change(self.group.permissions.remove, self.view)
+        self.assertEqual(self.perms(), {'hospital.change_patient'})
+
+        # Members removed from the group's side
+        self.change(self.group.users_groups.clear)
+        self.assertEqual(self.perms(), set())
+        self.change(self.group.users_groups.add, self.user)
+        self.assertEqual(self.perms(), {'hospital.change_patient'})
+
+        self.change(self.group.delete)
+        self.assertEqual(self.perms(), set())
+
+    def test_deleted_permission(self):
+        self.change(self.user.user_permissions.add, self.view)
+        self.assertEqual(self.perms(), {'hospital.view_patient'})
+        self.change(self.view.delete)
+        self.assertEqual(self.perms(), set())
+
+    def test_deactivated_user_has_no_permissions(self):
+        self.change(self.user.user_permissions.add, self.view)
+        self.assertEqual(self.perms(), {'hospital.view_patient'})
+        self.user.is_active = False
+        self.change(self.user.save)
+        self.assertEqual(self.perms(), set())
+        self.user.is_active = True
+        self.change(self.user.save)
+        self.assertEqual(self.perms(), {'hospital.view_patient'})
+
+    def test_jwt_user_sees_permission_changes(self):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'JWT {AccessToken.for_user(self.user)}')
+        self.assertFalse(CachedJWTAuthentication().authenticate(request)[0].has_perm('hospital.view_patient'))
+        self.change(self.user.user_permissions.add, self.view)
+        self.assertTrue(CachedJWTAuthentication().authenticate(request)[0].has_perm('hospital.view_patient'))